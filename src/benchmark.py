@@ -0,0 +1,210 @@
+# src/benchmark.py
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from sklearn.neighbors import BallTree
+from sklearn.preprocessing import StandardScaler
+from data_simulation import simulate_city_points
+from distance_matrix import pair_distances
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+SIZES = [300, 3_000, 30_000, 300_000]
+SEED = 42
+STAGES = ["find_best_k", "cluster_points", "dbscan_clustering", "compute_shortest_route",
+          "optimize_routes", "generate_report"]
+MAX_TOUR_POINTS = 10_000        # routing stages need an n x n matrix per tour; larger tours are skipped
+BENCH_DIR = "outputs/benchmarks"
+REGRESSION_THRESHOLD = 0.20     # fail if a stage gets >20% slower / uses >20% more memory / longer routes
+MIN_COMPARE_SECONDS = 0.05      # timings below this are too noisy to compare
+
+
+def tour_lower_bound(lat, lon, method="ellipsoidal"):
+    """
+    Closed-tour lower bound: every stop has two tour edges, each at least as long as
+    its nearest and second-nearest neighbour, so tour >= sum(d1 + d2) / 2.
+    """
+    n = len(lat)
+    if n < 2:
+        return 0.0
+    X = np.radians(np.column_stack([lat, lon]))
+    k = min(3, n)
+    _, nbrs = BallTree(X, metric='haversine').query(X, k=k)
+    rows = np.repeat(np.arange(n), k - 1)
+    d = pair_distances(lat[rows], lon[rows], lat[nbrs[:, 1:].ravel()], lon[nbrs[:, 1:].ravel()], method=method)
+    d = d.reshape(n, k - 1).astype(np.float64)
+    if k == 2:                          # two stops: the tour is the edge there and back
+        return float(d.sum())
+    return float(d.sum() / 2)
+
+
+@contextlib.contextmanager
+def _working_dir(path):
+    previous = os.getcwd()
+    os.makedirs(os.path.join(path, "data"), exist_ok=True)
+    os.makedirs(os.path.join(path, "outputs"), exist_ok=True)
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def _measure(func, memory):
+    """
+    (result, seconds, peak MB or None) for a stage, with its stdout silenced.
+    Timing runs untraced; with memory=True the stage runs a second time under
+    tracemalloc for the peak, since tracing slows allocation-heavy code down.
+    """
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+        peak = None
+        if memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def run_size(n, seed=SEED, stages=STAGES, memory=True):
+    """Benchmark every stage on one simulated city; returns {stage: metrics}."""
+    from clustering import cluster_points, dbscan_clustering, find_best_k
+    from generate_report import generate_final_report
+    from route_optimization import DISTANCE_METHOD, compute_shortest_route, optimize_routes
+
+    points = simulate_city_points(n=n, seed=seed, save=False)
+    results = {}
+    clustered = None
+    summary = None
+
+    def record(stage, func, **extra):
+        result, seconds, peak = _measure(func, memory)
+        results[stage] = {'seconds': round(seconds, 4), 'peak_mb': None if peak is None else round(peak, 1), **extra}
+        print(f"   {n:>8} {stage:<24} {seconds:9.3f} s" + (f" {peak:9.1f} MB" if peak is not None else ""))
+        return result
+
+    if "find_best_k" in stages:
+        X_scaled = StandardScaler().fit_transform(points[['latitude', 'longitude']])
+        record("find_best_k", lambda: find_best_k(X_scaled, 2, 10))
+    if "cluster_points" in stages or "optimize_routes" in stages or "generate_report" in stages:
+        clustered, _ = record("cluster_points",
+                              lambda: cluster_points(use_waste=False, df=points, save=False, plot=False))
+        results["cluster_points"]['clusters'] = int(clustered['cluster'].nunique())
+    if "dbscan_clustering" in stages:
+        density, _ = record("dbscan_clustering", lambda: dbscan_clustering(df=points, save=False))
+        results["dbscan_clustering"]['clusters'] = int(density['cluster'].nunique())
+
+    if "compute_shortest_route" in stages:
+        tour = points.iloc[:MAX_TOUR_POINTS]
+        _, km = record("compute_shortest_route", lambda: compute_shortest_route(tour), stops=len(tour))
+        bound = tour_lower_bound(tour['latitude'].to_numpy(), tour['longitude'].to_numpy(), DISTANCE_METHOD)
+        results["compute_shortest_route"].update(km=round(km, 3), lower_bound_km=round(bound, 3),
+                                                 gap_pct=round((km / bound - 1) * 100, 2) if bound else None)
+
+    if clustered is not None and ("optimize_routes" in stages or "generate_report" in stages):
+        largest = int(clustered['cluster'].value_counts().max())
+        if largest > MAX_TOUR_POINTS:
+            for stage in ("optimize_routes", "generate_report"):
+                if stage in stages:
+                    results[stage] = {'skipped': f"largest cluster has {largest} > {MAX_TOUR_POINTS} stops"}
+                    print(f"   {n:>8} {stage:<24} skipped ({results[stage]['skipped']})")
+        else:
+            summary = record("optimize_routes",
+                             lambda: optimize_routes(df=clustered, save=False, use_cache=False, render=False))
+            km = float(summary['distance_km'].sum())
+            bound = sum(tour_lower_bound(g['latitude'].to_numpy(), g['longitude'].to_numpy(), DISTANCE_METHOD)
+                        for _, g in clustered.groupby('cluster'))
+            results["optimize_routes"].update(km=round(km, 3), lower_bound_km=round(bound, 3),
+                                              gap_pct=round((km / bound - 1) * 100, 2) if bound else None)
+            if "generate_report" in stages:
+                record("generate_report", lambda: generate_final_report(clustered, summary))
+    return results
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=SIZES, seed=SEED, stages=STAGES, memory=True, output=None):
+    """Run every size in a scratch directory and write the JSON results; returns the results dict."""
+    meta = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': seed,
+        'tracemalloc': memory,
+    }
+    output = os.path.abspath(output or os.path.join(BENCH_DIR, f"benchmark_{meta['commit'] or 'local'}.json"))
+    print(f"⏱️ Benchmarking sizes {list(sizes)} (seed {seed})")
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch, _working_dir(scratch):
+        for n in sizes:
+            results[str(n)] = run_size(n, seed, stages, memory)
+
+    report = {'meta': meta, 'results': results}
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"📁 Saved benchmark results to {output}")
+    return report
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Regressions of current vs baseline: slower stages, higher peak memory or longer routes."""
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, now in stages.items():
+            before = baseline.get('results', {}).get(size, {}).get(stage)
+            if not before or 'skipped' in now or 'skipped' in before:
+                continue
+            checks = [('seconds', MIN_COMPARE_SECONDS), ('peak_mb', 1.0), ('km', 0.0)]
+            for metric, floor in checks:
+                old, new = before.get(metric), now.get(metric)
+                if old is None or new is None or max(old, new) < floor or old <= 0:
+                    continue
+                change = new / old - 1
+                if change > threshold:
+                    regressions.append(f"{size:>8} {stage:<24} {metric:<8} {old:.3f} → {new:.3f} (+{change:.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark clustering, routing and reporting on simulated cities.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="city sizes (points)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster, no peak_mb)")
+    parser.add_argument("--output", help=f"JSON path (default: {BENCH_DIR}/benchmark_<commit>.json)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier commit")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="allowed relative slowdown / growth before failing")
+    args = parser.parse_args()
+    report = run_benchmarks(args.sizes, args.seed, args.stages, not args.no_memory, args.output)
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) vs {args.compare} (threshold {args.threshold:.0%}):")
+            for line in regressions:
+                print("   " + line)
+            sys.exit(1)
+        print(f"\n✅ No regressions vs {args.compare} (threshold {args.threshold:.0%})")
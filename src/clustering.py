@@ -1,10 +1,26 @@
 # src/clustering.py
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
+import time
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.spatial import cKDTree
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import silhouette_score, davies_bouldin_score, calinski_harabasz_score
+from cvrp import TRUCK_CAPACITY_KG
+from distance_matrix import EARTH_RADIUS_KM
+from instrumentation import collect, merge, reset as reset_metrics, timer
+from rendering import CLUSTER_MAP_PATH, SILHOUETTE_PLOT_PATH, plot_cluster_map, plot_silhouette
+from storage import read_table, table_exists, table_path, write_table
+
+MODEL_PATH = "data/kmeans_model.pkl"
+SILHOUETTE_SAMPLE = 10000       # points used for silhouette (None = exact, O(n²))
+FAST_MODE_MIN_POINTS = 20000    # switch the k sweep to MiniBatchKMeans from this size
+MINIBATCH_SIZE = 4096
+KDISTANCE_SAMPLE = 5000         # points used to locate the DBSCAN eps knee
+BALANCED_MAX_ITER = 20          # assignment / centroid-update rounds for balanced clustering
+BALANCED_CANDIDATES = 8         # nearest centroids ranked per point (widened only for points that do not fit)
 
 # Ensure output folders exist
 os.makedirs("data", exist_ok=True)
@@ -13,30 +29,117 @@ os.makedirs("outputs", exist_ok=True)
 # ==============================================================
 # 🔹 AUTO-OPTIMIZING KMEANS CLUSTERING
 # ==============================================================
-def find_best_k(X_scaled, k_min=2, k_max=10, random_state=42):
-    results = []
-    for k in range(k_min, k_max + 1):
-        kmeans = KMeans(n_clusters=k, random_state=random_state, n_init=20)
-        labels = kmeans.fit_predict(X_scaled)
-        if len(set(labels)) == 1:
-            continue
-        sil = silhouette_score(X_scaled, labels)
-        db = davies_bouldin_score(X_scaled, labels)
-        ch = calinski_harabasz_score(X_scaled, labels)
-        results.append((k, sil, db, ch))
-    return results
+def _load_points(df=None):
+    """The given points frame (copied), or the stored simulated_points table."""
+    if df is not None:
+        return df.copy()
+    if not table_exists("simulated_points"):
+        raise FileNotFoundError("❌ simulated_points table not found in data/. Run data_simulation.py first.")
+    return read_table("simulated_points")
+
+
+def save_model(model, path=MODEL_PATH):
+    """
+    Keep the KMeans bundle behind the saved clusters for incremental assignment of new bins
+    (model=None removes a stale one: labels from other methods would disagree with it).
+    """
+    if model is not None:
+        joblib.dump(model, path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def stratified_sample(labels, sample_size, random_state=42):
+    """Indices of a sample that keeps every cluster's share (at least 2 points per cluster)."""
+    n = len(labels)
+    if sample_size is None or sample_size >= n:
+        return np.arange(n)
+    rng = np.random.default_rng(random_state)
+    picks = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        take = min(len(members), max(2, int(round(sample_size * len(members) / n))))
+        picks.append(rng.choice(members, size=take, replace=False))
+    return np.sort(np.concatenate(picks))
+
+
+def _make_kmeans(k, fast, random_state):
+    if fast:
+        return MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3, batch_size=MINIBATCH_SIZE)
+    return KMeans(n_clusters=k, random_state=random_state, n_init=20)
+
+
+def _score_k(X_scaled, k, fast, sample_size, random_state):
+    started = time.perf_counter()
+    model = _make_kmeans(k, fast, random_state)
+    with timer("clustering.kmeans_fit", k=k, fast=fast):
+        labels = model.fit_predict(X_scaled)
+    if len(set(labels)) == 1:
+        return None
+    idx = stratified_sample(labels, sample_size, random_state)
+    with timer("clustering.silhouette", k=k, sample=len(idx)):
+        sil = silhouette_score(X_scaled[idx], labels[idx])
+    return {
+        'k': k,
+        'silhouette': sil,
+        'davies_bouldin': davies_bouldin_score(X_scaled, labels),
+        'calinski_harabasz': calinski_harabasz_score(X_scaled, labels),
+        'seconds': time.perf_counter() - started,
+        'model': model,
+    }
+
 
+def _score_k_traced(X_scaled, k, fast, sample_size, random_state, parent_pid):
+    """joblib variant of _score_k that also returns a worker process's metrics for the parent to merge."""
+    if os.getpid() == parent_pid:
+        return _score_k(X_scaled, k, fast, sample_size, random_state), None    # ran in-process (n_jobs=1)
+    reset_metrics()     # loky workers are reused across tasks
+    result = _score_k(X_scaled, k, fast, sample_size, random_state)
+    return result, collect()
 
-def cluster_points(n_clusters=None, use_waste=True, k_min=2, k_max=10):
+
+def sweep_k(X_scaled, k_min=2, k_max=10, random_state=42, fast=None, sample_size=SILHOUETTE_SAMPLE, n_jobs=1):
+    """
+    Fit and score every k in [k_min, k_max]. fast=True uses MiniBatchKMeans
+    (None = only above FAST_MODE_MIN_POINTS); silhouette is computed on a
+    stratified sample of `sample_size` points (None = exact); k values run in
+    parallel with n_jobs. Returns one dict per k, including the fitted model.
+    """
+    X_scaled = np.asarray(X_scaled)
+    if fast is None:
+        fast = len(X_scaled) >= FAST_MODE_MIN_POINTS
+    with timer("clustering.sweep_k", k_min=k_min, k_max=k_max, n_jobs=n_jobs):
+        traced = Parallel(n_jobs=n_jobs)(
+            delayed(_score_k_traced)(X_scaled, k, fast, sample_size, random_state, os.getpid())
+            for k in range(k_min, k_max + 1))
+    scored = []
+    for result, metrics in traced:
+        if metrics is not None:
+            merge(metrics)
+        if result is not None:
+            scored.append(result)
+    return scored
+
+
+def find_best_k(X_scaled, k_min=2, k_max=10, random_state=42, **sweep_options):
+    results = sweep_k(X_scaled, k_min=k_min, k_max=k_max, random_state=random_state, **sweep_options)
+    return [(r['k'], r['silhouette'], r['davies_bouldin'], r['calinski_harabasz']) for r in results]
+
+
+def cluster_points(n_clusters=None, use_waste=True, k_min=2, k_max=10, fast=None,
+                   sample_size=SILHOUETTE_SAMPLE, n_jobs=1, df=None, save=True, plot=True, return_model=False):
     """
     Automatically clusters simulated waste collection points using KMeans.
     Selects optimal K based on Silhouette, DB, and CH scores.
     use_waste=True -> includes waste_kg as a feature.
+    fast / sample_size / n_jobs tune the k sweep (see sweep_k); the winning model
+    is reused rather than refit. df clusters an in-memory frame instead of
+    the stored simulated_points table; save=False skips writing clustered_points
+    and the saved model, and plot=False skips the silhouette plot and cluster map (e.g. for retries).
+    Returns (clustered df, final (sampled) silhouette score), plus the model bundle
+    (see save_model) when return_model=True.
     """
-    # Load data
-    if not os.path.exists("data/simulated_points.csv"):
-        raise FileNotFoundError("❌ data/simulated_points.csv not found. Run data_simulation.py first.")
-    df = pd.read_csv("data/simulated_points.csv")
+    df = _load_points(df)
 
     # Features for clustering
     features = ['latitude', 'longitude']
@@ -51,54 +154,51 @@ def cluster_points(n_clusters=None, use_waste=True, k_min=2, k_max=10):
 
     # Auto-select K
     if n_clusters is None:
-        results = find_best_k(X_scaled, k_min=k_min, k_max=k_max)
+        results = sweep_k(X_scaled, k_min=k_min, k_max=k_max, fast=fast, sample_size=sample_size, n_jobs=n_jobs)
         if not results:
             raise RuntimeError("No valid clustering results found. Check your data.")
 
-        results_sorted = sorted(results, key=lambda r: (r[1], r[3], -r[2]), reverse=True)
-        best_k, best_sil, best_db, best_ch = results_sorted[0]
+        best = sorted(results, key=lambda r: (r['silhouette'], r['calinski_harabasz'], -r['davies_bouldin']),
+                      reverse=True)[0]
 
-        print("k | Silhouette | Davies–Bouldin | Calinski–Harabasz")
-        print("--|-------------|----------------|-------------------")
-        for k, sil, db, ch in results:
-            print(f"{k:2d} | {sil:0.3f}      | {db:0.3f}         | {ch:0.1f}")
-        print(f"\n✅ Best K = {best_k} (Silhouette={best_sil:.3f}, DB={best_db:.3f}, CH={best_ch:.1f})")
-        n_clusters = best_k
+        print("k | Silhouette | Davies–Bouldin | Calinski–Harabasz | Time (s)")
+        print("--|-------------|----------------|-------------------|---------")
+        for r in results:
+            print(f"{r['k']:2d} | {r['silhouette']:0.3f}      | {r['davies_bouldin']:0.3f}         "
+                  f"| {r['calinski_harabasz']:0.1f}{'':13s}| {r['seconds']:0.2f}")
+        print(f"\n✅ Best K = {best['k']} (Silhouette={best['silhouette']:.3f}, DB={best['davies_bouldin']:.3f}, "
+              f"CH={best['calinski_harabasz']:.1f})")
+        n_clusters = best['k']
+        kmeans = best['model']
 
         # Save silhouette plot
-        ks = [r[0] for r in results]
-        sils = [r[1] for r in results]
-        plt.figure(figsize=(6, 4))
-        plt.plot(ks, sils, marker='o', linewidth=2)
-        plt.xlabel("Number of Clusters (k)")
-        plt.ylabel("Silhouette Score")
-        plt.title("Silhouette Score vs k")
-        plt.grid(True)
-        plt.savefig("outputs/silhouette_vs_k.png", dpi=150)
-        plt.close()
-        print("📊 Saved silhouette plot: outputs/silhouette_vs_k.png")
-
-    # Fit final model
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=20)
-    df['cluster'] = kmeans.fit_predict(X_scaled)
-
-    # Save results
-    df.to_csv('data/clustered_points.csv', index=False)
+        if plot:
+            plot_silhouette([r['k'] for r in results], [r['silhouette'] for r in results])
+            print(f"📊 Saved silhouette plot: {SILHOUETTE_PLOT_PATH}")
+    else:
+        # Fit final model
+        if fast is None:
+            fast = len(X_scaled) >= FAST_MODE_MIN_POINTS
+        kmeans = _make_kmeans(n_clusters, fast, 42).fit(X_scaled)
+
+    df['cluster'] = kmeans.labels_
+
+    # Save results (model kept for incremental assignment of new bins)
+    model = {'model': kmeans, 'scaler': scaler, 'features': features}
+    if save:
+        write_table(df, 'clustered_points')
+        save_model(model)
 
     # Plot clusters
-    plt.figure(figsize=(8, 6))
-    plt.scatter(df['longitude'], df['latitude'], c=df['cluster'], cmap='tab10', s=40, edgecolor='k', linewidth=0.4)
-    plt.title(f"Optimized City Waste Clusters (k={n_clusters})")
-    plt.xlabel("Longitude")
-    plt.ylabel("Latitude")
-    plt.grid(True)
-    plt.savefig('data/cluster_map.png', dpi=150)
-    plt.close()
-    print("🗺️ Saved cluster map: data/cluster_map.png")
+    if plot:
+        plot_cluster_map(df)
+        print(f"🗺️ Saved cluster map: {CLUSTER_MAP_PATH}")
 
     # Compute metrics
-    labels = df['cluster']
-    sil = silhouette_score(X_scaled, labels)
+    labels = df['cluster'].to_numpy()
+    idx = stratified_sample(labels, sample_size)
+    with timer("clustering.silhouette", k=n_clusters, sample=len(idx)):
+        sil = silhouette_score(X_scaled[idx], labels[idx])
     db = davies_bouldin_score(X_scaled, labels)
     ch = calinski_harabasz_score(X_scaled, labels)
 
@@ -106,30 +206,215 @@ def cluster_points(n_clusters=None, use_waste=True, k_min=2, k_max=10):
     print(f"   Silhouette Score      : {sil:.3f}")
     print(f"   Davies–Bouldin Index  : {db:.3f}")
     print(f"   Calinski–Harabasz     : {ch:.3f}")
-    print(f"📁 Results saved in: data/clustered_points.csv")
+    if save:
+        print(f"📁 Results saved in: {table_path('clustered_points')}")
+    return (df, sil, model) if return_model else (df, sil)
+
+# ==============================================================
+# 🔹 BALANCED (CAPACITATED) CLUSTERING
+# ==============================================================
+def _local_km(lat, lon):
+    """Equirectangular projection to km around the data's mean latitude (fine at city scale)."""
+    x = (lon - lon.mean()) * 111.32 * np.cos(np.radians(lat.mean()))
+    y = (lat - lat.mean()) * 110.57
+    return np.column_stack([x, y])
+
+
+def _capacitated_assign(XY, centroids, weight, max_waste, max_stops, candidates=BALANCED_CANDIDATES):
+    """
+    Regret-ordered greedy assignment: points with the most to lose if they miss
+    their nearest centroid pick first, each taking the nearest cluster that still
+    has waste and stop capacity. Only the `candidates` nearest centroids are ranked
+    per point; points that fit none of them are retried against a widening ring
+    (x4 each pass) once everyone else has picked. Returns labels (-1 where nothing fits).
+    """
+    k = len(centroids)
+    n = len(XY)
+    tree = cKDTree(centroids)
+    m = min(k, candidates)
+    d, ranked = tree.query(XY, k=m)
+    d, ranked = d.reshape(n, m), ranked.reshape(n, m)
+    if m > 1:
+        regret = d[:, 1] ** 2 - d[:, 0] ** 2
+    else:
+        regret = np.zeros(n)
+    load = np.zeros(k)
+    stops = np.zeros(k, dtype=np.int64)
+    labels = np.full(n, -1, dtype=np.int64)
+    weights = weight.tolist()
+
+    def place(order, ranked_list, skip):
+        unplaced = []
+        for i, cands in zip(order, ranked_list):
+            w = weights[i]
+            for c in cands[skip:]:
+                if load[c] + w <= max_waste and stops[c] < max_stops:
+                    labels[i] = c
+                    load[c] += w
+                    stops[c] += 1
+                    break
+            else:
+                unplaced.append(i)
+        return unplaced
+
+    order = np.argsort(-regret, kind='stable')
+    pending = place(order.tolist(), ranked[order].tolist(), 0)
+    while pending and m < k:
+        tried, m = m, min(k, m * 4)
+        ranked = tree.query(XY[pending], k=m)[1].reshape(len(pending), m)
+        pending = place(pending, ranked.tolist(), tried)
+    return labels
+
+
+def balanced_clustering(n_clusters=None, max_waste_kg=TRUCK_CAPACITY_KG, max_stops=None,
+                        max_iter=BALANCED_MAX_ITER, random_state=42, df=None, save=True):
+    """
+    Drop-in for cluster_points that caps each cluster's total waste_kg and/or stop
+    count (capacitated k-means). Centroids start from k-means++ on projected
+    coordinates; each round reassigns points with a regret-ordered capacitated
+    assignment and moves centroids to their members' mean. With n_clusters=None,
+    k starts at the capacity lower bound and grows until every point fits.
+    df / save behave as in cluster_points. Returns (clustered df, final (sampled) silhouette score).
+    """
+    df = _load_points(df)
+    n = len(df)
+    weight = df['waste_kg'].to_numpy(dtype=np.float64) if 'waste_kg' in df.columns else np.zeros(n)
+    max_waste = np.inf if max_waste_kg is None else float(max_waste_kg)
+    max_stops = n if max_stops is None else int(max_stops)
+    if (weight > max_waste).any():
+        raise ValueError(f"❌ A bin holds {weight.max():.1f} kg, more than the cluster cap of {max_waste:.1f} kg.")
+
+    XY = _local_km(df['latitude'].to_numpy(), df['longitude'].to_numpy())
+    k = n_clusters or max(1, int(np.ceil(max(weight.sum() / max_waste, n / max_stops))))
+    started = time.perf_counter()
+    centroids = _make_kmeans(k, n >= FAST_MODE_MIN_POINTS, random_state).fit(XY).cluster_centers_
+    while True:
+        labels = None
+        for it in range(max_iter):
+            new_labels = _capacitated_assign(XY, centroids, weight, max_waste, max_stops)
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            members = labels >= 0
+            counts = np.bincount(labels[members], minlength=k)
+            sums = np.stack([np.bincount(labels[members], weights=XY[members, j], minlength=k) for j in (0, 1)], 1)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        unfit = labels < 0
+        if not unfit.any():
+            break
+        if n_clusters is not None:
+            raise ValueError(f"❌ {n_clusters} clusters cannot hold every bin under the given caps; "
+                             f"use n_clusters=None to grow k automatically.")
+        # Add at least the capacity the leftover bins need, seeded among them; kept centroids warm-start
+        extra = min(int(unfit.sum()), max(1, int(np.ceil(max(weight[unfit].sum() / max_waste,
+                                                              unfit.sum() / max_stops)))))
+        print(f"⚠️ k={k}: {unfit.sum()} bins do not fit → retrying with k={k + extra}")
+        seeds = _make_kmeans(extra, unfit.sum() >= FAST_MODE_MIN_POINTS, random_state).fit(XY[unfit])
+        centroids = np.vstack([centroids, seeds.cluster_centers_])
+        k += extra
+
+    df['cluster'] = labels
+    if save:
+        write_table(df, 'clustered_points')
+        save_model(None)    # incremental updates use these clusters' centroids instead
+
+    totals = df.groupby('cluster').agg(stops=('id', 'size'), waste_kg=('waste_kg', 'sum')) \
+        if 'waste_kg' in df.columns else df.groupby('cluster').agg(stops=('id', 'size'))
+    print(f"\n⚖️ Balanced clustering: k={k} in {time.perf_counter() - started:.2f}s "
+          f"({it + 1} rounds, caps: {max_waste_kg} kg / {max_stops if max_stops < n else '∞'} stops)")
+    print(f"   Stops per cluster     : {totals['stops'].min()}–{totals['stops'].max()}")
+    if 'waste_kg' in totals:
+        print(f"   Waste per cluster (kg): {totals['waste_kg'].min():.0f}–{totals['waste_kg'].max():.0f}")
+
+    idx = stratified_sample(labels, SILHOUETTE_SAMPLE, random_state)
+    sil = silhouette_score(XY[idx], labels[idx]) if k > 1 else 0.0
+    print(f"   Silhouette Score      : {sil:.3f}")
+    if save:
+        print(f"📁 Results saved in: {table_path('clustered_points')}")
+    return df, sil
+
 
 # ==============================================================
 # 🔹 DBSCAN FALLBACK (non-spherical clusters)
 # ==============================================================
-def dbscan_clustering(eps=0.03, min_samples=5):
+def _kdistance_knee_m(X_rad, min_samples, sample_size, random_state=42):
+    """
+    eps (metres) at the knee of the sorted k-distance curve: distance from a sample
+    of points to their min_samples-th neighbour, knee = point farthest from the chord.
+    """
+    from sklearn.neighbors import BallTree
+
+    rng = np.random.default_rng(random_state)
+    n = len(X_rad)
+    idx = rng.choice(n, size=min(n, sample_size), replace=False)
+    k = min(min_samples + 1, n)             # +1: each point is its own nearest neighbour
+    dist, _ = BallTree(X_rad, metric='haversine').query(X_rad[idx], k=k)
+    kd = np.sort(dist[:, -1]) * EARTH_RADIUS_KM * 1000
+    if len(kd) < 3 or kd[-1] == kd[0]:
+        return float(kd[-1])
+    x = np.linspace(0.0, 1.0, len(kd))
+    y = (kd - kd[0]) / (kd[-1] - kd[0])
+    return float(kd[np.argmax(x - y)])      # curve is convex: knee lies farthest below the chord
+
+
+def dbscan_clustering(eps_m=None, min_samples=5, sample_size=KDISTANCE_SAMPLE, reassign_noise=True,
+                      min_cluster_size=None, df=None, save=True):
+    """
+    Density clustering on geographic coordinates (haversine BallTree), eps in metres.
+    eps_m=None picks eps from the k-distance knee of a sample. Noise points, and
+    fringe clusters smaller than min_cluster_size (default: the larger of
+    2 x min_samples and 0.2% of the points), are folded into the cluster of their
+    nearest clustered neighbour so no "-1" route is produced (reassign_noise=False
+    keeps them as -1). Labels are renumbered 0..k-1. df / save behave as in
+    cluster_points. Returns (clustered df, (sampled) silhouette).
+    """
     from sklearn.cluster import DBSCAN
+    from sklearn.neighbors import BallTree
 
-    df = pd.read_csv("data/simulated_points.csv")
-    X = df[['latitude', 'longitude', 'waste_kg']]
-    X_scaled = StandardScaler().fit_transform(X)
+    df = _load_points(df)
+    X_rad = np.radians(df[['latitude', 'longitude']].to_numpy())
+    started = time.perf_counter()
+    if eps_m is None:
+        eps_m = _kdistance_knee_m(X_rad, min_samples, sample_size)
+        print(f"📐 Auto eps from k-distance knee: {eps_m:.0f} m")
 
-    dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-    labels = dbscan.fit_predict(X_scaled)
+    dbscan = DBSCAN(eps=eps_m / 1000 / EARTH_RADIUS_KM, min_samples=min_samples,
+                    metric='haversine', algorithm='ball_tree')
+    with timer("clustering.dbscan_fit", eps_m=round(eps_m), points=len(X_rad)):
+        labels = dbscan.fit_predict(X_rad)
+    n_noise = int((labels < 0).sum())
+    if min_cluster_size is None:
+        min_cluster_size = max(2 * min_samples, int(0.002 * len(labels)))
+    sizes = np.bincount(labels[labels >= 0], minlength=1)
+    small = (labels >= 0) & (sizes[np.maximum(labels, 0)] < min_cluster_size)
+    if (~small & (labels >= 0)).any():     # only when at least one real cluster survives
+        labels[small] = -1
+    noise = labels < 0
+    if reassign_noise and noise.any() and not noise.all():
+        _, nearest = BallTree(X_rad[~noise], metric='haversine').query(X_rad[noise], k=1)
+        labels[noise] = labels[~noise][nearest[:, 0]]
+    kept = labels >= 0
+    labels[kept] = np.unique(labels[kept], return_inverse=True)[1]
     df['cluster'] = labels
-    df.to_csv('data/clustered_points.csv', index=False)
+    if save:
+        write_table(df, 'clustered_points')
+        save_model(None)
 
+    n_clusters = len(set(labels) - {-1})
+    print(f"\n🧭 DBSCAN: {n_clusters} clusters, {n_noise} noise points + {int(small.sum())} in fringe clusters "
+          f"{'folded into nearest cluster' if reassign_noise else 'left as -1'} "
+          f"({time.perf_counter() - started:.2f}s, eps={eps_m:.0f} m)")
     if len(set(labels)) > 1:
-        sil = silhouette_score(X_scaled, labels)
+        X_scaled = StandardScaler().fit_transform(df[['latitude', 'longitude']])
+        idx = stratified_sample(labels, SILHOUETTE_SAMPLE)
+        sil = silhouette_score(X_scaled[idx], labels[idx])
         db = davies_bouldin_score(X_scaled, labels)
         ch = calinski_harabasz_score(X_scaled, labels)
-        print(f"\n🧭 DBSCAN Results — Silhouette={sil:.3f}, DB={db:.3f}, CH={ch:.1f}")
-    else:
-        print("⚠️ DBSCAN created only one cluster — try adjusting eps or min_samples.")
+        print(f"🧭 DBSCAN Results — Silhouette={sil:.3f}, DB={db:.3f}, CH={ch:.1f}")
+        return df, sil
+    print("⚠️ DBSCAN created only one cluster — try adjusting eps_m or min_samples.")
+    return df, 0.0
 
 # ==============================================================
 # 🔹 AGGLOMERATIVE FALLBACK (hierarchical)
@@ -137,14 +422,14 @@ def dbscan_clustering(eps=0.03, min_samples=5):
 def agglomerative_clustering(n_clusters=4):
     from sklearn.cluster import AgglomerativeClustering
 
-    df = pd.read_csv("data/simulated_points.csv")
+    df = _load_points()
     X = df[['latitude', 'longitude', 'waste_kg']]
     X_scaled = StandardScaler().fit_transform(X)
 
     model = AgglomerativeClustering(n_clusters=n_clusters)
     labels = model.fit_predict(X_scaled)
     df['cluster'] = labels
-    df.to_csv('data/clustered_points.csv', index=False)
+    write_table(df, 'clustered_points')
 
     sil = silhouette_score(X_scaled, labels)
     db = davies_bouldin_score(X_scaled, labels)
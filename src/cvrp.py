@@ -0,0 +1,317 @@
+# src/cvrp.py
+import time
+from collections import deque
+from dataclasses import dataclass, field
+import numpy as np
+from sklearn.neighbors import BallTree
+from distance_matrix import pair_distances, pairwise_distances, route_length
+from instrumentation import count, record_span
+from local_search import improve_tour
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+TRUCK_CAPACITY_KG = 1000.0      # payload per trip
+DEPOT_LAT = 28.7041             # default depot (city centre used by data_simulation)
+DEPOT_LON = 77.1025
+SAVINGS_NEIGHBOURS = 15         # kNN pairs considered for savings / inter-route moves
+CVRP_TIME_LIMIT = 20.0          # seconds of improvement per call
+EPS = 1e-7
+
+
+@dataclass
+class Fleet:
+    """
+    Trucks available for capacitated routing. Each truck leaves the depot; with
+    dump sites (transfer stations) every trip ends by unloading at the best one
+    and the truck's next trip starts from there, returning to the depot at the end.
+    """
+    n_vehicles: int = 1
+    capacity_kg: float = TRUCK_CAPACITY_KG
+    depot_lat: float = DEPOT_LAT
+    depot_lon: float = DEPOT_LON
+    dump_sites: list = field(default_factory=list)      # [(lat, lon), ...]
+
+
+# --------------------------
+# CLARKE–WRIGHT SAVINGS
+# --------------------------
+def _savings_trips(n, demand, capacity, i, j, saving):
+    """Parallel savings over candidate pairs (i, j); returns trips (lists of stop ids) and loads."""
+    order = np.lexsort((j, i, -saving))
+
+    trips = {r: deque([r]) for r in range(n)}
+    trip_of = list(range(n))
+    load = {r: float(demand[r]) for r in range(n)}
+
+    for e in order.tolist():
+        if saving[e] <= 0:
+            break
+        a, b = int(i[e]), int(j[e])
+        ra, rb = trip_of[a], trip_of[b]
+        if ra == rb or load[ra] + load[rb] > capacity:
+            continue
+        A, B = trips[ra], trips[rb]
+        if a not in (A[0], A[-1]) or b not in (B[0], B[-1]):
+            continue
+        # Keep the longer trip in place and splice the shorter one onto the joining end
+        if len(A) < len(B):
+            A, B, a, b, ra, rb = B, A, b, a, rb, ra
+        if B[0] != b:
+            B.reverse()
+        if A[-1] == a:
+            A.extend(B)
+        else:
+            A.extendleft(B)
+        for s in B:
+            trip_of[s] = ra
+        load[ra] += load.pop(rb)
+        del trips[rb]
+
+    return [list(t) for t in trips.values()], [load[r] for r in trips]
+
+
+# --------------------------
+# INTER-ROUTE IMPROVEMENT
+# --------------------------
+def _inter_route_search(trips, loads, demand, capacity, d, d0, nbrs, deadline):
+    """Relocate and swap moves between trips, driven by neighbour lists and a don't-look queue."""
+    n = len(demand)
+    trip_of = np.empty(n, dtype=np.int64)
+    for t, stops in enumerate(trips):
+        trip_of[stops] = t
+
+    def dd(a, b):
+        if a < 0:
+            return 0.0 if b < 0 else d0[b]
+        if b < 0:
+            return d0[a]
+        return d(a, b)
+
+    def around(t, s):
+        stops = trips[t]
+        k = stops.index(s)
+        prev = stops[k - 1] if k > 0 else -1
+        nxt = stops[k + 1] if k + 1 < len(stops) else -1
+        return k, prev, nxt
+
+    queue = deque(range(n))
+    queued = np.ones(n, dtype=bool)
+    moves = 0
+
+    def wake(*nodes):
+        for x in nodes:
+            if x >= 0 and not queued[x]:
+                queued[x] = True
+                queue.append(x)
+
+    while queue and time.perf_counter() < deadline:
+        s = queue.popleft()
+        queued[s] = False
+        ts = trip_of[s]
+        ks, ps, ns = around(ts, s)
+        remove_gain = dd(ps, s) + dd(s, ns) - dd(ps, ns)
+        moved = False
+
+        for c in nbrs[s].tolist():
+            tc = trip_of[c]
+            if tc == ts:
+                continue
+            kc, pc, nc = around(tc, c)
+
+            # ---- Relocate s next to c ----
+            if loads[tc] + demand[s] <= capacity:
+                for left, right, at in ((pc, c, kc), (c, nc, kc + 1)):
+                    cost = dd(left, s) + dd(s, right) - dd(left, right)
+                    if cost - remove_gain < -EPS:
+                        trips[ts].pop(ks)
+                        trips[tc].insert(at, s)
+                        loads[ts] -= demand[s]
+                        loads[tc] += demand[s]
+                        trip_of[s] = tc
+                        wake(ps, ns, left, right, s)
+                        moved = True
+                        break
+                if moved:
+                    break
+
+            # ---- Swap s and c ----
+            if (loads[ts] - demand[s] + demand[c] <= capacity
+                    and loads[tc] - demand[c] + demand[s] <= capacity):
+                before = dd(ps, s) + dd(s, ns) + dd(pc, c) + dd(c, nc)
+                after = dd(ps, c) + dd(c, ns) + dd(pc, s) + dd(s, nc)
+                if after - before < -EPS:
+                    trips[ts][ks], trips[tc][kc] = c, s
+                    loads[ts] += demand[c] - demand[s]
+                    loads[tc] += demand[s] - demand[c]
+                    trip_of[s], trip_of[c] = tc, ts
+                    wake(ps, ns, pc, nc, s, c)
+                    moved = True
+                    break
+
+        if moved:
+            moves += 1
+
+    kept = [t for t, stops in enumerate(trips) if stops]
+    return [trips[t] for t in kept], [loads[t] for t in kept], moves
+
+
+def _trips_length(trips, D):
+    """Total km of depot -> stops -> depot trips on the node matrix D (0 = depot, stop s = s + 1), one gather."""
+    if not trips:
+        return 0.0
+    legs = [np.concatenate([[0], np.asarray(stops, dtype=np.int64) + 1, [0]]) for stops in trips]
+    a = np.concatenate([leg[:-1] for leg in legs])
+    b = np.concatenate([leg[1:] for leg in legs])
+    return float(D[a, b].astype(np.float64).sum())
+
+
+# --------------------------
+# PUBLIC API
+# --------------------------
+def solve_cvrp(lat, lon, demand, capacity=TRUCK_CAPACITY_KG, depot_lat=DEPOT_LAT, depot_lon=DEPOT_LON,
+               distance_method="haversine", improve=True, time_limit=CVRP_TIME_LIMIT, dump_sites=None):
+    """
+    Split a point set into capacity-feasible depot trips.
+    Clarke–Wright savings over kNN pairs builds the trips, relocate/swap moves
+    between trips and 2-opt/Or-opt within each trip improve them. With dump_sites
+    each trip ends at the dump that minimises last stop -> dump -> depot.
+    Returns (trips, stats); each trip is {'stops': positional ids, 'load_kg', 'distance_km',
+    'dump': dump index or None, 'first_stop': (lat, lon), 'start_leg_km', 'return_leg_km'}.
+    distance_km counts depot -> stops -> [dump ->] depot. Savings, inter-trip moves and
+    every reported km use one distance_method matrix over depot, stops and dump sites.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    demand = np.asarray(demand, dtype=np.float64)
+    n = len(lat)
+    if n == 0:
+        return [], {'initial_km': 0.0, 'final_km': 0.0, 'improvement_pct': 0.0}
+    if (demand > capacity).any():
+        worst = int(np.argmax(demand))
+        raise ValueError(f"❌ Stop {worst} needs {demand[worst]:.1f} kg, more than truck capacity {capacity:.1f} kg.")
+
+    began = time.perf_counter()
+    # Every move is scored and reported in the run's metric, on one matrix:
+    # 0 = depot, 1..n = stops, n+1.. = dump sites
+    dumps = np.asarray(dump_sites if dump_sites else np.empty((0, 2)), dtype=np.float64).reshape(-1, 2)
+    D = pairwise_distances(np.concatenate([[depot_lat], lat, dumps[:, 0]]),
+                           np.concatenate([[depot_lon], lon, dumps[:, 1]]), method=distance_method)
+    d0_arr = D[0, 1:n + 1].astype(np.float64)
+    d0 = d0_arr.tolist()
+
+    def d(a, b):
+        return float(D[a + 1, b + 1])
+
+    X = np.radians(np.column_stack([lat, lon]))
+    k = min(SAVINGS_NEIGHBOURS + 1, n)
+    _, nbrs = BallTree(X, metric='haversine').query(X, k=k)
+    nbrs = nbrs[:, 1:]
+
+    # Savings s_ij = d(0,i) + d(0,j) - d(i,j) on unique kNN pairs only
+    pairs = np.unique(np.sort(np.column_stack([np.repeat(np.arange(n), k - 1), nbrs.ravel()]), axis=1), axis=0)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    i, j = pairs[:, 0], pairs[:, 1]
+    saving = d0_arr[i] + d0_arr[j] - D[i + 1, j + 1]
+
+    trips, loads = _savings_trips(n, demand, capacity, i, j, saving)
+    initial = _trips_length(trips, D)
+    moves = 0
+    if improve:
+        trips, loads, moves = _inter_route_search(trips, loads, demand.tolist(), capacity, d, d0, nbrs,
+                                              deadline=began + time_limit)
+
+    dump_nodes = np.arange(n + 1, n + 1 + len(dumps))
+    results = []
+    for stops, load in zip(trips, loads):
+        stops = np.asarray(stops, dtype=np.int64)
+        # Trip matrix nodes: 0 = depot, 1..m-1 = stops, m.. = dump sites
+        m = len(stops) + 1
+        idx = np.concatenate([[0], stops + 1, dump_nodes])
+        dist = D[np.ix_(idx, idx)]
+        tour = np.arange(m)
+        if improve:
+            remaining = max(0.0, began + time_limit - time.perf_counter())
+            tour, _ = improve_tour(tour, dist[:m, :m], time_limit=remaining)
+        seq = tour[1:]
+        dump = None
+        if len(dumps):
+            # Unloading makes the trip asymmetric: pick direction and dump together
+            dump_ids = np.arange(m, m + len(dumps))
+            best = None
+            for cand in (seq, seq[::-1]):
+                via = dist[cand[-1], dump_ids].astype(np.float64) + dist[dump_ids, 0]
+                b = int(np.argmin(via))
+                km = float(dist[0, cand[0]]) + route_length(cand, dist) + float(via[b])
+                if best is None or km < best[0]:
+                    best = (km, cand, b)
+            km, seq, dump = best
+            return_leg = float(dist[m + dump, 0])
+        else:
+            km = route_length(np.concatenate([[0], seq, [0]]), dist)
+            return_leg = float(dist[seq[-1], 0])
+        results.append({
+            'stops': stops[seq - 1],
+            'load_kg': float(load),
+            'distance_km': km,
+            'dump': dump,
+            'first_stop': (float(lat[stops[seq[0] - 1]]), float(lon[stops[seq[0] - 1]])),
+            'start_leg_km': float(dist[0, seq[0]]),
+            'return_leg_km': return_leg,
+        })
+
+    # Improvement is measured on plain depot loops so unload legs do not skew it
+    improved = _trips_length([t['stops'] for t in results], D)
+    stats = {
+        'initial_km': initial,
+        'final_km': sum(t['distance_km'] for t in results),
+        'improvement_pct': (initial - improved) / initial * 100 if initial > 0 else 0.0,
+        'inter_route_moves': moves,
+        'elapsed_s': time.perf_counter() - began,
+    }
+    count("cvrp.inter_route_moves", moves)
+    record_span("cvrp.solve", began, time.perf_counter(), {'stops': n, 'trips': len(results)})
+    return results, stats
+
+
+def link_vehicle_trips(trips, plan, dump_sites, distance_method="haversine"):
+    """
+    Chain each vehicle's trips: trip k+1 starts from the dump where trip k unloaded
+    instead of the depot, and only the vehicle's last trip drives back to the depot.
+    Adjusts 'distance_km' in place (no-op without dump sites).
+    """
+    if not dump_sites:
+        return
+    by_vehicle = {}
+    for t, (vehicle, trip_no) in enumerate(plan):
+        by_vehicle.setdefault(vehicle, []).append((trip_no, t))
+    prev_ids, next_ids = [], []
+    for chain in by_vehicle.values():
+        chain.sort()
+        for (_, a), (_, b) in zip(chain, chain[1:]):
+            prev_ids.append(a)
+            next_ids.append(b)
+    if not prev_ids:
+        return
+
+    dumps = np.asarray(dump_sites, dtype=np.float64).reshape(-1, 2)
+    from_dump = dumps[[trips[a]['dump'] for a in prev_ids]]
+    first = np.array([trips[b]['first_stop'] for b in next_ids])
+    dump_to_next = pair_distances(from_dump[:, 0], from_dump[:, 1], first[:, 0], first[:, 1],
+                                  method=distance_method)
+    for a, b, leg in zip(prev_ids, next_ids, dump_to_next.tolist()):
+        trips[a]['distance_km'] -= trips[a]['return_leg_km']
+        trips[b]['distance_km'] += leg - trips[b]['start_leg_km']
+
+
+def assign_trips(trip_lengths, n_vehicles):
+    """Longest-trip-first assignment to the least-loaded vehicle; returns (vehicle, trip_no) per trip."""
+    km = np.zeros(max(1, n_vehicles))
+    visits = np.zeros(len(km), dtype=np.int64)
+    plan = [None] * len(trip_lengths)
+    for t in np.argsort(-np.asarray(trip_lengths, dtype=np.float64), kind='stable'):
+        v = int(np.argmin(km))
+        km[v] += trip_lengths[t]
+        visits[v] += 1
+        plan[t] = (v + 1, int(visits[v]))
+    return plan
@@ -1,56 +1,92 @@
+import io
+import time
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os
-from route_optimization import optimize_routes
-from generate_report import generate_final_report  # We’ll modify this import next
+from routing_service import SERVICE_URL, fetch_file, job_log, job_result, job_status, submit_job
+
+POLL_SECONDS = 1.0
 
 st.set_page_config(page_title="Solid Waste Route Optimization", layout="wide")
 
 st.title("♻️ Solid Waste Route Optimization Dashboard")
+service_url = st.sidebar.text_input("Routing service", SERVICE_URL)
+time_limit = st.sidebar.number_input("Local search seconds per cluster", min_value=0.0, value=5.0, step=1.0)
+recluster = st.sidebar.checkbox("Re-cluster uploaded points", value=False)
+
+
+def service_error(exc):
+    st.error(f"{exc}\n\nStart the service with `python src/routing_service.py` (URL: {service_url}).")
+    st.stop()
+
 
 # ---- File Upload Section ----
 uploaded_file = st.file_uploader("📤 Upload clustered waste data (CSV)", type=["csv"])
 
 if uploaded_file:
-    df = pd.read_csv(uploaded_file)
+    data = uploaded_file.getvalue()
+    df = pd.read_csv(io.BytesIO(data), nrows=5)
     st.success("✅ File uploaded successfully!")
-    st.dataframe(df.head())
+    st.dataframe(df)
 
-    # ---- Route Optimization ----
+    # ---- Route Optimization (runs in the routing service, not in this app) ----
     if st.button("🚚 Run Route Optimization"):
-        df.to_csv("data/clustered_points.csv", index=False)
-        with st.spinner("Optimizing routes..."):
-            optimize_routes()
-        st.success("✅ Route optimization completed!")
-
-        # Display summary
-        summary = pd.read_csv("data/route_summary.csv")
-        st.subheader("📊 Route Summary")
-        st.dataframe(summary)
-
-        # ---- Visualization ----
-        st.subheader("🗺️ Cluster Visualization")
-        fig = px.scatter_mapbox(
-            df,
-            lat="latitude",
-            lon="longitude",
-            color="cluster",
-            size="waste_kg",
-            hover_name="id",
-            zoom=10,
-            height=600,
-        )
-        fig.update_layout(mapbox_style="open-street-map")
-        st.plotly_chart(fig, use_container_width=True)
-
-        # ---- Report Generation ----
-        if st.button("📑 Generate Final Report (Excel + PDF)"):
-            with st.spinner("Generating report..."):
-                os.makedirs("outputs", exist_ok=True)
-                generate_final_report()  # Creates Excel + PDF
-            st.success("✅ Reports generated successfully!")
-            st.download_button("⬇️ Download Excel", open("outputs/final_report.xlsx", "rb"), file_name="final_report.xlsx")
-            st.download_button("⬇️ Download PDF", open("outputs/final_report.pdf", "rb"), file_name="final_report.pdf")
+        try:
+            job = submit_job(data, {'time_limit': time_limit, 'recluster': recluster}, service_url)
+        except (OSError, RuntimeError) as exc:
+            service_error(exc)
+        st.session_state['job_id'] = job['id']
+        if job['deduplicated']:
+            st.info(f"♻️ Identical upload already submitted – showing job {job['id']}.")
+
+    job_id = st.session_state.get('job_id')
+    if job_id:
+        try:
+            status = job_status(job_id, service_url)
+        except (OSError, RuntimeError) as exc:
+            service_error(exc)
+
+        if status['status'] in ("queued", "running"):
+            label = (f"Queued (position {status['position']})" if status['status'] == "queued"
+                     else f"Running – last finished stage: {status['stage'] or 'starting'}")
+            st.progress(status['progress'], text=label)
+            with st.expander("Job log"):
+                st.code(job_log(job_id, service_url)[-4000:] or "…")
+            time.sleep(POLL_SECONDS)
+            st.rerun()
+        elif status['status'] == "failed":
+            st.error(f"❌ Job {job_id} failed: {status['error']}")
+            st.code(job_log(job_id, service_url)[-4000:])
+        else:
+            result = job_result(job_id, service_url)
+            st.success(f"✅ Route optimization completed: {result['clusters']} clusters, "
+                       f"{result['total_distance_km']:.1f} km")
+
+            # Display summary
+            st.subheader("📊 Route Summary")
+            st.dataframe(pd.DataFrame(result['summary']))
+
+            # ---- Visualization ----
+            st.subheader("🗺️ Cluster Visualization")
+            clustered = pd.read_csv(io.BytesIO(fetch_file(job_id, "data/clustered_points.csv", service_url)))
+            fig = px.scatter_mapbox(
+                clustered,
+                lat="latitude",
+                lon="longitude",
+                color=clustered["cluster"].astype(str),
+                size="waste_kg",
+                hover_name="id" if "id" in clustered.columns else None,
+                zoom=10,
+                height=600,
+            )
+            fig.update_layout(mapbox_style="open-street-map")
+            st.plotly_chart(fig, use_container_width=True)
+
+            # ---- Reports (generated by the job) ----
+            for name, label in (("outputs/final_report.xlsx", "⬇️ Download Excel"),
+                                ("outputs/final_report.pdf", "⬇️ Download PDF")):
+                if name in result['files']:
+                    st.download_button(label, fetch_file(job_id, name, service_url),
+                                       file_name=name.split("/")[-1])
 else:
     st.info("👆 Please upload a clustered_points.csv file to begin.")
@@ -1,20 +1,79 @@
+import argparse
+import numpy as np
 import pandas as pd
-import random
-import os
+from storage import write_table
 
-def simulate_city_points(center_lat=28.7041, center_lon=77.1025, n=200, spread_km=5):
-    os.makedirs('data', exist_ok=True)
+def simulate_city_points(center_lat=28.7041, center_lon=77.1025, n=200, spread_km=5, seed=None, save=True):
+    """
+    Random bins around the centre, drawn in one vectorized pass (1M points in well under a second).
+    seed makes the draw reproducible, save=False skips writing the table.
+    """
+    rng = np.random.default_rng(seed)
+    half = spread_km / 111
 
-    pts = []
-    for i in range(1, n+1):
-        lat = center_lat + random.uniform(-spread_km/111, spread_km/111)
-        lon = center_lon + random.uniform(-spread_km/111, spread_km/111)
-        waste = random.randint(3, 30)
-        pts.append((i, lat, lon, waste))
+    df = pd.DataFrame({
+        'id': np.arange(1, n + 1, dtype=np.int32),
+        'latitude': center_lat + rng.uniform(-half, half, n),
+        'longitude': center_lon + rng.uniform(-half, half, n),
+        'waste_kg': rng.integers(3, 31, n).astype(np.float32),
+    })
+    if save:
+        path = write_table(df, 'simulated_points')
+        print('Saved', path, 'with', len(df), 'points')
+    return df
 
-    df = pd.DataFrame(pts, columns=['id', 'latitude', 'longitude', 'waste_kg'])
-    df.to_csv('data/simulated_points.csv', index=False)
-    print('Saved data/simulated_points.csv with', len(df), 'points')
+def simulate_time_windows(points, market_share=0.1, hospital_share=0.05, seed=None):
+    """
+    Add tw_start / tw_end / service_min (minutes since midnight) to a copy of points:
+    market bins must be emptied before 07:00, hospital bins in one of the fixed
+    one-hour slots, every other bin any time in the shift (NaN window).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(points)
+    kind = rng.choice(3, size=n, p=[market_share, hospital_share, 1 - market_share - hospital_share])
+    slots = np.array([9 * 60, 11 * 60])
+    slot = slots[rng.integers(0, len(slots), n)]
+    out = points.copy()
+    out['tw_start'] = np.where(kind == 0, 5 * 60, np.where(kind == 1, slot, np.nan)).astype(np.float32)
+    out['tw_end'] = np.where(kind == 0, 7 * 60, np.where(kind == 1, slot + 60, np.nan)).astype(np.float32)
+    out['service_min'] = np.where(kind == 2, rng.uniform(1, 3, n), rng.uniform(3, 6, n)).round(1).astype(np.float32)
+    return out
+
+def simulate_sensor_readings(points, readings_per_bin=4, seed=None, start="2024-01-01", hours=24):
+    """
+    Fill-level feed for load-testing ingestion: several timestamped waste_kg readings
+    per bin in random order, with fill growing over the day towards each bin's waste_kg.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(points) * readings_per_bin
+    rows = np.repeat(np.arange(len(points)), readings_per_bin)
+    offsets = rng.uniform(0, hours * 3600, n)
+    fill = points['waste_kg'].to_numpy(dtype=np.float64)[rows] * (offsets / (hours * 3600))
+    order = rng.permutation(n)
+    return pd.DataFrame({
+        'id': points['id'].to_numpy()[rows][order],
+        'latitude': points['latitude'].to_numpy()[rows][order],
+        'longitude': points['longitude'].to_numpy()[rows][order],
+        'waste_kg': fill[order].round(1).astype(np.float32),
+        'timestamp': pd.Timestamp(start) + pd.to_timedelta(offsets[order], unit='s'),
+    })
 
 if __name__ == '__main__':
-    simulate_city_points(n=300)
+    parser = argparse.ArgumentParser(description="Generate a synthetic city of waste bins.")
+    parser.add_argument("--n", type=int, default=300, help="number of bins")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--readings", help="also write a sensor feed for these bins to this .csv/.parquet path")
+    parser.add_argument("--time-windows", action="store_true",
+                        help="give market and hospital bins service windows (VRPTW test data)")
+    args = parser.parse_args()
+    points = simulate_city_points(n=args.n, seed=args.seed, save=not args.time_windows)
+    if args.time_windows:
+        points = simulate_time_windows(points, seed=args.seed)
+        print('Saved', write_table(points, 'simulated_points'), 'with', len(points), 'points and service windows')
+    if args.readings:
+        feed = simulate_sensor_readings(points, seed=args.seed)
+        if args.readings.endswith('.parquet'):
+            feed.to_parquet(args.readings, index=False)
+        else:
+            feed.to_csv(args.readings, index=False)
+        print('Saved', args.readings, 'with', len(feed), 'readings')
@@ -0,0 +1,143 @@
+# src/distance_matrix.py
+import numpy as np
+from instrumentation import count, timer
+
+# --------------------------
+# EARTH MODELS
+# --------------------------
+EARTH_RADIUS_KM = 6371.009          # mean radius (same value geopy uses)
+WGS84_A = 6378.137                  # semi-major axis, km
+WGS84_F = 1 / 298.257223563         # flattening
+WGS84_B = WGS84_A * (1 - WGS84_F)   # semi-minor axis, km
+
+# Rows processed per batch, keeps temporaries at ~block_rows * n floats
+BLOCK_ROWS = 512
+
+
+# --------------------------
+# HAVERSINE (FAST)
+# --------------------------
+def _haversine_block(phi1, lam1, phi2, lam2):
+    dphi = phi2 - phi1
+    dlam = lam2 - lam1
+    h = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+# --------------------------
+# VINCENTY ON WGS-84 (EXACT)
+# --------------------------
+def _ellipsoidal_block(phi1, lam1, phi2, lam2, max_iter=200, tol=1e-12):
+    """Vectorized Vincenty inverse formula; falls back to haversine where it fails to converge."""
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+    phi1, phi2 = np.broadcast_arrays(phi1, phi2)
+    L = np.broadcast_to(lam2 - lam1, phi1.shape)
+
+    U1 = np.arctan((1 - f) * np.tan(phi1))
+    U2 = np.arctan((1 - f) * np.tan(phi2))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    for _ in range(max_iter):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.sqrt((cosU2 * sin_lam) ** 2 + (cosU1 * sinU2 - sinU1 * cosU2 * cos_lam) ** 2)
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        sin_alpha = np.divide(cosU1 * cosU2 * sin_lam, sin_sigma,
+                              out=np.zeros_like(sin_sigma), where=sin_sigma != 0)
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sm = cos_sigma - np.divide(2 * sinU1 * sinU2, cos2_alpha,
+                                        out=np.zeros_like(cos2_alpha), where=cos2_alpha != 0)
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        lam_prev = lam
+        lam = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+        converged = np.abs(lam - lam_prev) < tol
+        if converged.all():
+            break
+
+    u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sm + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sm ** 2)
+        - B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)))
+    s = b * A * (sigma - delta_sigma)
+
+    if not converged.all():
+        # Nearly antipodal pairs — never happens inside a city, but stay finite
+        s = np.where(converged, s, _haversine_block(phi1, lam1, phi2, lam2))
+    return s
+
+
+_METHODS = {
+    "haversine": _haversine_block,
+    "ellipsoidal": _ellipsoidal_block,
+}
+
+
+# --------------------------
+# PUBLIC API
+# --------------------------
+def pairwise_distances(lat1, lon1, lat2=None, lon2=None, method="haversine", block_rows=BLOCK_ROWS):
+    """
+    Distance matrix in km between two coordinate sets (degrees), as float32.
+    If lat2/lon2 are omitted the square matrix of the first set is returned.
+    method: 'haversine' (spherical, fast), 'ellipsoidal' (WGS-84 Vincenty, matches geopy)
+    or 'road' (shortest paths on the local OSM graph, see road_network.py).
+    """
+    if method == "road":
+        from road_network import road_distances
+        return road_distances(lat1, lon1, lat2, lon2)
+    if method not in _METHODS:
+        raise ValueError(f"Unknown distance method '{method}'. Use one of {sorted(_METHODS)}.")
+    kernel = _METHODS[method]
+
+    phi1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lam1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    if lat2 is None:
+        phi2, lam2 = phi1, lam1
+    else:
+        phi2 = np.radians(np.asarray(lat2, dtype=np.float64))
+        lam2 = np.radians(np.asarray(lon2, dtype=np.float64))
+
+    out = np.empty((len(phi1), len(phi2)), dtype=np.float32)
+    count(f"distance.{method}_evals", out.size)
+    with timer("distance.matrix", rows=len(phi1), cols=len(phi2), method=method):
+        for start in range(0, len(phi1), block_rows):
+            stop = min(start + block_rows, len(phi1))
+            out[start:stop] = kernel(phi1[start:stop, None], lam1[start:stop, None],
+                                     phi2[None, :], lam2[None, :])
+    if lat2 is None:
+        np.fill_diagonal(out, 0.0)
+    return out
+
+
+def distance_matrix(points, method="haversine"):
+    """Square float32 distance matrix (km) for a DataFrame with latitude/longitude columns."""
+    return pairwise_distances(points['latitude'].to_numpy(), points['longitude'].to_numpy(),
+                              method=method)
+
+
+def pair_distances(lat1, lon1, lat2, lon2, method="haversine"):
+    """Element-wise distances (km) between matching rows of two coordinate arrays."""
+    if method == "road":
+        from road_network import road_pair_distances
+        return road_pair_distances(lat1, lon1, lat2, lon2)
+    if method not in _METHODS:
+        raise ValueError(f"Unknown distance method '{method}'. Use one of {sorted(_METHODS)}.")
+    count(f"distance.{method}_evals", np.size(lat1))
+    return _METHODS[method](np.radians(np.asarray(lat1, dtype=np.float64)),
+                            np.radians(np.asarray(lon1, dtype=np.float64)),
+                            np.radians(np.asarray(lat2, dtype=np.float64)),
+                            np.radians(np.asarray(lon2, dtype=np.float64)))
+
+
+def route_length(route, dist):
+    """Total length (km) of a node sequence, accumulated in float64."""
+    route = np.asarray(route)
+    if len(route) < 2:
+        return 0.0
+    return float(dist[route[:-1], route[1:]].astype(np.float64).sum())
@@ -1,36 +1,161 @@
+import json
 import os
+import numpy as np
 import pandas as pd
 from fpdf import FPDF
+from instrumentation import count, timer
+from storage import STORAGE_FORMAT, read_table, table_exists, table_path, write_table
+
+try:
+    import xlsxwriter
+except ImportError:         # pragma: no cover - falls back to pandas' default Excel writer
+    xlsxwriter = None
 
 # File paths
-clustered_points_path = "data/clustered_points.csv"
-summary_path = "data/route_summary.csv"
 report_excel_path = "outputs/final_report.xlsx"
 report_pdf_path = "outputs/final_report.pdf"
+report_points_name = "report_points"                # every clustered point, as outputs/report_points.<format>
+report_state_path = "outputs/report_state.json"     # input fingerprint of each written section
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+POINT_SHEET_ROWS = 50_000       # clustered points per Excel sheet ...
+MAX_POINT_SHEETS = 1            # ... and at most this many such sheets (all points are in the points table)
+PDF_TABLE_ROWS = 200            # rows per PDF table; longer tables are cut off with a pointer to the workbook
 
 # Ensure outputs folder exists
 os.makedirs("outputs", exist_ok=True)
 
-def main():
-    # --- Load Data ---
-    if not os.path.exists(clustered_points_path):
-        print("❌ clustered_points.csv not found. Run the clustering step first.")
-        return
-    if not os.path.exists(summary_path):
-        print("❌ route_summary.csv not found. Run route_optimization.py first.")
+
+# --------------------------
+# TABLES
+# --------------------------
+def vehicle_summary(trips_df):
+    """Per-vehicle totals of a trip_summary table, with fuel, cost and CO₂."""
+    from route_optimization import route_costs
+
+    vehicles = trips_df.groupby("vehicle").agg(
+        trips=('trip', 'count'), stops=('stops', 'sum'), load_kg=('load_kg', 'sum'), distance_km=('distance_km', 'sum')
+    ).reset_index()
+    fuel, cost, co2 = route_costs(vehicles['distance_km'].to_numpy())
+    return vehicles.assign(distance_km=vehicles['distance_km'].round(2), load_kg=vehicles['load_kg'].round(1),
+                           fuel_liters=np.round(fuel, 2), cost_rs=np.round(cost, 0), co2_kg=np.round(co2, 1))
+
+
+def _sheet_rows(df):
+    """Row tuples of plain Python values (NaN/NaT as None), built column-wise."""
+    columns = []
+    for name in df.columns:
+        s = df[name]
+        if s.isna().any():
+            s = s.astype(object).where(s.notna(), None)
+        columns.append(s.tolist())
+    return zip(*columns)
+
+
+def _write_excel(path, sheets):
+    """
+    Write [(sheet name, frame), ...]. With xlsxwriter the workbook is streamed in
+    constant-memory mode: each row is flushed to disk as it is written.
+    """
+    if xlsxwriter is None:
+        with pd.ExcelWriter(path) as writer:
+            for name, df in sheets:
+                df.to_excel(writer, sheet_name=name, index=False)
         return
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True,
+                                          'remove_timezone': True})
+    bold = workbook.add_format({'bold': True})
+    for name, df in sheets:
+        sheet = workbook.add_worksheet(name[:31])
+        sheet.freeze_panes(1, 0)
+        sheet.set_column(0, max(len(df.columns) - 1, 0), 14)
+        sheet.write_row(0, 0, [str(c) for c in df.columns], bold)
+        for r, row in enumerate(_sheet_rows(df), start=1):
+            sheet.write_row(r, 0, row)
+        count("report.excel_rows", len(df))
+    workbook.close()
+
+
+def _pdf_table(pdf, df, columns, title):
+    """
+    Bordered table of df: columns is [(column, header, width mm, printf format), ...].
+    Cell text is formatted a whole column at a time; at most PDF_TABLE_ROWS rows are drawn.
+    """
+    shown = df.iloc[:PDF_TABLE_ROWS]
+    pdf.set_font("Arial", 'B', 13)
+    pdf.cell(0, 10, title, ln=True)
+    pdf.set_font("Arial", 'B', 10)
+    for _, header, width, _ in columns:
+        pdf.cell(width, 8, header, 1)
+    pdf.ln()
+    texts = [np.char.mod(fmt, shown[col].to_numpy(dtype=object if fmt == "%s" else np.float64)).tolist()
+             for col, _, _, fmt in columns]
+    widths = [width for _, _, width, _ in columns]
+    pdf.set_font("Arial", '', 10)
+    for row in zip(*texts):
+        for text, width in zip(row, widths):
+            pdf.cell(width, 7, text, 1)
+        pdf.ln()
+    if len(df) > len(shown):
+        pdf.set_font("Arial", 'I', 9)
+        pdf.cell(0, 7, f"... {len(df) - len(shown)} more rows in {os.path.basename(report_excel_path)}", ln=True)
+    pdf.ln(4)
+
+
+# --------------------------
+# SECTIONS
+# --------------------------
+def _load_state():
+    try:
+        with open(report_state_path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
 
-    clustered_df = pd.read_csv(clustered_points_path)
-    route_df = pd.read_csv(summary_path)
+def _section(state, name, path, key, force, build):
+    """Run build() unless the section's last inputs had the same key and its file still exists."""
+    if not force and state.get(name, {}).get('key') == key and os.path.exists(path):
+        print(f"⏭️ {name} unchanged – keeping {path}")
+        return False
+    build()
+    state[name] = {'key': key, 'path': path}
+    return True
+
+
+def generate_final_report(clustered_df=None, route_df=None, to_excel=True, to_pdf=True, trips_df=None, force=False):
+    """
+    Excel and/or PDF report from in-memory frames (or the tables in data/); returns the cluster summary.
+    Every point goes to the report_points table; the workbook holds at most POINT_SHEET_ROWS x MAX_POINT_SHEETS
+    of them next to the cluster, vehicle and trip tables (trips from trip_summary for fleet runs).
+    Sections whose inputs are unchanged since the last report are not rewritten unless force=True.
+    """
+    from pipeline import fingerprint
+
+    # --- Load Data ---
+    if clustered_df is None:
+        if not table_exists("clustered_points"):
+            print("❌ clustered_points not found. Run the clustering step first.")
+            return None
+        clustered_df = read_table("clustered_points")
+    if route_df is None:
+        if not table_exists("route_summary"):
+            print("❌ route_summary not found. Run route_optimization.py first.")
+            return None
+        route_df = read_table("route_summary")
 
     # --- Clean Columns ---
+    route_df = route_df.copy()
     route_df.columns = route_df.columns.str.strip().str.lower()
+    if trips_df is None and 'trips' in route_df.columns and table_exists("trip_summary"):
+        trips_df = read_table("trip_summary")
+    vehicles_df = vehicle_summary(trips_df) if trips_df is not None and len(trips_df) else None
 
     # --- Merge Cluster Summary ---
-    cluster_summary = clustered_df.groupby("cluster").agg(
-        Num_Points=('latitude', 'count')
-    ).reset_index()
-
+    cluster_summary = clustered_df['cluster'].value_counts(sort=False).rename_axis("cluster") \
+        .rename("Num_Points").reset_index().sort_values("cluster")
     final_summary = pd.merge(cluster_summary, route_df, on="cluster", how="left")
 
     # --- Calculate Totals ---
@@ -39,53 +164,95 @@ def main():
     total_cost = final_summary["cost_rs"].sum()
     total_co2 = final_summary["co2_kg"].sum()
 
+    os.makedirs(os.path.dirname(report_state_path), exist_ok=True)
+    state = _load_state()
+    points_fp = fingerprint(clustered_df)
+    tables_fp = fingerprint((final_summary, trips_df, vehicles_df))
+    points_path = table_path(report_points_name, data_dir="outputs")
+    created = []
+
+    # --- Full Point Table ---
+    def write_points():
+        with timer("report.points", rows=len(clustered_df)):
+            write_table(clustered_df, report_points_name, data_dir="outputs")
+        print(f"✅ Point table saved: {points_path}")
+
+    if _section(state, "points", points_path, [points_fp, STORAGE_FORMAT], force, write_points):
+        created.append(points_path)
+
     # --- Save Excel Report ---
-    with pd.ExcelWriter(report_excel_path) as writer:
-        clustered_df.to_excel(writer, sheet_name="Clustered Points", index=False)
-        final_summary.to_excel(writer, sheet_name="Cluster Summary", index=False)
+    if to_excel:
+        def write_excel():
+            limit = POINT_SHEET_ROWS * MAX_POINT_SHEETS
+            sheets = [(f"Clustered Points{f' {i // POINT_SHEET_ROWS + 1}' if i else ''}",
+                       clustered_df.iloc[i:i + POINT_SHEET_ROWS]) for i in range(0, min(len(clustered_df), limit),
+                                                                          POINT_SHEET_ROWS)]
+            sheets.append(("Cluster Summary", final_summary))
+            if vehicles_df is not None:
+                sheets += [("Vehicles", vehicles_df), ("Trips", trips_df)]
+            with timer("report.excel", rows=len(clustered_df)):
+                _write_excel(report_excel_path, sheets)
+            print(f"✅ Excel report saved: {report_excel_path}")
+            if len(clustered_df) > limit:
+                print(f"ℹ️ Workbook lists the first {limit} of {len(clustered_df)} points; all are in {points_path}")
 
-    print(f"✅ Excel report saved: {report_excel_path}")
+        if _section(state, "excel", report_excel_path,
+                    [points_fp, tables_fp, POINT_SHEET_ROWS, MAX_POINT_SHEETS], force, write_excel):
+            created.append(report_excel_path)
 
     # --- Generate PDF Report ---
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-
-    # Title
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(200, 10, txt="Solid Waste Route Optimization Report", ln=True, align="C")
-
-    pdf.set_font("Arial", '', 12)
-    pdf.ln(10)
-    pdf.cell(200, 10, txt=f"Total Clusters: {len(final_summary)}", ln=True)
-    pdf.cell(200, 10, txt=f"Total Distance: {total_distance:.2f} km", ln=True)
-    pdf.cell(200, 10, txt=f"Total Fuel Used: {total_fuel:.2f} L", ln=True)
-    pdf.cell(200, 10, txt=f"Total Cost: Rs {total_cost:.2f}", ln=True)
-    pdf.cell(200, 10, txt=f"Total CO2 Emission: {total_co2:.2f} kg", ln=True)
-    pdf.ln(10)
-
-    # --- Table Header ---
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(20, 10, "Cluster", 1)
-    pdf.cell(40, 10, "Points", 1)
-    pdf.cell(40, 10, "Distance (km)", 1)
-    pdf.cell(40, 10, "Fuel (L)", 1)
-    pdf.cell(40, 10, "CO2 (kg)", 1, ln=True)
-
-    # --- Table Data ---
-    pdf.set_font("Arial", '', 12)
-    for _, row in final_summary.iterrows():
-        pdf.cell(20, 10, str(row['cluster']), 1)
-        pdf.cell(40, 10, str(row['Num_Points']), 1)
-        pdf.cell(40, 10, f"{row['distance_km']:.2f}", 1)
-        pdf.cell(40, 10, f"{row['fuel_liters']:.2f}", 1)
-        pdf.cell(40, 10, f"{row['co2_kg']:.2f}", 1, ln=True)
-
-    pdf.output(report_pdf_path)
-    print(f"✅ PDF report saved: {report_pdf_path}")
+    def write_pdf():
+        pdf = FPDF()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        pdf.add_page()
+
+        # Title
+        pdf.set_font("Arial", 'B', 16)
+        pdf.cell(200, 10, txt="Solid Waste Route Optimization Report", ln=True, align="C")
+
+        pdf.set_font("Arial", '', 12)
+        pdf.ln(10)
+        pdf.cell(200, 10, txt=f"Total Clusters: {len(final_summary)}", ln=True)
+        pdf.cell(200, 10, txt=f"Total Distance: {total_distance:.2f} km", ln=True)
+        pdf.cell(200, 10, txt=f"Total Fuel Used: {total_fuel:.2f} L", ln=True)
+        pdf.cell(200, 10, txt=f"Total Cost: Rs {total_cost:.2f}", ln=True)
+        pdf.cell(200, 10, txt=f"Total CO2 Emission: {total_co2:.2f} kg", ln=True)
+        if vehicles_df is not None:
+            pdf.cell(200, 10, txt=f"Vehicles: {len(vehicles_df)} | Trips: {len(trips_df)}", ln=True)
+        pdf.ln(10)
+
+        # --- Tables ---
+        _pdf_table(pdf, final_summary, [("cluster", "Cluster", 20, "%s"), ("Num_Points", "Points", 30, "%.0f"),
+                                        ("distance_km", "Distance (km)", 35, "%.2f"),
+                                        ("fuel_liters", "Fuel (L)", 30, "%.2f"), ("cost_rs", "Cost (Rs)", 35, "%.0f"),
+                                        ("co2_kg", "CO2 (kg)", 30, "%.2f")], "Clusters")
+        if vehicles_df is not None:
+            _pdf_table(pdf, vehicles_df, [("vehicle", "Vehicle", 20, "%s"), ("trips", "Trips", 20, "%.0f"),
+                                          ("stops", "Stops", 25, "%.0f"), ("load_kg", "Load (kg)", 30, "%.1f"),
+                                          ("distance_km", "Distance (km)", 35, "%.2f"),
+                                          ("cost_rs", "Cost (Rs)", 30, "%.0f"), ("co2_kg", "CO2 (kg)", 25, "%.1f")],
+                       "Vehicles")
+            _pdf_table(pdf, trips_df, [("vehicle", "Vehicle", 20, "%s"), ("trip", "Trip", 20, "%s"),
+                                       ("cluster", "Cluster", 20, "%s"), ("stops", "Stops", 25, "%.0f"),
+                                       ("load_kg", "Load (kg)", 30, "%.1f"), ("dump_site", "Dump", 20, "%s"),
+                                       ("distance_km", "Distance (km)", 35, "%.2f")], "Trips")
 
+        with timer("report.pdf"):
+            pdf.output(report_pdf_path)
+        print(f"✅ PDF report saved: {report_pdf_path}")
+
+    if to_pdf and _section(state, "pdf", report_pdf_path, tables_fp, force, write_pdf):
+        created.append(report_pdf_path)
+
+    with open(report_state_path, "w") as fh:
+        json.dump(state, fh, indent=1)
     print("\n📊 Report generation complete!")
-    print(f"📁 Files created:\n- {report_excel_path}\n- {report_pdf_path}")
+    if created:
+        print("📁 Files created:\n" + "\n".join(f"- {path}" for path in created))
+    return final_summary
+
+def main():
+    generate_final_report()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,218 @@
+# src/hierarchical.py
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.spatial import cKDTree
+from sklearn.cluster import KMeans
+from instrumentation import count, timer
+from storage import read_table, write_table
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+LEAF_MAX_POINTS = 5000          # quadtree cells are split until they hold at most this many bins
+QUADTREE_MAX_DEPTH = 16         # stop splitting (e.g. stacked duplicate coordinates) below this depth
+ROUTE_STOPS = 150               # target bins per route cluster inside a cell
+ROUTE_STOPS_SLACK = 1.25        # no route exceeds ROUTE_STOPS x this (rebalancing cap; larger clusters are split)
+MIN_ROUTE_STOPS = 30            # smaller clusters (cell-edge fragments) are merged into a neighbour
+MERGE_CANDIDATES = 8            # nearest clusters tried when folding in a fragment
+BOUNDARY_PASSES = 3             # centroid-update / reassignment rounds across cell borders
+LEAF_WORKERS = 1                # processes clustering cells (<= 0 = every core)
+
+
+def _project_km(lat, lon):
+    """Equirectangular km around the city's mean latitude: one plane shared by every cell."""
+    x = (lon - lon.mean()) * 111.32 * np.cos(np.radians(lat.mean()))
+    y = (lat - lat.mean()) * 110.57
+    return np.column_stack([x, y])
+
+
+def quadtree_leaves(XY, leaf_size=LEAF_MAX_POINTS, max_depth=QUADTREE_MAX_DEPTH):
+    """
+    Index arrays of the quadtree cells over XY. Each cell is split into four at the
+    median x and y of its points, so cells hold similar numbers of bins whatever the
+    density; cells are returned in depth-first order (neighbours stay close in the list).
+    """
+    leaves = []
+    stack = [(np.arange(len(XY)), 0)]
+    while stack:
+        idx, depth = stack.pop()
+        if len(idx) <= leaf_size or depth >= max_depth:
+            leaves.append(idx)
+            continue
+        x, y = XY[idx, 0], XY[idx, 1]
+        east, north = x >= np.median(x), y >= np.median(y)
+        for quadrant in (north & east, north & ~east, ~north & ~east, ~north & east):
+            if quadrant.any():
+                stack.append((idx[quadrant], depth + 1))
+    return leaves
+
+
+def _cluster_leaf(XY, route_stops, random_state):
+    """Pool worker: KMeans labels splitting one cell into routes of about route_stops bins."""
+    k = max(1, int(round(len(XY) / route_stops)))
+    if k == 1:
+        return np.zeros(len(XY), dtype=np.int64)
+    return KMeans(n_clusters=k, n_init=3, random_state=random_state).fit_predict(XY)
+
+
+def _centroids(XY, labels, k):
+    sizes = np.bincount(labels, minlength=k)
+    safe = np.maximum(sizes, 1)
+    return np.column_stack([np.bincount(labels, XY[:, d], k) / safe for d in range(2)]), sizes
+
+
+def _split_oversize(XY, labels, max_stops):
+    """
+    Cut every cluster above max_stops into equal slices along its principal axis
+    (ceil(size / max_stops) slices, so none exceeds the cap). Returns (labels, clusters split).
+    """
+    sizes = np.bincount(labels)
+    big = np.flatnonzero(sizes > max_stops)
+    next_label = len(sizes)
+    for c in big.tolist():
+        members = np.flatnonzero(labels == c)
+        pts = XY[members] - XY[members].mean(axis=0)
+        axis = np.linalg.svd(pts, full_matrices=False)[2][0]
+        parts = np.array_split(members[np.argsort(pts @ axis, kind='stable')], -(-len(members) // max_stops))
+        for part in parts[1:]:
+            labels[part] = next_label
+            next_label += 1
+    return labels, len(big)
+
+
+def rebalance_boundaries(XY, labels, max_stops, min_stops=MIN_ROUTE_STOPS, passes=BOUNDARY_PASSES):
+    """
+    Stitch clusters across cell borders. Cells were clustered independently, so a bin
+    near a border can be closer to a neighbouring cell's centroid: such bins move (largest
+    gain first) while the target has fewer than max_stops bins, then centroids are updated.
+    Clusters left below min_stops are merged into the nearest cluster with room for them,
+    and clusters still above max_stops (e.g. straight from a cell's KMeans) are split.
+    Returns (labels renumbered 0..k-1, bins moved).
+    """
+    labels = labels.copy()
+    moved = 0
+    for _ in range(passes):
+        k = int(labels.max()) + 1
+        centroids, sizes = _centroids(XY, labels, k)
+        dist, near = cKDTree(centroids).query(XY, k=1)
+        own = np.linalg.norm(XY - centroids[labels], axis=1)
+        gain = own - dist
+        candidates = np.flatnonzero((near != labels) & (gain > 1e-9))
+        if not len(candidates):
+            break
+        changed = 0
+        for i in candidates[np.argsort(-gain[candidates])].tolist():
+            src, dst = labels[i], near[i]
+            if sizes[dst] < max_stops and sizes[src] > 1:
+                labels[i] = dst
+                sizes[src] -= 1
+                sizes[dst] += 1
+                changed += 1
+        moved += changed
+        if not changed:
+            break
+
+    # Fold cell-edge fragments into the nearest neighbour that stays within max_stops
+    k = int(labels.max()) + 1
+    centroids, sizes = _centroids(XY, labels, k)
+    small = np.flatnonzero((sizes > 0) & (sizes < min_stops))
+    keep = np.flatnonzero(sizes >= min_stops)
+    if len(small) and len(keep):
+        _, nearest = cKDTree(centroids[keep]).query(centroids[small], k=min(MERGE_CANDIDATES, len(keep)))
+        nearest = nearest.reshape(len(small), -1)
+        target = np.arange(k)
+        merged = 0
+        for f, options in zip(small.tolist(), keep[nearest].tolist()):
+            dst = next((c for c in options if sizes[c] + sizes[f] <= max_stops), None)
+            if dst is None:
+                continue                # no neighbour has room: keep the fragment as a short route
+            target[f] = dst
+            sizes[dst] += sizes[f]
+            merged += 1
+        labels = target[labels]
+        count("hierarchical.merged_fragments", merged)
+
+    labels, split = _split_oversize(XY, labels, max_stops)
+    count("hierarchical.split_clusters", split)
+    return np.unique(labels, return_inverse=True)[1], moved
+
+
+def hierarchical_clusters(df, leaf_size=LEAF_MAX_POINTS, route_stops=ROUTE_STOPS, workers=LEAF_WORKERS,
+                          random_state=42):
+    """
+    Drop-in for cluster_points on very large cities: quadtree cells of at most leaf_size bins,
+    KMeans into ~route_stops-bin routes inside each cell (cells in parallel when workers > 1),
+    then boundary rebalancing across cells. No silhouette sweep; memory per cell is bounded by
+    leaf_size. Returns df with a cluster column, like the other clustering methods.
+    """
+    started = time.perf_counter()
+    XY = _project_km(df['latitude'].to_numpy(dtype=np.float64), df['longitude'].to_numpy(dtype=np.float64))
+    with timer("hierarchical.quadtree", points=len(df)):
+        leaves = quadtree_leaves(XY, leaf_size)
+
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(leaves)) or 1
+    with timer("hierarchical.cluster_cells", cells=len(leaves), workers=workers):
+        cells = [XY[idx] for idx in leaves]
+        stops = [route_stops] * len(cells)
+        seeds = [random_state] * len(cells)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                cell_labels = list(pool.map(_cluster_leaf, cells, stops, seeds,
+                                            chunksize=max(1, len(cells) // (4 * workers))))
+        else:
+            cell_labels = list(map(_cluster_leaf, cells, stops, seeds))
+
+    labels = np.empty(len(df), dtype=np.int64)
+    offset = 0
+    for idx, cell in zip(leaves, cell_labels):
+        labels[idx] = cell + offset
+        offset += int(cell.max()) + 1
+
+    with timer("hierarchical.rebalance", clusters=offset):
+        labels, moved = rebalance_boundaries(XY, labels, max_stops=int(route_stops * ROUTE_STOPS_SLACK))
+    count("hierarchical.boundary_moves", moved)
+
+    sizes = np.bincount(labels)
+    print(f"🌳 Hierarchical clustering: {len(df)} bins → {len(leaves)} cells → {len(sizes)} routes "
+          f"(stops min {sizes.min()} / median {int(np.median(sizes))} / max {sizes.max()}), "
+          f"{moved} border bins rebalanced in {time.perf_counter() - started:.2f} s")
+    out = df.copy()
+    out['cluster'] = labels
+    return out
+
+
+def solve_hierarchical(df=None, leaf_size=LEAF_MAX_POINTS, route_stops=ROUTE_STOPS, workers=LEAF_WORKERS,
+                       save=True, export_csv=False, **routing):
+    """
+    Cluster hierarchically and route every cluster (optimize_routes, clusters in parallel
+    with the same workers); writes clustered_points and route_summary in the usual schema.
+    Returns (clustered df, route summary).
+    """
+    from route_optimization import optimize_routes
+
+    if df is None:
+        df = read_table("simulated_points")
+    clustered = hierarchical_clusters(df, leaf_size, route_stops, workers)
+    if save:
+        print(f"📁 Saved {write_table(clustered, 'clustered_points', export_csv=export_csv)}")
+    summary = optimize_routes(df=clustered, workers=workers, save=save, render=False, **routing)
+    return clustered, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quadtree → per-cell clustering → parallel routing for large cities.")
+    parser.add_argument("--points", help="bins to route (default: the simulated_points table)")
+    parser.add_argument("--leaf-size", type=int, default=LEAF_MAX_POINTS, help="max bins per quadtree cell")
+    parser.add_argument("--route-stops", type=int, default=ROUTE_STOPS, help="target bins per route")
+    parser.add_argument("--workers", type=int, default=LEAF_WORKERS, help="processes for cells and routes (0 = all cores)")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds of local search per route")
+    parser.add_argument("--export-csv", action="store_true", help="also write clustered_points.csv")
+    args = parser.parse_args()
+    routing = {'time_limit': args.time_limit} if args.time_limit is not None else {}
+    solve_hierarchical(read_table(args.points) if args.points else None, args.leaf_size, args.route_stops,
+                       args.workers, export_csv=args.export_csv, **routing)
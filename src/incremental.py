@@ -0,0 +1,320 @@
+# src/incremental.py
+import argparse
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+from clustering import MODEL_PATH
+from distance_matrix import pair_distances, pairwise_distances, route_length
+from local_search import N_NEIGHBOURS, improve_tour
+from road_network import get_graph
+from storage import read_table, replace_clusters, table_exists, write_table
+from route_optimization import (LOCAL_SEARCH_TIME_LIMIT, ROUTES_TABLE, ROUTE_SETTINGS_PATH,
+                                close_tour, route_costs, schedule_columns, schedule_summary, solve_route)
+from time_windows import ROAD_CIRCUITY, SpeedModel, has_windows, window_arrays
+
+
+# --------------------------
+# CLUSTER ASSIGNMENT
+# --------------------------
+def assign_clusters(new_points, clustered):
+    """
+    Nearest-centroid cluster for each new point. Uses the KMeans model saved by
+    cluster_points when it matches the current labels, otherwise the lat/lon
+    centroids of the existing clusters (e.g. after a DBSCAN run).
+    """
+    labels = np.sort(clustered['cluster'].unique())
+    if os.path.exists(MODEL_PATH):
+        saved = joblib.load(MODEL_PATH)
+        model = saved['model']
+        if np.array_equal(np.arange(model.n_clusters), labels):
+            X = saved['scaler'].transform(new_points[saved['features']])
+            return model.predict(X)
+
+    centroids = clustered.groupby('cluster')[['latitude', 'longitude']].mean()
+    centroids = centroids[centroids.index >= 0]        # never assign to DBSCAN noise
+    d = ((new_points[['latitude', 'longitude']].to_numpy()[:, None, :] - centroids.to_numpy()[None, :, :]) ** 2).sum(-1)
+    return centroids.index.to_numpy()[d.argmin(axis=1)]
+
+
+# --------------------------
+# LAZY DISTANCES
+# --------------------------
+class _LazyDistances:
+    """
+    Stand-in for a node distance matrix that computes a row (one node to every
+    node) the first time it is read, so a repair pays for the stops it touches
+    rather than for all n² pairs. dist[a, b] with a scalar reads row a; with arrays
+    it is element-wise, using cached rows and computing the other pairs directly.
+    """
+
+    def __init__(self, lat, lon, method):
+        self.lat, self.lon, self.method = lat, lon, method
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.lat)
+
+    def row(self, a):
+        r = self.rows.get(a)
+        if r is None:
+            r = pairwise_distances(self.lat[a:a + 1], self.lon[a:a + 1], self.lat, self.lon, method=self.method)[0]
+            r[a] = 0.0
+            self.rows[a] = r
+        return r
+
+    def __getitem__(self, key):
+        a, b = key
+        if np.ndim(a) == 0:
+            return self.row(int(a))[b]
+        a = np.asarray(a, dtype=np.int64)
+        b = np.broadcast_to(np.asarray(b, dtype=np.int64), a.shape)
+        out = np.empty(a.shape, dtype=np.float32)
+        cached = np.fromiter((x in self.rows for x in a.tolist()), dtype=bool, count=len(a))
+        for k in np.flatnonzero(cached).tolist():
+            out[k] = self.rows[int(a[k])][b[k]]
+        rest = ~cached
+        if rest.any():
+            ra, rb = a[rest], b[rest]
+            d = pair_distances(self.lat[ra], self.lon[ra], self.lat[rb], self.lon[rb], method=self.method)
+            out[rest] = np.where(ra == rb, 0.0, d)
+        return out
+
+
+class _NearestStops:
+    """Candidate lists for local search, built per node on first use (BallTree kNN, sorted by dist)."""
+
+    def __init__(self, tree, X, dist, k=N_NEIGHBOURS):
+        self.tree, self.X, self.dist = tree, X, dist
+        self.k = min(k + 1, len(X))
+        self.lists = {}
+
+    def __getitem__(self, a):
+        cand = self.lists.get(a)
+        if cand is None:
+            nearest = self.tree.query(self.X[a:a + 1], k=self.k)[1][0]
+            nearest = nearest[nearest != a]
+            d = self.dist.row(a)[nearest]
+            cand = self.lists[a] = nearest[np.argsort(d, kind='stable')].tolist()
+        return cand
+
+
+# --------------------------
+# TOUR REPAIR
+# --------------------------
+def _cheapest_insertion(succ, pred, node, dist, nearby):
+    """
+    Insert node into the closed tour held as succ/pred links, on the edge either side of
+    one of the nearby tour stops where it adds the least distance; returns its neighbours.
+    """
+    if not succ:
+        succ[node] = pred[node] = node
+        return []
+    edges = sorted({(pred[v], v) for v in nearby} | {(v, succ[v]) for v in nearby})
+    arr = np.array([a for a, _ in edges])
+    nxt = np.array([b for _, b in edges])
+    added = dist[node, arr].astype(np.float64) + dist[node, nxt] - dist[arr, nxt]
+    a, b = edges[int(np.argmin(added))]
+    succ[a], pred[node], succ[node], pred[b] = node, a, b, node
+    return [a, b] if a != b else [a]
+
+
+def _nearest_in_tour(tree, X, node, in_tour, k=N_NEIGHBOURS):
+    """Up to k tour stops nearest to node (BallTree query widened until one is found)."""
+    want = min(len(X), k + 1)
+    while True:
+        near = tree.query(X[node:node + 1], k=want)[1][0]
+        near = near[in_tour[near]][:k]
+        if len(near) or want == len(X):
+            return near.tolist()
+        want = min(len(X), want * 4)
+
+
+def _repair_cluster(points, old_ids, new_ids, settings, time_limit):
+    """
+    Drop vanished stops from the saved order, insert new ones cheapest-first, then local
+    search nearby. Distances are computed lazily and neighbour lists only for the stops
+    the search reaches, so the cost follows the size of the diff, not the cluster's n².
+    """
+    n = len(points)
+    depot, dump_sites = settings.get('depot'), settings.get('dump_sites') or []
+    # Node order as in route_optimization.node_matrix: bins, depot, dump sites
+    facilities = ([tuple(depot)] if depot is not None else []) + [tuple(d) for d in dump_sites]
+    node_lat = np.concatenate([points['latitude'].to_numpy(dtype=np.float64), [f[0] for f in facilities]])
+    node_lon = np.concatenate([points['longitude'].to_numpy(dtype=np.float64), [f[1] for f in facilities]])
+    dist = _LazyDistances(node_lat, node_lon, settings.get('distance_method', 'haversine'))
+    m = n + (depot is not None)
+    X = np.radians(np.column_stack([node_lat[:m], node_lon[:m]]))
+    tree = BallTree(X, metric='haversine')
+    pos_of = dict(zip(points['id'].tolist(), range(n)))
+
+    # A bin moved within its own cluster is still in pos_of: it leaves its old place like a
+    # removed stop and comes back through new_ids
+    joining = set(new_ids)
+    tour = [n] if depot is not None else []
+    touched = set()
+    gap = False
+    for i in old_ids:
+        if i not in pos_of or i in joining:
+            if tour:
+                touched.add(tour[-1])   # neighbours of a removed stop
+            gap = True
+            continue
+        tour.append(pos_of[i])
+        if gap:
+            touched.add(tour[-1])
+            gap = False
+    if gap and len(tour) > 1:
+        touched.add(tour[0])            # the gap closes the tour
+    in_tour = np.zeros(m, dtype=bool)
+    in_tour[tour] = True
+    # Insert on a linked tour so each candidate edge and each insertion is O(1)
+    succ = dict(zip(tour, tour[1:] + tour[:1]))
+    pred = {b: a for a, b in succ.items()}
+    for i in new_ids:
+        p = pos_of[i]
+        nearby = _nearest_in_tour(tree, X, p, in_tour) if succ else []
+        touched.update(_cheapest_insertion(succ, pred, p, dist, nearby))
+        touched.add(p)
+        in_tour[p] = True
+    head = tour[0] if tour else pos_of[new_ids[0]] if new_ids else None
+    tour = []
+    if head is not None:
+        tour.append(head)
+        while succ[tour[-1]] != head:
+            tour.append(succ[tour[-1]])
+
+    # The tour is read from its old head, so a depot stays first
+    tour, stats = improve_tour(tour, dist, neighbours=_NearestStops(tree, X, dist), time_limit=time_limit,
+                               active_nodes=sorted(touched))
+    demand = points['waste_kg'].to_numpy() if dump_sites else None
+    order, unloads = close_tour(tour, dist, n, demand, dump_sites)
+    return [int(i) for i in order if i < n], route_length(order, dist), stats, unloads
+
+
+def _retime_cluster(points, settings, speed, time_limit):
+    """
+    Re-solve a cluster of a timed plan with the window-aware solver: window feasibility
+    depends on the whole schedule, so a local repair cannot keep it. Costs O(n²) in the
+    cluster's size. Returns (bin order, km, stats, unloads, schedule columns per bin).
+    """
+    n = len(points)
+    dump_sites = settings.get('dump_sites') or []
+    order, km, stats = solve_route(points['latitude'].to_numpy(dtype=np.float64),
+                                   points['longitude'].to_numpy(dtype=np.float64),
+                                   distance_method=settings.get('distance_method', 'haversine'),
+                                   time_limit=time_limit, demand=points['waste_kg'].to_numpy(dtype=np.float64),
+                                   depot=settings.get('depot'), dump_sites=dump_sites,
+                                   windows=window_arrays(points) if has_windows(points) else None, speed=speed)
+    at_bin = np.flatnonzero(np.asarray(order[:-1]) < n)
+    return np.asarray(order)[at_bin], km, stats, stats.get('unloads', 0), schedule_columns(stats['schedule'], at_bin)
+
+
+# --------------------------
+# PUBLIC API
+# --------------------------
+def update_routes(added=None, removed=None, moved=None, time_limit=LOCAL_SEARCH_TIME_LIMIT):
+    """
+    Apply a diff of bins to the current plan without re-clustering the city.
+    added: DataFrame (id, latitude, longitude, waste_kg); removed: iterable of ids;
+    moved: DataFrame (id, latitude, longitude) with new positions.
+    New and moved bins join the nearest cluster; only clusters touched by the diff
+    are repaired (cheapest insertion + local search around the changes), and
+    the clustered_points, cluster_routes and route_summary tables are updated in place.
+    In a timed plan (service windows or a speed model) touched clusters are re-solved
+    with the window-aware solver instead, so their schedules stay consistent.
+    """
+    if not table_exists(ROUTES_TABLE):
+        raise FileNotFoundError(f"❌ {ROUTES_TABLE} table not found. Run route_optimization.py (without a fleet) first.")
+    df = read_table('clustered_points')
+    summary = read_table('route_summary')
+    with open(ROUTE_SETTINGS_PATH) as fh:
+        settings = json.load(fh)
+    if settings.get('distance_method') == "road":
+        get_graph(settings.get('road_graph'))     # re-route on the graph the plan was built with
+
+    removed_ids = set(removed if removed is not None else [])
+    moved = moved if moved is not None else pd.DataFrame(columns=['id', 'latitude', 'longitude'])
+    added = added if added is not None else pd.DataFrame(columns=['id', 'latitude', 'longitude', 'waste_kg'])
+
+    # ---- Removals (moved bins leave their old cluster too) ----
+    leaving = df['id'].isin(removed_ids | set(moved['id']))
+    affected = set(df.loc[leaving, 'cluster'])
+    relocated = df[df['id'].isin(set(moved['id']))].drop(columns=['latitude', 'longitude', 'cluster'])
+    relocated = relocated.merge(moved[['id', 'latitude', 'longitude']], on='id')
+    df = df[~leaving]
+
+    # ---- Additions ----
+    joining = pd.concat([f for f in (added, relocated) if len(f)] or [relocated], ignore_index=True)
+    if len(joining):
+        joining['cluster'] = assign_clusters(joining, df)
+        affected |= set(joining['cluster'])
+        # Columns the stored table has and the diff lacks (e.g. tw_* / service_min) come in as NaN
+        df = pd.concat([df, joining.reindex(columns=df.columns)], ignore_index=True)
+
+    # ---- Repair affected tours only (their stop orders are the only routes read) ----
+    routes = read_table(ROUTES_TABLE, clusters=sorted(affected)) if affected else read_table(ROUTES_TABLE).iloc[:0]
+    changed = df[df['cluster'].isin(affected)]
+    speed = settings.get('speed')
+    timed = speed is not None or 'arrival_min' in routes.columns
+    if timed and speed is None:      # settings written before the speed model was recorded
+        speed = {'circuity': 1.0 if settings.get('distance_method') == "road" else ROAD_CIRCUITY}
+    # A repair is not a fresh construction, so untimed clusters keep the plan's improvement figure
+    improvement = dict(zip(summary['cluster'], summary['improvement_pct']))
+    new_routes, rows = [], []
+    for cluster_id, points in sorted(changed.groupby('cluster'), key=lambda item: item[0]):
+        points = points.reset_index(drop=True)
+        if timed:
+            order, km, stats, unloads, times = _retime_cluster(points, settings, SpeedModel(**speed), time_limit)
+            improvement[cluster_id] = round(stats['improvement_pct'], 1)
+        else:
+            old_ids = routes.loc[routes['cluster'] == cluster_id].sort_values('stop_seq')['id'].tolist()
+            new_ids = joining.loc[joining['cluster'] == cluster_id, 'id'].tolist() if len(joining) else []
+            order, km, stats, unloads = _repair_cluster(points, old_ids, new_ids, settings, time_limit)
+
+        frame = pd.DataFrame({'cluster': cluster_id, 'stop_seq': np.arange(1, len(order) + 1),
+                              'id': points['id'].to_numpy()[order]})
+        new_routes.append(frame.assign(**times) if timed else frame)
+        fuel_used, cost, co2_emission = route_costs(km)
+        row = {'cluster': cluster_id, 'distance_km': round(km, 2), 'fuel_liters': round(fuel_used, 2),
+               'cost_rs': round(cost, 0), 'co2_kg': round(co2_emission, 1),
+               'improvement_pct': improvement.get(cluster_id, 0.0)}
+        if 'unloads' in summary.columns:
+            row['unloads'] = unloads
+        if timed:
+            row.update(schedule_summary(stats['schedule']))
+        rows.append(row)
+        print(f"🔧 Cluster {cluster_id}: {len(points)} stops | {km:.2f} km | ₹{cost:.0f}")
+
+    # ---- Save (only the affected clusters' rows are rewritten; the summary keeps its order) ----
+    order = {c: k for k, c in enumerate(summary['cluster'])}
+    for c in sorted(affected):
+        order.setdefault(c, len(order))
+    summary = summary[~summary['cluster'].isin(affected)]
+    summary = pd.concat([summary, pd.DataFrame(rows)], ignore_index=True)
+    summary = summary.sort_values('cluster', key=lambda s: s.map(order), kind='stable')
+
+    replace_clusters(changed, 'clustered_points', affected)
+    replace_clusters(pd.concat(new_routes, ignore_index=True) if new_routes else routes, ROUTES_TABLE, affected)
+    write_table(summary, 'route_summary')
+    print(f"\n✅ Incremental update: +{len(added)} / -{len(removed_ids)} / ~{len(moved)} bins, "
+          f"{len(affected)} of {df['cluster'].nunique()} clusters re-routed")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-route only the clusters touched by added/removed/moved bins.")
+    parser.add_argument("--added", help="CSV of new bins (id, latitude, longitude, waste_kg)")
+    parser.add_argument("--removed", help="CSV with an id column of bins to drop")
+    parser.add_argument("--moved", help="CSV of relocated bins (id, latitude, longitude)")
+    parser.add_argument("--time-limit", type=float, default=LOCAL_SEARCH_TIME_LIMIT,
+                        help="seconds of local search per affected cluster")
+    args = parser.parse_args()
+    update_routes(
+        added=read_table(args.added) if args.added else None,
+        removed=read_table(args.removed, columns=['id'])['id'].tolist() if args.removed else None,
+        moved=read_table(args.moved) if args.moved else None,
+        time_limit=args.time_limit,
+    )
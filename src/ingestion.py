@@ -0,0 +1,86 @@
+# src/ingestion.py
+import argparse
+import os
+import time
+import pandas as pd
+from storage import apply_schema, csv_dtypes, write_table
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:         # pragma: no cover - CSV-only install
+    pq = None
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+CHUNK_ROWS = 500_000            # rows per chunk read from a feed
+MIN_FILL_KG = 10.0              # bins below this latest waste_kg are not worth a stop
+POINT_COLUMNS = ['id', 'latitude', 'longitude', 'waste_kg']
+TIMESTAMP_COLUMN = "timestamp"
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS, columns=None):
+    """Yield DataFrames of at most chunk_rows rows from a CSV or Parquet feed."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        if pq is None:
+            raise ImportError("❌ Reading Parquet feeds needs pyarrow (pip install pyarrow).")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif ext == '.csv':
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=columns, dtype=csv_dtypes(columns))
+    else:
+        raise ValueError(f"❌ Unsupported feed format: {path} (use .csv or .parquet)")
+
+
+def _latest_per_bin(df, has_time):
+    """Keep the newest reading per bin id (by timestamp, else by position in the feed)."""
+    if has_time:
+        df = df.sort_values(TIMESTAMP_COLUMN, kind='stable')
+    return df.drop_duplicates('id', keep='last')
+
+
+def ingest_readings(sources, min_fill_kg=MIN_FILL_KG, chunk_rows=CHUNK_ROWS, table="simulated_points", save=True):
+    """
+    Stream one or more fill-level feeds (CSV/Parquet) chunk by chunk, keep only
+    the latest reading per bin id and return the bins whose latest waste_kg is at
+    least min_fill_kg, i.e. the routable point set clustering reads. Memory grows
+    with the number of distinct bins, not with the number of readings.
+    save writes the point set to the storage table `table`.
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    started = time.perf_counter()
+    latest = None
+    rows = 0
+    for path in sources:
+        header = next(iter_chunks(path, chunk_rows=1))
+        has_time = TIMESTAMP_COLUMN in header.columns
+        columns = POINT_COLUMNS + ([TIMESTAMP_COLUMN] if has_time else [])
+        for chunk in iter_chunks(path, chunk_rows, columns):
+            rows += len(chunk)
+            if has_time:
+                chunk[TIMESTAMP_COLUMN] = pd.to_datetime(chunk[TIMESTAMP_COLUMN])
+            chunk = apply_schema(_latest_per_bin(chunk, has_time))
+            # Earlier state first so, on equal timestamps, the later chunk wins
+            latest = chunk if latest is None else _latest_per_bin(pd.concat([latest, chunk], ignore_index=True),
+                                                                  has_time)
+    if latest is None:
+        raise ValueError("❌ No readings found.")
+
+    points = latest[latest['waste_kg'] >= min_fill_kg].sort_values('id')[POINT_COLUMNS].reset_index(drop=True)
+    print(f"📥 Ingested {rows} readings → {len(latest)} bins → {len(points)} at ≥ {min_fill_kg:g} kg "
+          f"({time.perf_counter() - started:.2f}s)")
+    if save:
+        print(f"📁 Saved routable points to {write_table(points, table)}")
+    return points
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate sensor fill-level feeds into the routable point set.")
+    parser.add_argument("feeds", nargs="+", help="CSV/Parquet feeds with id, latitude, longitude, waste_kg[, timestamp]")
+    parser.add_argument("--min-fill", type=float, default=MIN_FILL_KG, help="minimum latest waste_kg for a stop")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read per chunk")
+    parser.add_argument("--table", default="simulated_points", help="storage table to write")
+    args = parser.parse_args()
+    ingest_readings(args.feeds, min_fill_kg=args.min_fill, chunk_rows=args.chunk_rows, table=args.table)
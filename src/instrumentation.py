@@ -0,0 +1,151 @@
+# src/instrumentation.py
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+METRICS_PATH = "outputs/run_metrics.json"
+TRACE_PATH = "outputs/run_trace.json"       # open in chrome://tracing or ui.perfetto.dev
+PROFILE_PATH = "outputs/run_profile.prof"   # cProfile stats (snakeviz / pstats)
+PROFILE_TOP = 25                # functions listed in the metrics file from a cProfile capture
+MAX_EVENTS = 200_000            # timeline events kept per process (aggregates are always complete)
+
+_timers = defaultdict(lambda: [0, 0.0, 0.0])     # name -> [calls, total s, max s]
+_counters = defaultdict(float)
+_events = []
+
+
+def record_span(name, start, end, args=None):
+    """Add one timed span (perf_counter seconds) to the aggregates and the timeline."""
+    duration = end - start
+    t = _timers[name]
+    t[0] += 1
+    t[1] += duration
+    t[2] = max(t[2], duration)
+    if len(_events) < MAX_EVENTS:
+        _events.append({'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6,
+                        'pid': os.getpid(), 'tid': threading.get_native_id(), 'args': args or {}})
+
+
+@contextlib.contextmanager
+def timer(name, **args):
+    """Time a block: `with timer("clustering.sweep_k", k_max=10): ...`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, start, time.perf_counter(), args)
+
+
+def timed(name=None):
+    """Decorator form of timer(); the span is named after the function by default."""
+    def wrap(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_span(label, start, time.perf_counter())
+        return inner
+    return wrap
+
+
+def count(name, n=1):
+    _counters[name] += n
+
+
+def reset():
+    _timers.clear()
+    _counters.clear()
+    _events.clear()
+
+
+def collect(clear=True):
+    """Picklable snapshot of this process's metrics (e.g. to return from a pool worker)."""
+    snapshot = {'timers': {k: list(v) for k, v in _timers.items()}, 'counters': dict(_counters),
+                'events': list(_events)}
+    if clear:
+        reset()
+    return snapshot
+
+
+def merge(snapshot):
+    """Fold a worker's snapshot into this process's metrics (its timeline keeps the worker pid)."""
+    for name, (calls, total, longest) in snapshot['timers'].items():
+        t = _timers[name]
+        t[0] += calls
+        t[1] += total
+        t[2] = max(t[2], longest)
+    for name, value in snapshot['counters'].items():
+        _counters[name] += value
+    _events.extend(snapshot['events'][:max(0, MAX_EVENTS - len(_events))])
+
+
+@contextlib.contextmanager
+def capture(profile=False, memory=False, profile_path=PROFILE_PATH):
+    """
+    Optional heavy capture around a run: cProfile (stats saved to profile_path) and/or
+    tracemalloc (peak and top allocation sites). Yields a dict that is filled in on exit
+    and can be passed to export(extra=...).
+    """
+    result = {}
+    profiler = cProfile.Profile() if profile else None
+    if memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield result
+    finally:
+        if profiler:
+            profiler.disable()
+            os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+            profiler.dump_stats(profile_path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            result['profile'] = {'path': profile_path, 'top_cumulative': out.getvalue().splitlines()}
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            tracemalloc.stop()
+            result['memory'] = {'peak_mb': round(peak / 1024 ** 2, 2), 'current_mb': round(current / 1024 ** 2, 2),
+                                'top_allocations': [str(stat) for stat in top]}
+
+
+def summary(top=15):
+    """Printable lines: slowest timers by total time, then all counters."""
+    lines = [f"   {'span':<34} {'calls':>7} {'total s':>9} {'max s':>8}"]
+    for name, (calls, total, longest) in sorted(_timers.items(), key=lambda kv: -kv[1][1])[:top]:
+        lines.append(f"   {name:<34} {calls:>7} {total:>9.3f} {longest:>8.3f}")
+    for name, value in sorted(_counters.items()):
+        lines.append(f"   {name:<34} {value:>17,.0f}")
+    return lines
+
+
+def export(metrics_path=METRICS_PATH, trace_path=TRACE_PATH, extra=None):
+    """Write the run-metrics JSON and a Chrome-trace timeline; returns both paths."""
+    timers = {name: {'calls': calls, 'total_s': round(total, 6), 'mean_s': round(total / calls, 6),
+                     'max_s': round(longest, 6)}
+              for name, (calls, total, longest) in sorted(_timers.items(), key=lambda kv: -kv[1][1])}
+    metrics = {'timers': timers, 'counters': dict(sorted(_counters.items())), **(extra or {})}
+    origin = min((e['ts'] for e in _events), default=0.0)
+    trace = {'traceEvents': [{**e, 'ts': round(e['ts'] - origin, 1), 'dur': round(e['dur'], 1)} for e in _events],
+             'displayTimeUnit': 'ms'}
+    for path, payload in ((metrics_path, metrics), (trace_path, trace)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as fh:
+            json.dump(payload, fh, indent=1 if path == metrics_path else None, default=str)
+    return metrics_path, trace_path
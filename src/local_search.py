@@ -0,0 +1,200 @@
+# src/local_search.py
+import time
+from collections import deque
+import numpy as np
+from instrumentation import count, record_span
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+N_NEIGHBOURS = 8            # candidate list size per stop
+MAX_SEGMENT = 3             # longest segment moved by Or-opt
+TIME_LIMIT = 10.0           # seconds of local search per tour
+EPS = 1e-7                  # minimum gain (km) for a move to count
+
+
+def neighbour_lists(dist, k=N_NEIGHBOURS):
+    """k nearest candidates per node (self excluded), sorted by distance."""
+    n = len(dist)
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.int64)
+    masked = dist.astype(np.float64, copy=True)
+    np.fill_diagonal(masked, np.inf)
+    cand = np.argpartition(masked, k - 1, axis=1)[:, :k]
+    rows = np.arange(n)[:, None]
+    order = np.argsort(masked[rows, cand], axis=1, kind='stable')
+    return cand[rows, order]
+
+
+# --------------------------
+# ARRAY TOUR PRIMITIVES
+# --------------------------
+def _reverse(tour, pos, i, j):
+    """Reverse the cyclic segment tour[i..j]; flips the complement instead when that is shorter."""
+    n = len(tour)
+    length = (j - i) % n + 1
+    if length * 2 > n:
+        i, j = (j + 1) % n, (i - 1) % n
+        length = n - length
+    if length < 2:
+        return
+    idx = (i + np.arange(length)) % n
+    tour[idx] = tour[idx[::-1]]
+    pos[tour[idx]] = idx
+
+
+def _move_segment(tour, pos, seg_start, seg_len, after, reverse):
+    """Cut seg_len nodes starting at position seg_start and reinsert them after node `after`."""
+    n = len(tour)
+    idx = (seg_start + np.arange(seg_len)) % n
+    seg = tour[idx]
+    if reverse:
+        seg = seg[::-1]
+    keep = np.ones(n, dtype=bool)
+    keep[idx] = False
+    rest = tour[keep]
+    cut = int(np.flatnonzero(rest == after)[0]) + 1
+    tour[:] = np.concatenate([rest[:cut], seg, rest[cut:]])
+    pos[tour] = np.arange(n)
+
+
+# --------------------------
+# IMPROVEMENT DRIVER
+# --------------------------
+def improve_tour(tour, dist, neighbours=None, or_opt=True, or3opt=False,
+                 time_limit=TIME_LIMIT, max_iterations=None, active_nodes=None):
+    """
+    2-opt + Or-opt local search on an open tour (closed implicitly back to tour[0]).
+    Uses candidate neighbour lists and don't-look bits. or3opt=True also tries
+    inserting moved segments reversed. Stops at a local optimum, after
+    `time_limit` seconds or after `max_iterations` applied moves.
+    active_nodes limits the initial queue (e.g. around a repaired spot); the
+    search still spreads to any node touched by an improving move. neighbours
+    is an (n, k) array or any node -> candidate list mapping (e.g. one filled
+    lazily for the few nodes a repair touches).
+    Returns (tour, stats) with the tour rotated to start at the original first node.
+    """
+    tour = np.array(tour, dtype=np.int64)
+    n = len(tour)
+    start_node = int(tour[0]) if n else 0
+
+    def length(t):
+        return float(dist[t, np.roll(t, -1)].astype(np.float64).sum()) if len(t) > 1 else 0.0
+
+    initial = length(tour)
+    stats = {'initial_km': initial, 'final_km': initial, 'improvement_pct': 0.0,
+             'moves_2opt': 0, 'moves_oropt': 0, 'elapsed_s': 0.0}
+    if n < 5:
+        return tour, stats
+
+    if neighbours is None:
+        neighbours = neighbour_lists(dist)
+    nbrs = neighbours.tolist() if isinstance(neighbours, np.ndarray) else neighbours
+    pos = np.empty(n, dtype=np.int64)
+    pos[tour] = np.arange(n)
+
+    def d(a, b):
+        return float(dist[a, b])
+
+    def succ(a):
+        return int(tour[(pos[a] + 1) % n])
+
+    def pred(a):
+        return int(tour[pos[a] - 1])
+
+    if active_nodes is None:
+        queue = deque(int(a) for a in tour)
+        active = np.ones(n, dtype=bool)
+    else:
+        queue = deque(dict.fromkeys(int(a) for a in active_nodes))
+        active = np.zeros(n, dtype=bool)
+        active[list(queue)] = True
+
+    def wake(*nodes):
+        for x in nodes:
+            if not active[x]:
+                active[x] = True
+                queue.append(x)
+
+    began = time.perf_counter()
+
+    def try_2opt(a):
+        for direction in (succ, pred):
+            b = direction(a)
+            d_ab = d(a, b)
+            for c in nbrs[a]:
+                d_ac = d(a, c)
+                if d_ac >= d_ab:
+                    break
+                e = direction(c)
+                if c == b or e == a:
+                    continue
+                delta = d_ac + d(b, e) - d_ab - d(c, e)
+                if delta < -EPS:
+                    if direction is succ:
+                        _reverse(tour, pos, pos[b], pos[c])
+                    else:
+                        _reverse(tour, pos, pos[a], pos[e])
+                    wake(a, b, c, e)
+                    return True
+        return False
+
+    def try_or_opt(a):
+        for seg_len in range(1, MAX_SEGMENT + 1):
+            if seg_len + 2 >= n:
+                break
+            first = pos[a]
+            last_node = int(tour[(first + seg_len - 1) % n])
+            p, q = pred(a), succ(last_node)
+            removal_gain = d(p, a) + d(last_node, q) - d(p, q)
+            if removal_gain <= EPS:
+                continue
+            seg = {int(tour[(first + t) % n]) for t in range(seg_len)}
+            for end, other in ((a, last_node), (last_node, a)):
+                for c in nbrs[end]:
+                    if d(c, end) >= removal_gain:
+                        break
+                    if c in seg:
+                        continue
+                    # Insert between c and one of its tour neighbours, with `end` touching c
+                    for c_next, forward in ((succ(c), True), (pred(c), False)):
+                        if c_next in seg:
+                            continue
+                        left, right = (c, c_next) if forward else (c_next, c)
+                        reverse = (end == last_node) if forward else (end == a)
+                        if reverse and not or3opt:
+                            continue
+                        added = d(c, end) + d(other, c_next) - d(left, right)
+                        if added - removal_gain < -EPS:
+                            _move_segment(tour, pos, first, seg_len, left, reverse)
+                            wake(p, q, c, c_next, a, last_node)
+                            return True
+        return False
+
+    while queue:
+        if max_iterations is not None and stats['moves_2opt'] + stats['moves_oropt'] >= max_iterations:
+            break
+        if time_limit is not None and time.perf_counter() - began > time_limit:
+            break
+        a = queue.popleft()
+        active[a] = False
+        if try_2opt(a):
+            stats['moves_2opt'] += 1
+        elif or_opt and try_or_opt(a):
+            stats['moves_oropt'] += 1
+        else:
+            continue
+        wake(a)
+
+    final = length(tour)
+    tour = np.roll(tour, -int(pos[start_node]))
+    stats.update(
+        final_km=final,
+        improvement_pct=(initial - final) / initial * 100 if initial > 0 else 0.0,
+        elapsed_s=time.perf_counter() - began,
+    )
+    count("tour.moves_2opt", stats['moves_2opt'])
+    count("tour.moves_oropt", stats['moves_oropt'])
+    record_span("local_search.improve_tour", began, time.perf_counter(), {'stops': n})
+    return tour, stats
@@ -1,88 +1,72 @@
 # src/main.py
-import subprocess
-import sys
-import importlib
-import os
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import silhouette_score
+import argparse
+import time
+from instrumentation import METRICS_PATH, TRACE_PATH, capture, export, summary
+from pipeline import PIPELINE_STATE_DIR, build_pipeline
 
-print("\n=== ♻️ Solid Waste Route Optimization Project ===\n")
+if __name__ == "__main__":
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Run the full simulate → cluster → route → report pipeline in-process.")
+    parser.add_argument("--points", help="CSV of existing bins (id, latitude, longitude, waste_kg) instead of simulating")
+    parser.add_argument("--readings", nargs="+", help="sensor fill-level feeds (CSV/Parquet) to ingest instead")
+    parser.add_argument("--min-fill", type=float, default=None, help="minimum latest waste_kg for ingested bins")
+    parser.add_argument("--n-points", type=int, default=300, help="number of simulated bins")
+    parser.add_argument("--seed", type=int, default=42, help="simulation seed (-1 = fresh random draw every run)")
+    parser.add_argument("--time-windows", action="store_true",
+                        help="give simulated market and hospital bins service windows")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="average truck speed in km/h for timed routes (default: time_windows.py)")
+    parser.add_argument("--distance", choices=["ellipsoidal", "haversine", "road"], default=None,
+                        help="leg distances (default: route_optimization's DISTANCE_METHOD); road = local OSM graph")
+    parser.add_argument("--road-graph", default=None, help="OSM XML extract for --distance road")
+    parser.add_argument("--hierarchical", action="store_true",
+                        help="quadtree decomposition instead of one city-wide clustering (100k+ bins)")
+    parser.add_argument("--workers", type=int, default=1, help="process-pool size for routing (0 = all cores)")
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help="seconds of local search per cluster (default: route_optimization's limit)")
+    parser.add_argument("--no-save", action="store_true", help="keep results in memory; skip writing data/ tables")
+    parser.add_argument("--export-csv", action="store_true", help="also export the point tables as CSV")
+    parser.add_argument("--no-maps", action="store_true", help="skip the matplotlib cluster and route maps")
+    parser.add_argument("--render-workers", type=int, default=1, help="processes drawing route maps (0 = all cores)")
+    parser.add_argument("--no-charts", action="store_true", help="skip the plotly efficiency charts")
+    parser.add_argument("--no-report", action="store_true", help="skip the Excel/PDF report")
+    parser.add_argument("--force", action="store_true", help="re-run every stage even if its inputs are unchanged")
+    parser.add_argument("--state-dir", default=PIPELINE_STATE_DIR, help="where stage outputs are kept between runs")
+    parser.add_argument("--profile", action="store_true", help="run under cProfile (stats saved next to the metrics)")
+    parser.add_argument("--trace-memory", action="store_true", help="record peak memory and top allocation sites")
+    parser.add_argument("--metrics", default=METRICS_PATH, help="run-metrics JSON path")
+    parser.add_argument("--trace", default=TRACE_PATH, help="Chrome-trace JSON path (chrome://tracing, Perfetto)")
+    args = parser.parse_args()
+    routing = {'workers': args.workers}
+    if args.time_limit is not None:
+        routing['time_limit'] = args.time_limit
+    if args.distance is not None:
+        routing['distance_method'] = args.distance
+    if args.road_graph is not None:
+        routing['road_graph'] = args.road_graph
+    if args.speed is not None:
+        from time_windows import SpeedModel
+        routing['speed'] = SpeedModel(speed_kmh=args.speed)
 
-# Helper: install missing packages automatically
-def ensure_package(package):
-    try:
-        importlib.import_module(package)
-    except ImportError:
-        print(f"📦 Installing missing package: {package} ...")
-        subprocess.run([sys.executable, "-m", "pip", "install", package])
+    print("\n=== ♻️ Solid Waste Route Optimization Project ===\n")
+    pipe = build_pipeline(n_points=args.n_points, seed=None if args.seed < 0 else args.seed,
+                          time_windows=args.time_windows, hierarchical=args.hierarchical,
+                          points_path=args.points, feeds=args.readings, min_fill_kg=args.min_fill,
+                          save_tables=not args.no_save,
+                          export_csv=args.export_csv, maps=not args.no_maps,
+                          render_workers=args.render_workers, charts=not args.no_charts,
+                          report=not args.no_report, state_dir=args.state_dir,
+                          **routing)
+    with capture(profile=args.profile, memory=args.trace_memory) as extra:
+        pipe.run(force=args.force)
+    pipe.print_timings()
 
-# Required packages
-for pkg in ["pandas", "matplotlib", "scikit-learn", "networkx", "geopy", "fpdf", "plotly"]:
-    ensure_package(pkg)
-
-# Step 1: Simulate Data
-print("\n🚀 Running data_simulation.py ...")
-subprocess.run([sys.executable, "src/data_simulation.py"])
-
-# Step 2: Intelligent Clustering
-print("\n🚀 Running clustering.py (auto-optimization mode)...")
-from clustering import cluster_points, dbscan_clustering
-
-def evaluate_silhouette(use_waste=True):
-    df = pd.read_csv("data/clustered_points.csv")
-    features = ['latitude', 'longitude']
-    if use_waste and 'waste_kg' in df.columns:
-        features.append('waste_kg')
-    X_scaled = StandardScaler().fit_transform(df[features])
-    return silhouette_score(X_scaled, df['cluster'])
-
-try:
-    print("🧠 Attempt 1: KMeans with waste_kg ...")
-    cluster_points(n_clusters=None, use_waste=True, k_min=2, k_max=10)
-    sil = evaluate_silhouette(use_waste=True)
-
-    if sil < 0.5:
-        print(f"\n⚠️ Silhouette={sil:.3f} < 0.5 → retrying geography-only clustering...")
-        cluster_points(n_clusters=None, use_waste=False, k_min=2, k_max=10)
-        sil = evaluate_silhouette(use_waste=False)
-
-        if sil < 0.5:
-            print(f"\n⚠️ Still weak separation (Silhouette={sil:.3f}) → switching to DBSCAN fallback...")
-            dbscan_clustering(eps=0.03, min_samples=5)
-            sil = evaluate_silhouette(use_waste=False)
-            if sil >= 0.5:
-                print(f"✅ DBSCAN improved clustering: Silhouette={sil:.3f}")
-            else:
-                print(f"⚠️ DBSCAN also below threshold (Silhouette={sil:.3f}) – consider tuning eps/min_samples manually.")
-        else:
-            print(f"✅ Geography-only clustering successful: Silhouette={sil:.3f}")
-    else:
-        print(f"✅ KMeans clustering successful: Silhouette={sil:.3f}")
-
-except Exception as e:
-    print("\n❌ Clustering step failed:", e)
-
-# Step 3: Route Optimization
-print("\n🚀 Running route_optimization.py ...")
-try:
-    subprocess.run([sys.executable, "src/route_optimization.py"], check=True)
-except subprocess.CalledProcessError as e:
-    print("\n⚠️ Error in route optimization:\n", e)
-
-# Step 4: Visualization
-print("\n🚀 Running route_visualization.py ...")
-try:
-    subprocess.run([sys.executable, "src/route_visualization.py"], check=True)
-except subprocess.CalledProcessError as e:
-    print("\n⚠️ Error in visualization:\n", e)
-
-# Step 5: Generate Report
-print("\n🚀 Running generate_report.py ...")
-try:
-    subprocess.run([sys.executable, "src/generate_report.py"], check=True)
-    print("\n📊 Step 3.1 Complete — Beautified report generated!")
-except subprocess.CalledProcessError as e:
-    print("\n⚠️ Error in report generation:\n", e)
-
-print("\n✅ Project completed successfully! Check 'outputs/' and 'data/' folders for results.\n")
+    print("\n🔬 Hot spots")
+    for line in summary():
+        print(line)
+    if 'memory' in extra:
+        print(f"   peak traced memory: {extra['memory']['peak_mb']:.1f} MB")
+    metrics_path, trace_path = export(args.metrics, args.trace, extra={'stages': pipe.timings, **extra})
+    print(f"📁 Saved run metrics to {metrics_path} and timeline to {trace_path}")
+    print(f"\n✅ Project completed in {time.perf_counter() - started:.2f} s. "
+          f"Check 'outputs/' and 'data/' folders for results.\n")
@@ -0,0 +1,364 @@
+# src/pipeline.py
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from instrumentation import record_span
+from storage import read_table, table_path, write_table
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+PIPELINE_STATE_DIR = "data/cache/pipeline"
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))  # project modules the stages import lazily
+SILHOUETTE_TARGET = 0.5         # below this the clustering stage tries the next method
+
+
+def fingerprint(value):
+    """SHA-256 of a stage output or parameter (DataFrames and arrays hashed by content)."""
+    h = hashlib.sha256()
+    _feed(h, value)
+    return h.hexdigest()
+
+
+def _feed(h, value):
+    if isinstance(value, pd.DataFrame):
+        h.update(b"frame")
+        h.update(json.dumps([str(c) for c in value.columns]).encode())
+        h.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(f"array{value.dtype}{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(f"seq{len(value)}".encode())
+        for v in value:
+            _feed(h, v)
+    elif isinstance(value, dict):
+        h.update(f"map{len(value)}".encode())
+        for k in sorted(value, key=str):
+            h.update(str(k).encode())
+            _feed(h, value[k])
+    else:
+        h.update(repr(value).encode())
+
+
+def source_fingerprint(source_dir=SOURCE_DIR):
+    """
+    SHA-256 of every .py file under source_dir. Stages import the modules that do the
+    work (clustering, route_optimization, ...) inside their bodies, so the wrapper's
+    bytecode alone misses edits to those functions and to module constants.
+    """
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith((".", "__")) and d not in ("data", "outputs"))
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                h.update(os.path.relpath(path, source_dir).encode())
+                with open(path, "rb") as fh:
+                    h.update(hashlib.sha256(fh.read()).digest())
+    return h.hexdigest()
+
+
+@dataclass
+class Stage:
+    """One node of the pipeline: func(*dependency outputs, **params)."""
+    name: str
+    func: object
+    deps: tuple = ()
+    params: dict = field(default_factory=dict)
+    outputs: tuple = ()         # files the stage writes; a missing one forces a re-run
+    cacheable: bool = True      # False for stages that must always run (file loads, unseeded draws)
+
+
+class Pipeline:
+    """
+    Small in-process DAG scheduler. Stages exchange DataFrames in memory; each
+    stage's key is the fingerprint of its code (and the project's source files),
+    parameters and input fingerprints, and a stage whose key matches the last run
+    is skipped and its saved output reused (state kept under state_dir). Per-stage timings are kept in `timings`.
+    """
+
+    def __init__(self, state_dir=PIPELINE_STATE_DIR):
+        self.state_dir = state_dir
+        self.stages = {}
+        self.timings = []
+
+    def add(self, name, func, deps=(), outputs=(), cacheable=True, **params):
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already defined.")
+        self.stages[name] = Stage(name, func, tuple(deps), params, tuple(outputs), cacheable)
+        return self
+
+    def order(self, targets=None):
+        """Stages needed for targets (default: all) in dependency order."""
+        ordered, state = [], {}
+
+        def visit(name):
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage '{name}'.")
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "active":
+                raise ValueError(f"Pipeline has a cycle through '{name}'.")
+            state[name] = "active"
+            for dep in self.stages[name].deps:
+                visit(dep)
+            state[name] = "done"
+            ordered.append(name)
+
+        for name in (targets or self.stages):
+            visit(name)
+        return ordered
+
+    # ---- Persistent state ----
+    def _state_path(self, name):
+        return os.path.join(self.state_dir, f"{name}.pkl")
+
+    def _load_state(self, name):
+        path = self._state_path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as fh:
+                return pickle.load(fh)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _save_state(self, name, state):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _code_id(func, source_id):
+        """The wrapper's bytecode, the project source hash and the wrapper's own file if it lives elsewhere."""
+        code = getattr(func, "__code__", None)
+        if code is None:
+            return (getattr(func, "__qualname__", repr(func)), source_id)
+        try:
+            path = os.path.abspath(inspect.getsourcefile(func) or "")
+        except TypeError:
+            path = ""
+        module_id = None
+        if path and os.path.commonpath([path, SOURCE_DIR]) != SOURCE_DIR and os.path.exists(path):
+            with open(path, "rb") as fh:
+                module_id = hashlib.sha256(fh.read()).hexdigest()
+        return (func.__module__, func.__qualname__, code.co_code, repr(code.co_consts), source_id, module_id)
+
+    # ---- Execution ----
+    def run(self, targets=None, force=False, on_stage=None):
+        """
+        Run the stages needed for targets; returns {stage name: output}.
+        on_stage(timing, done, total) is called after each stage (e.g. to report progress).
+        """
+        results, output_fp = {}, {}
+        self.timings = []
+        names = self.order(targets)
+        source_id = source_fingerprint()
+        for name in names:
+            stage = self.stages[name]
+            key = fingerprint((self._code_id(stage.func, source_id), stage.params, [output_fp[d] for d in stage.deps]))
+            state = self._load_state(name) if stage.cacheable and not force else None
+            started = time.perf_counter()
+            if (state is not None and state["key"] == key
+                    and all(os.path.exists(path) for path in stage.outputs)):
+                output, out_fp, status = state["output"], state["fingerprint"], "skipped"
+            else:
+                output = stage.func(*[results[d] for d in stage.deps], **stage.params)
+                out_fp = fingerprint(output)
+                if stage.cacheable:
+                    self._save_state(name, {"key": key, "output": output, "fingerprint": out_fp})
+                status = "ran"
+            results[name], output_fp[name] = output, out_fp
+            finished = time.perf_counter()
+            record_span(f"stage.{name}", started, finished, {"status": status})
+            self.timings.append({"stage": name, "status": status, "seconds": finished - started})
+            if on_stage is not None:
+                on_stage(self.timings[-1], len(self.timings), len(names))
+        return results
+
+    def print_timings(self):
+        print("\n⏱️ Pipeline timings")
+        for t in self.timings:
+            print(f"   {t['stage']:<16} {t['status']:<8} {t['seconds']:7.3f} s")
+        print(f"   {'total':<16} {'':<8} {sum(t['seconds'] for t in self.timings):7.3f} s")
+
+
+# --------------------------
+# PROJECT STAGES
+# --------------------------
+def simulate_stage(n_points, seed, time_windows=False):
+    from data_simulation import simulate_city_points, simulate_time_windows
+    points = simulate_city_points(n=n_points, seed=seed, save=False)
+    return simulate_time_windows(points, seed=seed) if time_windows else points
+
+
+def load_stage(path):
+    return read_table(path)
+
+
+def ingest_stage(feeds, min_fill_kg):
+    from ingestion import ingest_readings
+    return ingest_readings(feeds, min_fill_kg=min_fill_kg, save=False)
+
+
+def cluster_stage(points, k_min=2, k_max=10, n_jobs=None, min_silhouette=SILHOUETTE_TARGET, keep_labels=False):
+    """
+    KMeans with waste_kg, then geography-only KMeans, then DBSCAN, stopping once
+    silhouette >= min_silhouette; DBSCAN is only kept if it beats the KMeans score.
+    Nothing is plotted or saved here; the cluster_map sink draws the final labels once.
+    n_jobs=None sweeps k in parallel only for large inputs (worker start-up dominates small ones).
+    keep_labels=True routes points that already carry a cluster column as they are.
+    Returns (clustered df, KMeans model bundle behind its labels or None).
+    """
+    if keep_labels and 'cluster' in points.columns:
+        print(f"🧭 Using the {points['cluster'].nunique()} clusters given with the points")
+        return points, None
+
+    from clustering import FAST_MODE_MIN_POINTS, cluster_points, dbscan_clustering
+
+    if n_jobs is None:
+        n_jobs = -1 if len(points) >= FAST_MODE_MIN_POINTS else 1
+
+    print("🧠 Attempt 1: KMeans with waste_kg ...")
+    clustered, sil, model = cluster_points(use_waste=True, k_min=k_min, k_max=k_max, n_jobs=n_jobs, df=points,
+                                           save=False, plot=False, return_model=True)
+    if sil >= min_silhouette:
+        print(f"✅ KMeans clustering successful: Silhouette={sil:.3f}")
+        return clustered, model
+
+    print(f"\n⚠️ Silhouette={sil:.3f} < {min_silhouette} → retrying geography-only clustering...")
+    clustered, sil, model = cluster_points(use_waste=False, k_min=k_min, k_max=k_max, n_jobs=n_jobs, df=points,
+                                           save=False, plot=False, return_model=True)
+    if sil >= min_silhouette:
+        print(f"✅ Geography-only clustering successful: Silhouette={sil:.3f}")
+        return clustered, model
+
+    print(f"\n⚠️ Still weak separation (Silhouette={sil:.3f}) → switching to DBSCAN fallback...")
+    density, dsil = dbscan_clustering(eps_m=None, min_samples=5, df=points, save=False)
+    if dsil > sil:
+        print(f"✅ DBSCAN improved clustering: Silhouette={dsil:.3f}")
+        return density, None
+    print(f"⚠️ DBSCAN did not improve on KMeans (Silhouette={dsil:.3f}) – keeping geography-only clusters.")
+    return clustered, model
+
+
+def hierarchical_stage(points, workers=1):
+    """Quadtree cells -> per-cell KMeans -> border rebalancing (hierarchical.py) for 100k+ bin cities."""
+    from hierarchical import hierarchical_clusters
+    return hierarchical_clusters(points, workers=workers), None
+
+
+def clusters_stage(clustering):
+    return clustering[0]
+
+
+def route_stage(clustered, save=True, graph_version=None, **routing):
+    """
+    (route summary, route map jobs); the maps are drawn by the maps sink, not while routing.
+    graph_version only enters the stage key, so editing the road extract re-runs routing.
+    """
+    from route_optimization import optimize_routes
+    jobs = []
+    summary = optimize_routes(df=clustered, save=save, render=False, map_jobs=jobs, **routing)
+    return summary, jobs
+
+
+def summary_stage(routing):
+    return routing[0]
+
+
+def table_sink(df, table, export_csv=False):
+    path = write_table(df, table, export_csv=export_csv)
+    print(f"📁 Saved {path}")
+    return path
+
+
+def model_sink(clustering):
+    from clustering import save_model
+    save_model(clustering[1])
+
+
+def cluster_map_sink(clustered):
+    from rendering import plot_cluster_map
+    print(f"🗺️ Saved cluster map: {plot_cluster_map(clustered)}")
+
+
+def maps_sink(routing, workers=1):
+    from rendering import render_route_maps
+    render_route_maps(routing[1], workers=workers)
+
+
+def charts_sink(summary, show=True):
+    from route_visualization import visualize_route_efficiency
+    visualize_route_efficiency(summary, show=show)
+
+
+def report_sink(clustered, summary):
+    from generate_report import generate_final_report
+    generate_final_report(clustered, summary)
+
+
+def build_pipeline(n_points=300, seed=42, time_windows=False, points_path=None, feeds=None, min_fill_kg=None,
+                   keep_clusters=False, hierarchical=False, save_tables=True,
+                   export_csv=False, maps=True, render_workers=1, charts=True, report=True,
+                   state_dir=PIPELINE_STATE_DIR, **routing):
+    """
+    The project's simulate -> cluster -> route DAG with optional table (storage.py),
+    map (rendering.py, render_workers processes), chart and report sinks. points_path loads existing bins (CSV/Parquet/Feather)
+    instead of simulating (keep_clusters routes its cluster column as given); feeds streams sensor readings through ingestion.py
+    (bins at >= min_fill_kg); seed=None draws fresh (uncached) points every run and
+    time_windows gives simulated market / hospital bins service windows; hierarchical swaps the
+    silhouette-driven clustering for the quadtree decomposition of hierarchical.py.
+    routing is passed to optimize_routes.
+    """
+    pipe = Pipeline(state_dir)
+    if feeds:
+        from ingestion import MIN_FILL_KG
+        pipe.add("points", ingest_stage, cacheable=False, feeds=list(feeds),
+                 min_fill_kg=MIN_FILL_KG if min_fill_kg is None else min_fill_kg)
+    elif points_path:
+        pipe.add("points", load_stage, cacheable=False, path=points_path)
+    else:
+        pipe.add("points", simulate_stage, cacheable=seed is not None, n_points=n_points, seed=seed,
+                 time_windows=time_windows)
+    if hierarchical:
+        pipe.add("clustering", hierarchical_stage, deps=["points"], workers=routing.get('workers', 1))
+    else:
+        pipe.add("clustering", cluster_stage, deps=["points"], keep_labels=keep_clusters)
+    pipe.add("clusters", clusters_stage, deps=["clustering"])
+    route_outputs = (table_path("route_summary"),) if save_tables else ()
+    if routing.get('distance_method') == "road":
+        from road_network import ROAD_GRAPH_PATH, graph_version
+        routing['graph_version'] = graph_version(routing.get('road_graph') or ROAD_GRAPH_PATH)
+    pipe.add("routing", route_stage, deps=["clusters"], outputs=route_outputs, save=save_tables, **routing)
+    pipe.add("routes", summary_stage, deps=["routing"])
+    if save_tables:
+        names = ["clustered_points"] if points_path else ["simulated_points", "clustered_points"]
+        # Ingested feeds are stored as the simulated_points table clustering reads by default
+        for name in names:
+            outputs = [table_path(name)] + ([table_path(name, "csv")] if export_csv else [])
+            pipe.add(name, table_sink, deps=["clusters" if name == "clustered_points" else "points"],
+                     outputs=outputs, table=name, export_csv=export_csv)
+        # The KMeans model (or its removal) follows the clusters actually kept, for incremental.py
+        pipe.add("kmeans_model", model_sink, deps=["clustering"], cacheable=False)
+    if maps:
+        from rendering import CLUSTER_MAP_PATH
+        pipe.add("cluster_map", cluster_map_sink, deps=["clusters"], outputs=[CLUSTER_MAP_PATH])
+        pipe.add("maps", maps_sink, deps=["routing"], workers=render_workers)
+    if charts:
+        pipe.add("charts", charts_sink, deps=["routes"], cacheable=False)
+    if report:
+        from generate_report import report_excel_path, report_pdf_path, report_points_name
+        pipe.add("report", report_sink, deps=["clusters", "routes"],
+                 outputs=[report_excel_path, report_pdf_path, table_path(report_points_name, data_dir="outputs")])
+    return pipe
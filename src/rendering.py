@@ -0,0 +1,122 @@
+# src/rendering.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from instrumentation import collect, count, merge, reset as reset_metrics, timer
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+CLUSTER_MAP_PATH = "data/cluster_map.png"
+SILHOUETTE_PLOT_PATH = "outputs/silhouette_vs_k.png"
+ROUTE_MAP_PATH = "data/route_cluster_{cluster}.png"
+RENDER_WORKERS = 1              # processes drawing route maps (<= 0 = every core)
+DENSE_SCATTER_POINTS = 5000     # above this, scatter markers are shrunk and drawn without edges
+
+# matplotlib is imported inside the functions so headless runs that skip rendering never load it
+
+
+def _marker_style(n):
+    if n <= DENSE_SCATTER_POINTS:
+        return {'s': 40, 'edgecolor': 'k', 'linewidth': 0.4}
+    return {'s': 4, 'edgecolor': 'none'}
+
+
+def _save(fig, path, dpi=None):
+    import matplotlib.pyplot as plt
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with timer("render.savefig", figure=os.path.basename(path)):
+        fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+    count("render.figures")
+    return path
+
+
+def plot_silhouette(ks, sils, path=SILHOUETTE_PLOT_PATH):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.plot(ks, sils, marker='o', linewidth=2)
+    ax.set_xlabel("Number of Clusters (k)")
+    ax.set_ylabel("Silhouette Score")
+    ax.set_title("Silhouette Score vs k")
+    ax.grid(True)
+    return _save(fig, path, dpi=150)
+
+
+def plot_cluster_map(df, path=CLUSTER_MAP_PATH):
+    """Scatter the bins coloured by cluster label."""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.scatter(df['longitude'].to_numpy(), df['latitude'].to_numpy(), c=df['cluster'].to_numpy(), cmap='tab10',
+               **_marker_style(len(df)))
+    ax.set_title(f"Optimized City Waste Clusters (k={df['cluster'].nunique()})")
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+    ax.grid(True)
+    return _save(fig, path, dpi=150)
+
+
+def route_map_job(cluster_id, bin_lat, bin_lon, paths, facilities, has_depot, title):
+    """
+    Everything needed to draw one cluster's route map, as plain arrays so it can be
+    kept, pickled to a worker or drawn later. paths is a list of (lat, lon) arrays
+    (one per trip); facilities holds the depot (first, if has_depot) and dump sites.
+    """
+    return {'cluster': cluster_id, 'lat': bin_lat, 'lon': bin_lon, 'paths': paths,
+            'facilities': facilities, 'has_depot': has_depot, 'title': title,
+            'path': ROUTE_MAP_PATH.format(cluster=cluster_id)}
+
+
+def render_route_map(job):
+    """Draw one route map: bins, one polyline per route (a LineCollection for several trips), depot and dumps."""
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.scatter(job['lat'], job['lon'], c='blue', **_marker_style(len(job['lat'])))
+    paths = job['paths']
+    if len(paths) == 1:
+        ax.plot(paths[0][0], paths[0][1], 'r-')
+    elif paths:
+        ax.add_collection(LineCollection([np.column_stack(p) for p in paths], colors='r'))
+        ax.autoscale_view()
+    facilities = job['facilities']
+    dumps = facilities[1:] if job['has_depot'] else facilities
+    if job['has_depot']:
+        ax.scatter(facilities[:1, 0], facilities[:1, 1], c='black', marker='s', s=80)
+    if len(dumps):
+        ax.scatter(dumps[:, 0], dumps[:, 1], c='green', marker='^', s=80)
+    ax.set_title(job['title'])
+    ax.set_xlabel("Latitude")
+    ax.set_ylabel("Longitude")
+    ax.grid(True)
+    return _save(fig, job['path'])
+
+
+def _render_traced(job):
+    reset_metrics()     # forked workers start with a copy of the parent's metrics
+    path = render_route_map(job)
+    return path, collect()
+
+
+def render_route_maps(jobs, workers=RENDER_WORKERS):
+    """Draw every route map, in a process pool when workers > 1; returns the PNG paths."""
+    jobs = list(jobs)
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs)) or 1
+    paths = []
+    with timer("render.route_maps", maps=len(jobs), workers=workers):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for path, metrics in pool.map(_render_traced, jobs, chunksize=max(1, len(jobs) // (4 * workers))):
+                    paths.append(path)
+                    merge(metrics)
+        else:
+            paths = [render_route_map(job) for job in jobs]
+    if paths:
+        print(f"🗺️ Saved {len(paths)} route maps ({os.path.dirname(paths[0]) or '.'}/route_cluster_<id>.png)")
+    return paths
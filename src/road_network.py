@@ -0,0 +1,293 @@
+# src/road_network.py
+import argparse
+import bz2
+import gzip
+import hashlib
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from sklearn.neighbors import BallTree
+from distance_matrix import EARTH_RADIUS_KM, pair_distances
+from instrumentation import count, timer
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+ROAD_GRAPH_PATH = "data/roads.osm"      # local OSM XML extract (.osm, .osm.gz, .osm.bz2)
+GRAPH_CACHE_DIR = "data/cache/roads"    # compiled CSR graphs (.npz), keyed by the extract's path/size/mtime
+DRIVABLE = {'motorway', 'trunk', 'primary', 'secondary', 'tertiary', 'unclassified', 'residential',
+            'living_street', 'service', 'road', 'motorway_link', 'trunk_link', 'primary_link',
+            'secondary_link', 'tertiary_link'}
+RESPECT_ONEWAY = False          # one-way streets make matrices asymmetric, which 2-opt only approximates
+SEARCH_RADIUS_FACTOR = 3.0      # Dijkstra stops at this multiple of a point set's straight-line span
+FALLBACK_CIRCUITY = 1.5         # unreachable pairs: straight-line km x this
+BATCH_BYTES = 256 * 1024 ** 2   # cap on the (sources x graph nodes) distance block per Dijkstra call
+MATRIX_WORKERS = 1              # processes per matrix (clusters already run in parallel in optimize_routes)
+
+_graphs = {}                    # path -> RoadGraph loaded in this process
+_active = None                  # path of the graph 'road' distances use by default
+
+
+class RoadGraph:
+    """Drivable road network as a CSR adjacency matrix (km) with a BallTree for snapping points to nodes."""
+
+    def __init__(self, indptr, indices, data, lat, lon, directed, key):
+        n = len(lat)
+        self.csr = csr_matrix((data, indices, indptr), shape=(n, n))
+        self.lat, self.lon = lat, lon
+        self.directed = bool(directed)
+        self.key = key
+        self.tree = BallTree(np.radians(np.column_stack([lat, lon])), metric='haversine')
+
+    @property
+    def n_nodes(self):
+        return self.csr.shape[0]
+
+    @property
+    def n_edges(self):
+        return self.csr.nnz
+
+    def snap(self, lat, lon):
+        """(nearest road node, straight-line km to it) for each point."""
+        X = np.radians(np.column_stack([np.atleast_1d(lat), np.atleast_1d(lon)]))
+        d, idx = self.tree.query(X, k=1)
+        return idx[:, 0], d[:, 0] * EARTH_RADIUS_KM
+
+    def shortest_paths(self, sources, limit=np.inf):
+        """(len(sources), n_nodes) km from each source node (inf beyond limit or unreachable)."""
+        count("road.dijkstra_sources", len(sources))
+        return dijkstra(self.csr, directed=self.directed, indices=sources, limit=limit)
+
+
+# --------------------------
+# OSM LOADING
+# --------------------------
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.pbf'):
+        raise ValueError(f"❌ {path}: convert PBF extracts to OSM XML first (e.g. osmium cat in.osm.pbf -o roads.osm).")
+    return open(path, 'rb')
+
+
+def _parse_osm(path):
+    """Stream an OSM XML file: node ids/coords and the node sequences of drivable ways with their direction."""
+    node_ids, node_lat, node_lon = [], [], []
+    ways = []       # (refs, direction): 0 both ways, 1 forward only, -1 backward only
+    refs, tags = [], {}
+    root = None
+    with _open(path) as fh:
+        for event, elem in ET.iterparse(fh, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem     # cleared after each element so processed ones are not kept
+                continue
+            tag = elem.tag
+            if tag == 'node':
+                node_ids.append(int(elem.get('id')))
+                node_lat.append(float(elem.get('lat')))
+                node_lon.append(float(elem.get('lon')))
+                refs, tags = [], {}     # a node's own tags (e.g. traffic signals) must not reach the next way
+                root.clear()
+            elif tag == 'nd':
+                refs.append(int(elem.get('ref')))
+            elif tag == 'tag':
+                tags[elem.get('k')] = elem.get('v')
+            elif tag == 'way':
+                if tags.get('highway') in DRIVABLE and len(refs) > 1:
+                    oneway = tags.get('oneway', '')
+                    if oneway in ('yes', '1', 'true') or tags.get('junction') == 'roundabout' \
+                            or tags.get('highway') == 'motorway':
+                        direction = 1
+                    elif oneway == '-1':
+                        direction = -1
+                    else:
+                        direction = 0
+                    ways.append((refs, direction))
+                refs, tags = [], {}
+                root.clear()
+            elif tag == 'relation':
+                refs, tags = [], {}
+                root.clear()
+    return np.asarray(node_ids, dtype=np.int64), np.asarray(node_lat), np.asarray(node_lon), ways
+
+
+def _build_csr(node_ids, node_lat, node_lon, ways, directed):
+    """Compact CSR over the nodes drivable ways use; parallel edges keep the shortest length."""
+    order = np.argsort(node_ids)
+    node_ids, node_lat, node_lon = node_ids[order], node_lat[order], node_lon[order]
+    src, dst, direction = [], [], []
+    for refs, d in ways:
+        src.extend(refs[:-1])
+        dst.extend(refs[1:])
+        direction.extend([d] * (len(refs) - 1))
+    src, dst, direction = np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64), np.asarray(direction)
+
+    # Way references to nodes outside the extract are dropped
+    si, di = np.searchsorted(node_ids, src), np.searchsorted(node_ids, dst)
+    si, di = np.minimum(si, len(node_ids) - 1), np.minimum(di, len(node_ids) - 1)
+    ok = (node_ids[si] == src) & (node_ids[di] == dst) & (si != di)
+    si, di, direction = si[ok], di[ok], direction[ok]
+
+    used, inverse = np.unique(np.concatenate([si, di]), return_inverse=True)
+    si, di = inverse[:len(si)], inverse[len(si):]
+    lat, lon = node_lat[used], node_lon[used]
+    length = pair_distances(lat[si], lon[si], lat[di], lon[di], method="haversine")
+
+    if directed:
+        forward, backward = direction >= 0, direction <= 0
+        rows = np.concatenate([si[forward], di[backward]])
+        cols = np.concatenate([di[forward], si[backward]])
+        data = np.concatenate([length[forward], length[backward]])
+    else:
+        rows, cols, data = np.concatenate([si, di]), np.concatenate([di, si]), np.concatenate([length, length])
+    # Keep the shortest of any parallel edges
+    pick = np.lexsort((data, cols, rows))
+    rows, cols, data = rows[pick], cols[pick], data[pick]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    rows, cols, data = rows[first], cols[first], data[first]
+    indptr = np.zeros(len(lat) + 1, dtype=np.int64)
+    np.add.at(indptr, rows + 1, 1)
+    return np.cumsum(indptr), cols.astype(np.int32), data.astype(np.float64), lat, lon
+
+
+def graph_version(path=ROAD_GRAPH_PATH, directed=RESPECT_ONEWAY):
+    """Short id of an extract and the graph options (changes whenever the file does)."""
+    stat = os.stat(path)
+    h = hashlib.sha256(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{directed}|"
+                       f"{sorted(DRIVABLE)}".encode())
+    return h.hexdigest()[:24]
+
+
+def load_graph(path=ROAD_GRAPH_PATH, directed=RESPECT_ONEWAY, cache_dir=GRAPH_CACHE_DIR):
+    """
+    Road graph of a local OSM extract. The parsed CSR arrays are cached as .npz under
+    cache_dir, so only the first load of an extract pays for XML parsing.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ Road network '{path}' not found. Place an OSM XML extract there.")
+    key = graph_version(path, directed)
+    cached = os.path.join(cache_dir, f"{key}.npz")
+    started = time.perf_counter()
+    if os.path.exists(cached):
+        with np.load(cached) as z:
+            graph = RoadGraph(z['indptr'], z['indices'], z['data'], z['lat'], z['lon'], directed, key)
+        source = "cache"
+    else:
+        with timer("road.parse_osm", path=path):
+            arrays = _build_csr(*_parse_osm(path), directed)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cached}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, **dict(zip(('indptr', 'indices', 'data', 'lat', 'lon'), arrays)))
+        os.replace(tmp, cached)
+        graph = RoadGraph(*arrays, directed, key)
+        source = path
+    print(f"🛣️ Road graph: {graph.n_nodes} nodes, {graph.n_edges} edges from {source} "
+          f"({time.perf_counter() - started:.2f}s)")
+    return graph
+
+
+def get_graph(path=None):
+    """Graph for path (loaded once per process); without a path, the last one used, else ROAD_GRAPH_PATH."""
+    global _active
+    path = path or _active or ROAD_GRAPH_PATH
+    if path not in _graphs:
+        _graphs[path] = load_graph(path)
+    _active = path
+    return _graphs[path]
+
+
+# --------------------------
+# DISTANCES
+# --------------------------
+def _rows(path, sources, targets, limit):
+    """Pool worker: Dijkstra from sources, kept at the target nodes only."""
+    return get_graph(path).shortest_paths(sources, limit)[:, targets]
+
+
+def _node_distances(graph, sources, targets, limit, workers):
+    """(len(sources), len(targets)) shortest-path km between road nodes, Dijkstra in source batches."""
+    batch = max(1, int(BATCH_BYTES // (8 * graph.n_nodes)))
+    chunks = [sources[i:i + batch] for i in range(0, len(sources), batch)]
+    if workers > 1 and len(chunks) > 1:
+        path = next(p for p, g in _graphs.items() if g is graph)
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            blocks = list(pool.map(_rows, [path] * len(chunks), chunks, [targets] * len(chunks),
+                                   [limit] * len(chunks)))
+    else:
+        blocks = [graph.shortest_paths(c, limit)[:, targets] for c in chunks]
+    return np.vstack(blocks) if blocks else np.empty((0, len(targets)))
+
+
+def _search_limit(lat, lon, snap_km):
+    """Dijkstra radius: a multiple of the point set's bounding-box diagonal plus the longest snap leg."""
+    span = pair_distances(lat.min(), lon.min(), lat.max(), lon.max(), method="haversine")
+    return float(span) * SEARCH_RADIUS_FACTOR + 2 * float(snap_km.max(initial=0.0))
+
+
+def road_distances(lat1, lon1, lat2=None, lon2=None, graph=None, workers=MATRIX_WORKERS):
+    """
+    Road km matrix between two point sets (square for one set, zero diagonal), as float32.
+    Points are snapped to their nearest road node and the straight-line snap legs are added
+    at both ends; multi-source Dijkstra runs once per distinct source node, bounded by
+    SEARCH_RADIUS_FACTOR x the points' span. Pairs with no path within it fall back to
+    FALLBACK_CIRCUITY x straight-line km.
+    """
+    graph = graph if isinstance(graph, RoadGraph) else get_graph(graph)
+    lat1, lon1 = np.atleast_1d(np.asarray(lat1, dtype=np.float64)), np.atleast_1d(np.asarray(lon1, dtype=np.float64))
+    square = lat2 is None
+    lat2 = lat1 if square else np.atleast_1d(np.asarray(lat2, dtype=np.float64))
+    lon2 = lon1 if square else np.atleast_1d(np.asarray(lon2, dtype=np.float64))
+
+    with timer("road.matrix", rows=len(lat1), cols=len(lat2)):
+        node1, snap1 = graph.snap(lat1, lon1)
+        node2, snap2 = (node1, snap1) if square else graph.snap(lat2, lon2)
+        src, src_inv = np.unique(node1, return_inverse=True)
+        dst, dst_inv = np.unique(node2, return_inverse=True)
+        limit = _search_limit(np.concatenate([lat1, lat2]), np.concatenate([lon1, lon2]),
+                              np.concatenate([snap1, snap2]))
+        between = _node_distances(graph, src, dst, limit, workers)
+        out = between[src_inv[:, None], dst_inv[None, :]] + snap1[:, None] + snap2[None, :]
+
+        unreachable = ~np.isfinite(out)
+        if unreachable.any():
+            count("road.unreachable_pairs", int(unreachable.sum()))
+            r, c = np.nonzero(unreachable)
+            out[r, c] = FALLBACK_CIRCUITY * pair_distances(lat1[r], lon1[r], lat2[c], lon2[c], method="haversine")
+        out = out.astype(np.float32)
+        if square:
+            np.fill_diagonal(out, 0.0)
+    return out
+
+
+def road_pair_distances(lat1, lon1, lat2, lon2, graph=None):
+    """Element-wise road km between matching rows of two coordinate arrays."""
+    graph = graph if isinstance(graph, RoadGraph) else get_graph(graph)
+    lat1, lon1 = np.atleast_1d(np.asarray(lat1, dtype=np.float64)), np.atleast_1d(np.asarray(lon1, dtype=np.float64))
+    lat2, lon2 = np.broadcast_to(np.asarray(lat2, dtype=np.float64), lat1.shape), \
+        np.broadcast_to(np.asarray(lon2, dtype=np.float64), lon1.shape)
+    node1, snap1 = graph.snap(lat1, lon1)
+    node2, snap2 = graph.snap(lat2, lon2)
+    src, src_inv = np.unique(node1, return_inverse=True)
+    dst, dst_inv = np.unique(node2, return_inverse=True)
+    limit = _search_limit(np.concatenate([lat1, lat2]), np.concatenate([lon1, lon2]), np.concatenate([snap1, snap2]))
+    between = _node_distances(graph, src, dst, limit, workers=1)
+    out = between[src_inv, dst_inv] + snap1 + snap2
+    out = np.where(np.isfinite(out), out,
+                   FALLBACK_CIRCUITY * pair_distances(lat1, lon1, lat2, lon2, method="haversine"))
+    same = (lat1 == lat2) & (lon1 == lon2)
+    return np.where(same, 0.0, out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a local OSM extract into the cached road graph.")
+    parser.add_argument("path", nargs="?", default=ROAD_GRAPH_PATH, help="OSM XML extract (.osm/.osm.gz/.osm.bz2)")
+    args = parser.parse_args()
+    load_graph(args.path)
@@ -0,0 +1,161 @@
+# src/route_cache.py
+import hashlib
+import json
+import os
+import pickle
+import time
+import numpy as np
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+CACHE_DIR = "data/cache"
+CACHE_MAX_BYTES = 2 * 1024 ** 3     # LRU-evict above 2 GB
+EVICT_LOCK = ".evict.lock"          # held (O_EXCL) by the process currently evicting
+EVICT_LOCK_STALE_S = 600            # a lock older than this was left by a crashed process
+
+
+def content_key(*arrays, **params):
+    """SHA-256 of the arrays' float64 bytes plus the (JSON-encoded) parameters."""
+    h = hashlib.sha256()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr, dtype=np.float64)
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class RouteCache:
+    """
+    Content-addressed on-disk cache for distance matrices (.npy, memory-mapped on
+    load) and solved routes (.pkl). Access refreshes a file's mtime, and evict()
+    drops least-recently-used files until the cache fits in max_bytes. Several
+    processes may share one root: writes go through per-process *.tmp files that
+    eviction never touches, files removed by another process count as misses,
+    and only one process evicts at a time.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.counts = {'matrix_hit': 0, 'matrix_miss': 0, 'route_hit': 0, 'route_miss': 0}
+
+    def _path(self, kind, key, ext):
+        folder = os.path.join(self.root, kind)
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"{key}{ext}")
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _atomic_write(path, write):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            write(fh)
+        os.replace(tmp, path)
+
+    # ---- Distance matrices ----
+    def load_matrix(self, key):
+        path = self._path("matrices", key, ".npy")
+        try:
+            dist = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            self.counts['matrix_miss'] += 1
+            return None
+        self.counts['matrix_hit'] += 1
+        self._touch(path)
+        return dist
+
+    def save_matrix(self, key, dist):
+        self._atomic_write(self._path("matrices", key, ".npy"), lambda fh: np.save(fh, dist))
+
+    # ---- Solved routes ----
+    def load_route(self, key):
+        path = self._path("routes", key, ".pkl")
+        try:
+            with open(path, "rb") as fh:
+                result = pickle.load(fh)
+        except FileNotFoundError:
+            self.counts['route_miss'] += 1
+            return None
+        self.counts['route_hit'] += 1
+        self._touch(path)
+        return result
+
+    def save_route(self, key, result):
+        self._atomic_write(self._path("routes", key, ".pkl"),
+                           lambda fh: pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL))
+
+    # ---- Housekeeping ----
+    def _entries(self):
+        """(mtime, size, path) of every cache file; in-flight *.tmp writes and the lock are left out."""
+        entries = []
+        for folder, _, files in os.walk(self.root):
+            for f in files:
+                if f.endswith(".tmp") or f == EVICT_LOCK:
+                    continue
+                path = os.path.join(folder, f)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:       # evicted by another process meanwhile
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _lock(self):
+        """Take the eviction lock; False when another process holds it."""
+        path = os.path.join(self.root, EVICT_LOCK)
+        try:
+            if time.time() - os.stat(path).st_mtime > EVICT_LOCK_STALE_S:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def evict(self):
+        """Remove least-recently-used entries until the cache fits in max_bytes; returns files removed."""
+        os.makedirs(self.root, exist_ok=True)
+        if not self._lock():
+            return 0        # another process is already evicting
+        try:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+            return removed
+        finally:
+            try:
+                os.remove(os.path.join(self.root, EVICT_LOCK))
+            except FileNotFoundError:
+                pass
+
+    def merge_counts(self, counts):
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def summary(self):
+        c = self.counts
+        return (f"routes {c['route_hit']} hit / {c['route_miss']} miss | "
+                f"matrices {c['matrix_hit']} hit / {c['matrix_miss']} miss | "
+                f"{self.size_bytes() / 1024 ** 2:.1f} MB in {self.root}")
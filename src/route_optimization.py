@@ -1,7 +1,23 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
-import matplotlib.pyplot as plt
-import networkx as nx
-from geopy.distance import geodesic
+import numpy as np
+from distance_matrix import pairwise_distances, route_length
+from routing import construct_tour
+from local_search import EPS, improve_tour
+from dataclasses import asdict, dataclass
+from route_cache import CACHE_DIR, RouteCache, content_key
+from cvrp import TRUCK_CAPACITY_KG, Fleet, solve_cvrp, assign_trips, link_vehicle_trips
+from storage import read_table, write_table
+from instrumentation import collect, merge, reset as reset_metrics, timer
+from rendering import RENDER_WORKERS, render_route_maps, route_map_job
+from road_network import ROAD_GRAPH_PATH, get_graph
+from time_windows import (ROAD_CIRCUITY, SHIFT_END_MIN, SHIFT_START_MIN, SpeedModel, binding, format_clock,
+                          has_windows, improve_timed_tour, node_windows, schedule, time_oriented_tour,
+                          window_arrays)
 
 # --------------------------
 # CONFIGURATION CONSTANTS
@@ -9,44 +25,292 @@ from geopy.distance import geodesic
 VEHICLE_MILEAGE = 4.0           # km per liter
 FUEL_COST_PER_LITER = 90.0      # ₹ per liter
 CO2_PER_KM = 2.68               # kg CO₂ emitted per km
+DISTANCE_METHOD = "ellipsoidal" # 'ellipsoidal' (WGS-84, exact), 'haversine' (fast) or 'road' (OSM graph)
+CONSTRUCTION_METHOD = "nearest_neighbor"  # 'nearest_neighbor', 'greedy_edge' or 'hilbert'
+IMPROVE_ROUTES = True           # run 2-opt / Or-opt after construction
+USE_OR3OPT = False              # also try reversed segment insertion
+LOCAL_SEARCH_TIME_LIMIT = 10.0  # seconds of local search per cluster
+ROUTES_TABLE = "cluster_routes"  # stop order per cluster (storage table name)
+ROUTE_CACHE_VERSION = 1         # part of every cached route's key; bump when the solver's output changes
+ROUTE_SETTINGS_PATH = "data/route_settings.json"
 
 # --------------------------
 # CORE ROUTE COMPUTATION
 # --------------------------
-def compute_shortest_route(points):
-    """Compute the shortest route using a simple nearest-neighbor heuristic."""
-    G = nx.Graph()
+def _facility_coords(depot=None, dump_sites=None):
+    """(k, 2) lat/lon array: depot first (if any), then dump sites."""
+    rows = ([tuple(depot)] if depot is not None else []) + [tuple(d) for d in (dump_sites or [])]
+    return np.asarray(rows, dtype=np.float64).reshape(-1, 2)
 
-    for i, row in points.iterrows():
-        G.add_node(i, pos=(row['latitude'], row['longitude']))
 
-    for i, r1 in points.iterrows():
-        for j, r2 in points.iterrows():
-            if i != j:
-                dist = geodesic((r1['latitude'], r1['longitude']),
-                                (r2['latitude'], r2['longitude'])).km
-                G.add_edge(i, j, weight=dist)
+def _insert_unloads(order, n, demand, capacity_kg, dist, dump_ids):
+    """
+    Add dump-site detours to a closed order: before a bin that would overflow the
+    truck, and before the final return. Each detour uses the dump minimising
+    current -> dump -> next on the shared matrix.
+    """
+    out = [order[0]]
+    load = float(demand[order[0]]) if order[0] < n else 0.0
+    collected = order[0] < n
+    unloads = 0
+    for k, nxt in enumerate(order[1:], start=1):
+        closing = k == len(order) - 1
+        overflow = not closing and load > 0 and load + float(demand[nxt]) > capacity_kg
+        if (closing and collected) or overflow:
+            cur = out[-1]
+            via = dist[cur, dump_ids].astype(np.float64) + dist[dump_ids, nxt]
+            out.append(int(dump_ids[np.argmin(via)]))
+            unloads += 1
+            load = 0.0
+        if not closing:
+            load += float(demand[nxt])
+            collected = True
+        out.append(nxt)
+    return out, unloads
 
-    visited = [points.index[0]]
-    total_distance = 0
-    while len(visited) < len(points):
-        last = visited[-1]
-        remaining = [n for n in points.index if n not in visited]
-        next_node = min(remaining, key=lambda n: G[last][n]['weight'])
-        total_distance += G[last][next_node]['weight']
-        visited.append(next_node)
 
-    total_distance += G[visited[-1]][visited[0]]['weight']
-    visited.append(visited[0])
+def _retime_unloads(order, n, demand, capacity_kg, dist, travel, e, l, s, shift, **search):
+    """
+    Window-aware search over a closed order that already holds its dump detours, so
+    the unload stops (service and travel) count towards lateness. Every visit is a
+    node of its own (a dump may be used twice). The search may shift a detour past
+    the bin that needed it, so the dumps are dropped from its result and re-inserted
+    by load; the new order is kept only if its schedule is less late.
+    Returns (closed order, unloads).
+    """
+    m = len(demand)
+    unloads = sum(v >= m for v in order)
+    late = schedule(order, travel, e, l, s, shift)['total_late_min']
+    if late <= EPS:
+        return order, unloads
+    idx = np.asarray(order[:-1], dtype=np.int64)
+    sub = np.ix_(idx, idx)
+    tour, _ = improve_timed_tour(np.arange(len(idx)), dist[sub], travel[sub], e[idx], l[idx], s[idx], shift,
+                                 or3opt=USE_OR3OPT, **search)
+    stops = [int(v) for v in idx[tour] if v < m]
+    retimed, moved = _insert_unloads(stops + stops[:1], n, demand, capacity_kg, dist, np.arange(m, len(dist)))
+    if schedule(retimed, travel, e, l, s, shift)['total_late_min'] < late - EPS:
+        return retimed, moved
+    return order, unloads
 
-    return visited, total_distance
+
+def node_matrix(lat, lon, depot=None, dump_sites=None, distance_method=DISTANCE_METHOD, cache=None):
+    """
+    Distance matrix over bins + depot + dump sites (in that order).
+    Returns (node_lat, node_lon, dist, loaded_from_cache).
+    """
+    facilities = _facility_coords(depot, dump_sites)
+    node_lat = np.concatenate([np.asarray(lat, dtype=np.float64), facilities[:, 0]])
+    node_lon = np.concatenate([np.asarray(lon, dtype=np.float64), facilities[:, 1]])
+    if cache is not None:
+        graph = get_graph().key if distance_method == "road" else None
+        key = content_key(node_lat, node_lon, distance_method=distance_method, graph=graph)
+        dist = cache.load_matrix(key)
+        if dist is not None:
+            return node_lat, node_lon, dist, True
+        dist = pairwise_distances(node_lat, node_lon, method=distance_method)
+        cache.save_matrix(key, dist)
+        return node_lat, node_lon, dist, False
+    return node_lat, node_lon, pairwise_distances(node_lat, node_lon, method=distance_method), False
+
+
+def _node_demand(demand, n, m):
+    """Waste per tour node (bins, then a depot with none)."""
+    return np.zeros(m) if demand is None else np.append(np.asarray(demand, dtype=np.float64), np.zeros(m - n))
+
+
+def close_tour(tour, dist, n, demand=None, dump_sites=None, capacity_kg=TRUCK_CAPACITY_KG):
+    """Close an open tour back to its first node, adding dump detours when dump sites exist."""
+    order = np.asarray(tour).tolist()
+    order.append(order[0])
+    if not dump_sites:
+        return order, 0
+    m = len(dist) - len(dump_sites)
+    return _insert_unloads(order, n, _node_demand(demand, n, m), capacity_kg, dist, np.arange(m, len(dist)))
+
+
+@dataclass(frozen=True)
+class CostModel:
+    """Operating-cost assumptions behind the fuel, cost and CO₂ figures."""
+    mileage_kmpl: float = VEHICLE_MILEAGE
+    fuel_cost_per_liter: float = FUEL_COST_PER_LITER
+    co2_per_km: float = CO2_PER_KM
+
+
+def route_costs(distance_km, costs=None):
+    """Fuel (L), cost (₹) and CO₂ (kg) for a distance (scalar or array) under costs (default CostModel())."""
+    costs = costs or CostModel()
+    fuel_used = distance_km / costs.mileage_kmpl
+    return fuel_used, fuel_used * costs.fuel_cost_per_liter, distance_km * costs.co2_per_km
+
+
+def solve_route(lat, lon, distance_method=DISTANCE_METHOD, construction=CONSTRUCTION_METHOD,
+                improve=IMPROVE_ROUTES, time_limit=LOCAL_SEARCH_TIME_LIMIT, max_iterations=None,
+                demand=None, depot=None, dump_sites=None, capacity_kg=TRUCK_CAPACITY_KG, cache=None,
+                windows=None, speed=None, shift=(SHIFT_START_MIN, SHIFT_END_MIN)):
+    """
+    Build a closed tour over coordinate arrays: construction heuristic, then
+    optional 2-opt/Or-opt improvement. Returns (positional order, km, stats).
+    With a depot (lat, lon) the tour leaves from and returns to it. With dump sites
+    the truck unloads whenever the next bin would exceed capacity_kg and before the
+    final return. Depot and dump nodes appear in the order as n, n+1, ... and all
+    legs come from the same distance matrix, which is memory-mapped from `cache`
+    (route_cache.RouteCache) when an identical point set was seen before.
+    windows=(tw_start, tw_end, service_min) arrays in minutes since midnight (NaN = open)
+    and/or speed (time_windows.SpeedModel) make the route timed: binding windows switch
+    to time-oriented construction and window-aware local search (run again over the closed
+    order when dump detours were added), and stats['schedule'] holds arrival/departure
+    minutes along the order plus lateness and waiting; stats['late_min'] is its total.
+    """
+    n = len(lat)
+    if n == 0:
+        return [], 0.0, {'initial_km': 0.0, 'final_km': 0.0, 'improvement_pct': 0.0}
+
+    node_lat, node_lon, dist, matrix_cached = node_matrix(lat, lon, depot, dump_sites, distance_method, cache)
+
+    # Tour nodes are the bins plus the depot; dump sites only join as detours
+    m = n + (depot is not None)
+    start = n if depot is not None else 0
+    timed = windows is not None or speed is not None
+    tight = False
+    if timed:
+        travel = (speed or SpeedModel()).travel_minutes(dist)
+        e, l, s = node_windows(windows, n, len(dist), depot is not None, shift)
+        tight = binding(e[:m], l[:m], shift)
+    if tight:
+        tour = time_oriented_tour(travel, e, l, s, start, range(m))
+    else:
+        tour = construct_tour(node_lat[:m], node_lon[:m], method=construction, start=start, dist=dist[:m, :m],
+                              distance_method=distance_method)
+    if improve and tight:
+        tour, stats = improve_timed_tour(tour, dist[:m, :m], travel, e, l, s, shift, or3opt=USE_OR3OPT,
+                                         time_limit=time_limit, max_iterations=max_iterations)
+    elif improve:
+        tour, stats = improve_tour(tour, dist[:m, :m], or3opt=USE_OR3OPT,
+                                   time_limit=time_limit, max_iterations=max_iterations)
+    else:
+        length = route_length(np.append(tour, tour[:1]), dist)
+        stats = {'initial_km': length, 'final_km': length, 'improvement_pct': 0.0}
+
+    order, unloads = close_tour(tour, dist, n, demand, dump_sites, capacity_kg)
+    if improve and tight and unloads:
+        # Unload detours are only known once the tour is closed; search again with them in place
+        order, unloads = _retime_unloads(order, n, _node_demand(demand, n, m), capacity_kg, dist, travel,
+                                         e, l, s, shift, time_limit=time_limit, max_iterations=max_iterations)
+    if dump_sites:
+        stats['unloads'] = unloads
+    stats['matrix_cached'] = matrix_cached
+    if timed:
+        # The search minimises time warp; the reported lateness is the clock schedule's, detours included
+        stats['schedule'] = schedule(order, travel, e, l, s, shift)
+        stats['late_min'] = stats['schedule']['total_late_min']
+    return order, route_length(order, dist), stats
+
+
+def schedule_columns(times, at_bin):
+    """Arrival, departure and lateness minutes per bin of a timed route (at_bin: the bins' positions in the order)."""
+    return {c: times[c][at_bin].astype(np.float32) for c in ('arrival_min', 'departure_min', 'late_min')}
+
+
+def schedule_summary(times):
+    """Route summary fields of a timed route's schedule."""
+    return dict(start=format_clock(times['arrival_min'][0]), end=format_clock(times['arrival_min'][-1]),
+                duration_h=round(times['duration_min'] / 60, 2), late_stops=times['late_stops'])
+
+
+def compute_shortest_route(points, distance_method=DISTANCE_METHOD, construction=CONSTRUCTION_METHOD,
+                           improve=IMPROVE_ROUTES, depot=None, dump_sites=None, speed=None, with_schedule=False):
+    """
+    Compute the shortest route: nearest-neighbor construction refined by 2-opt/Or-opt local search.
+    Depot and dump-site stops are labelled 'depot' and 'dump_<i>' in the returned route.
+    Points with tw_start / tw_end / service_min columns are routed within their windows.
+    with_schedule=True also returns a per-stop DataFrame of arrival, departure, waiting and lateness.
+    """
+    demand = points['waste_kg'].to_numpy() if dump_sites and 'waste_kg' in points.columns else None
+    windows = window_arrays(points) if has_windows(points) else None
+    if with_schedule and speed is None:
+        speed = SpeedModel()
+    order, total_distance, stats = solve_route(points['latitude'].to_numpy(), points['longitude'].to_numpy(),
+                                               distance_method=distance_method, construction=construction,
+                                               improve=improve, demand=demand, depot=depot, dump_sites=dump_sites,
+                                               windows=windows, speed=speed)
+    labels = points.index.tolist() + (['depot'] if depot is not None else [])
+    labels += [f"dump_{i}" for i in range(len(dump_sites or []))]
+    visited = [labels[i] for i in order]
+
+    if not with_schedule:
+        return visited, total_distance
+    times = stats['schedule']
+    timetable = pd.DataFrame({'stop': visited, **{c: np.round(times[c], 1) for c in
+                                                  ('arrival_min', 'departure_min', 'wait_min', 'late_min')}})
+    timetable['arrival'] = [format_clock(t) for t in times['arrival_min']]
+    return visited, total_distance, timetable
 
 
 # --------------------------
 # OPTIMIZATION & ANALYSIS
 # --------------------------
-def optimize_routes():
-    df = pd.read_csv('data/clustered_points.csv')
+def _solve_cluster(coords, fleet=None, **params):
+    """
+    Process-pool entry point: coords is a float64 array of lat/lon (plus waste_kg
+    when routing with a fleet or dump sites, then tw_start / tw_end / service_min for
+    timed routes). Returns (route or trips, km, stats).
+    """
+    with timer("route.solve_cluster", stops=coords.shape[1]):
+        if fleet is None:
+            demand = coords[2] if len(coords) > 2 else None
+            windows = coords[3:6] if len(coords) > 3 else None
+            return solve_route(coords[0], coords[1], demand=demand, windows=windows, **params)
+        trips, stats = solve_cvrp(coords[0], coords[1], coords[2], capacity=fleet.capacity_kg,
+                                  depot_lat=fleet.depot_lat, depot_lon=fleet.depot_lon,
+                                  distance_method=params.get('distance_method', DISTANCE_METHOD),
+                                  improve=params['improve'], time_limit=params['time_limit'],
+                                  dump_sites=fleet.dump_sites)
+        return trips, stats['final_km'], stats
+
+
+def _solve_cluster_traced(coords, fleet=None, **params):
+    """Pool variant of _solve_cluster that also returns the worker's metrics for the parent to merge."""
+    reset_metrics()     # forked workers start with a copy of the parent's metrics
+    result = _solve_cluster(coords, fleet=fleet, **params)
+    return result, collect()
+
+
+def _resolve_workers(workers):
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def optimize_routes(improve=IMPROVE_ROUTES, time_limit=LOCAL_SEARCH_TIME_LIMIT, max_iterations=None, workers=1,
+                    fleet=None, depot=None, dump_sites=None, use_cache=True, cache_dir=CACHE_DIR, df=None, save=True,
+                    render=True, render_workers=RENDER_WORKERS, map_jobs=None, speed=None,
+                    distance_method=DISTANCE_METHOD, road_graph=None, costs=None):
+    """
+    Route every cluster in the clustered_points table (or the in-memory frame df);
+    time_limit/max_iterations cap local search per cluster.
+    workers > 1 routes clusters in a process pool (workers <= 0 uses every core); output order is unchanged.
+    depot=(lat, lon) anchors each cluster's loop at the depot; dump_sites=[(lat, lon), ...] adds unload
+    detours (whenever a truck load of waste_kg is reached, and before returning).
+    fleet (cvrp.Fleet) switches to capacitated routing: each cluster is split into depot trips by waste_kg
+    and the trips are spread over the fleet's vehicles (trip_stops and trip_summary tables).
+    use_cache keeps matrices and solved routes under cache_dir keyed by each cluster's coordinates and
+    routing parameters (plus ROUTE_CACHE_VERSION), so only clusters whose membership changed are recomputed.
+    save=False skips writing the output tables. Route maps are drawn after routing (rendering.py,
+    render_workers processes); render=False skips them, and a list passed as map_jobs receives the
+    map jobs instead so a later stage can draw them. Returns the route summary DataFrame.
+    Bins with tw_start / tw_end / service_min (time_windows.py) are routed within their windows at
+    `speed` (SpeedModel); the cluster_routes table then carries arrival and departure minutes per stop.
+    distance_method='road' measures every leg on the OSM extract road_graph (road_network.py; default
+    ROAD_GRAPH_PATH), loaded once here so pool workers inherit it.
+    costs (CostModel) sets the mileage, fuel price and CO₂ factor; it never changes the routes.
+    """
+    if df is None:
+        df = read_table('clustered_points')
+    timed = fleet is None and (speed is not None or has_windows(df))
+    graph_key = get_graph(road_graph).key if distance_method == "road" else None
+    if fleet is not None and has_windows(df):
+        print("⚠️ Time windows are not applied to capacitated fleet routing; routing by load only.")
 
     results = []
     total_distance_all = 0
@@ -54,55 +318,245 @@ def optimize_routes():
     total_cost = 0
     total_co2 = 0
 
-    for cluster_id in df['cluster'].unique():
-        cluster_points = df[df['cluster'] == cluster_id].reset_index(drop=True)
-        route, total_distance = compute_shortest_route(cluster_points)
+    # Clusters in first-appearance order, same as df['cluster'].unique()
+    groups = df.groupby('cluster', sort=False).indices
+    cluster_ids = list(groups)
+    lat = df['latitude'].to_numpy(dtype=np.float64)
+    lon = df['longitude'].to_numpy(dtype=np.float64)
+    ids = df['id'].to_numpy()
+    columns = [lat, lon]
+    if fleet is not None or dump_sites or timed:
+        columns.append(df['waste_kg'].to_numpy(dtype=np.float64))
+    if timed:
+        columns.extend(window_arrays(df))
+    coords = [np.stack([col[groups[c]] for col in columns]) for c in cluster_ids]
+
+    params = dict(improve=improve, time_limit=time_limit, distance_method=distance_method)
+    if fleet is None:
+        params.update(max_iterations=max_iterations, depot=depot, dump_sites=dump_sites)
+        if timed:
+            # Road km already include the detours a circuity factor stands in for
+            params['speed'] = speed or SpeedModel(circuity=1.0 if distance_method == "road" else ROAD_CIRCUITY)
+        facilities = _facility_coords(depot, dump_sites)
+    else:
+        facilities = _facility_coords((fleet.depot_lat, fleet.depot_lon), fleet.dump_sites)
+    cache = RouteCache(cache_dir) if use_cache else None
+    if cache is not None and fleet is None:
+        params['cache'] = cache
+    solve = partial(_solve_cluster, fleet=fleet, **params)
+    solve_traced = partial(_solve_cluster_traced, fleet=fleet, **params)
+
+    # ---- Reuse cached routes; only changed clusters are solved ----
+    solved = [None] * len(coords)
+    keys = []
+    if cache is not None:
+        settings = {k: v for k, v in params.items() if k != 'cache'}
+        # Trips are planned per cluster before they are spread over the trucks, so n_vehicles stays out
+        fleet_key = {k: v for k, v in asdict(fleet).items() if k != 'n_vehicles'} if fleet is not None else None
+        settings.update(version=ROUTE_CACHE_VERSION, fleet=fleet_key, road_graph=graph_key,
+                        construction=CONSTRUCTION_METHOD, or3opt=USE_OR3OPT, capacity_kg=TRUCK_CAPACITY_KG)
+        if timed:
+            settings.update(speed=asdict(params['speed']), shift=(SHIFT_START_MIN, SHIFT_END_MIN))
+        keys = [content_key(c, **settings) for c in coords]
+        solved = [cache.load_route(k) for k in keys]
+    todo = [i for i, result in enumerate(solved) if result is None]
+
+    workers = min(_resolve_workers(workers), len(todo)) or 1
+    if workers > 1:
+        # Submit larger clusters first so the pool does not end on one long straggler,
+        # then collect in the original order
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            by_size = sorted(todo, key=lambda i: -coords[i].shape[1])
+            futures = {i: pool.submit(solve_traced, coords[i]) for i in by_size}
+            for i in todo:
+                solved[i], metrics = futures[i].result()
+                merge(metrics)
+        print(f"⚙️ Routed {len(todo)} clusters on {workers} worker processes")
+    else:
+        for i in todo:
+            solved[i] = solve(coords[i])
+
+    if cache is not None:
+        for i in todo:
+            cache.save_route(keys[i], solved[i])
+            # Pool workers counted matrix lookups on their own copy of the cache
+            if workers > 1 and fleet is None:
+                cache.merge_counts({'matrix_hit' if solved[i][2]['matrix_cached'] else 'matrix_miss': 1})
+
+    trip_rows, plan, route_frames, jobs = [], [], [], []
+    if fleet is not None:
+        # Vehicles chain trips across clusters, so unload/return legs are only known after assignment
+        trip_rows = [(cluster_id, t) for cluster_id, (trips, _, _) in zip(cluster_ids, solved) for t in trips]
+        plan = assign_trips([t['distance_km'] for _, t in trip_rows], fleet.n_vehicles)
+        link_vehicle_trips([t for _, t in trip_rows], plan, fleet.dump_sites, distance_method=distance_method)
+        solved = [(trips, sum(t['distance_km'] for t in trips), stats) for trips, _, stats in solved]
+
+    for cluster_id, (route, total_distance, stats) in zip(cluster_ids, solved):
+        members = groups[cluster_id]
+        n = len(members)
+        node_lat = np.concatenate([lat[members], facilities[:, 0]])
+        node_lon = np.concatenate([lon[members], facilities[:, 1]])
+        if fleet is None:
+            paths = [(node_lat[route], node_lon[route])]
+            at_bin = np.flatnonzero(np.asarray(route[:-1]) < n)
+            bins = np.asarray(route)[at_bin]
+            frame = pd.DataFrame({'cluster': cluster_id, 'stop_seq': np.arange(1, len(bins) + 1),
+                                  'id': ids[members[bins]]})
+            if timed:
+                frame = frame.assign(**schedule_columns(stats['schedule'], at_bin))
+            route_frames.append(frame)
+        else:
+            paths = []
+            for t in route:
+                nodes = [n, *t['stops'].tolist()] + ([n + 1 + t['dump']] if t['dump'] is not None else []) + [n]
+                paths.append((node_lat[nodes], node_lon[nodes]))
 
         # ---- Calculations ----
-        fuel_used = total_distance / VEHICLE_MILEAGE
-        cost = fuel_used * FUEL_COST_PER_LITER
-        co2_emission = total_distance * CO2_PER_KM
+        fuel_used, cost, co2_emission = route_costs(total_distance, costs)
 
         total_distance_all += total_distance
         total_fuel += fuel_used
         total_cost += cost
         total_co2 += co2_emission
 
-        results.append({
+        row = {
             'cluster': cluster_id,
             'distance_km': round(total_distance, 2),
             'fuel_liters': round(fuel_used, 2),
             'cost_rs': round(cost, 0),
-            'co2_kg': round(co2_emission, 1)
-        })
+            'co2_kg': round(co2_emission, 1),
+            'improvement_pct': round(stats['improvement_pct'], 1)
+        }
+        if fleet is not None:
+            row['trips'] = len(route)
+        elif dump_sites:
+            row['unloads'] = stats['unloads']
+        if timed:
+            row.update(schedule_summary(stats['schedule']))
+        results.append(row)
 
-        # ---- Plot the route ----
-        plt.figure(figsize=(8, 6))
-        plt.scatter(cluster_points['latitude'], cluster_points['longitude'], c='blue', s=40)
-        for i in range(len(route) - 1):
-            p1 = cluster_points.iloc[route[i]]
-            p2 = cluster_points.iloc[route[i + 1]]
-            plt.plot([p1['latitude'], p2['latitude']], [p1['longitude'], p2['longitude']], 'r-')
+        # ---- Route map (drawn after the loop) ----
+        if render or map_jobs is not None:
+            jobs.append(route_map_job(cluster_id, node_lat[:n], node_lon[:n], paths, facilities,
+                                      has_depot=fleet is not None or depot is not None,
+                                      title=f"Cluster {cluster_id} | {total_distance:.2f} km | ₹{cost:.0f} | "
+                                            f"{co2_emission:.1f} kg CO₂"))
 
-        plt.title(f"Cluster {cluster_id} | {total_distance:.2f} km | ₹{cost:.0f} | {co2_emission:.1f} kg CO₂")
-        plt.xlabel("Latitude")
-        plt.ylabel("Longitude")
-        plt.grid(True)
-        plt.savefig(f"data/route_cluster_{cluster_id}.png")
+        print(f"✅ Cluster {cluster_id}: {total_distance:.2f} km | Fuel {fuel_used:.2f} L | ₹{cost:.0f} | CO₂ {co2_emission:.1f} kg"
+              f" | {stats['improvement_pct']:.1f}% shorter than construction"
+              + (f" | {row['start']}–{row['end']}, {row['late_stops']} late" if timed else ""))
 
-        print(f"✅ Cluster {cluster_id}: {total_distance:.2f} km | Fuel {fuel_used:.2f} L | ₹{cost:.0f} | CO₂ {co2_emission:.1f} kg")
+    if map_jobs is not None:
+        map_jobs.extend(jobs)
+    elif render:
+        render_route_maps(jobs, workers=render_workers)
 
     # ---- Save summary ----
     df_summary = pd.DataFrame(results)
-    df_summary.to_csv("data/route_summary.csv", index=False)
+    if save:
+        summary_path = write_table(df_summary, 'route_summary')
+
+    if save and fleet is not None:
+        _save_trip_plan(df, groups, trip_rows, plan, fleet)
+    elif save and route_frames:
+        # Stop order per cluster, used by incremental re-routing
+        write_table(pd.concat(route_frames, ignore_index=True), ROUTES_TABLE)
+        with open(ROUTE_SETTINGS_PATH, "w") as fh:
+            json.dump({'depot': depot, 'dump_sites': dump_sites or [], 'distance_method': distance_method,
+                       'road_graph': road_graph, 'speed': asdict(params['speed']) if timed else None}, fh)
 
     print("\n🌍 TOTAL SYSTEM SUMMARY")
     print(f"   Total Distance: {total_distance_all:.2f} km")
     print(f"   Total Fuel Used: {total_fuel:.2f} L")
     print(f"   Total Fuel Cost: ₹{total_cost:.0f}")
     print(f"   Total CO₂ Emission: {total_co2:.1f} kg")
-    print("\n📁 Saved route summary to data/route_summary.csv")
+    if cache is not None:
+        evicted = cache.evict()
+        print(f"   Cache: {cache.summary()}" + (f" | evicted {evicted} files" if evicted else ""))
+    if save:
+        print(f"\n📁 Saved route summary to {summary_path}")
+    return df_summary
+
+
+def _save_trip_plan(df, groups, trip_rows, plan, fleet):
+    """Write per-stop and per-trip tables for the vehicle plan."""
+    stop_frames, summary = [], []
+    for (cluster_id, trip), (vehicle, trip_no) in zip(trip_rows, plan):
+        stops = df.iloc[groups[cluster_id][trip['stops']]]
+        stop_frames.append(pd.DataFrame({
+            'vehicle': vehicle,
+            'trip': trip_no,
+            'cluster': cluster_id,
+            'stop_seq': np.arange(1, len(stops) + 1),
+            'id': stops['id'].to_numpy(),
+            'latitude': stops['latitude'].to_numpy(),
+            'longitude': stops['longitude'].to_numpy(),
+            'waste_kg': stops['waste_kg'].to_numpy(),
+            'load_kg': stops['waste_kg'].cumsum().to_numpy(),
+        }))
+        summary.append({
+            'vehicle': vehicle,
+            'trip': trip_no,
+            'cluster': cluster_id,
+            'stops': len(stops),
+            'load_kg': round(trip['load_kg'], 1),
+            'dump_site': trip['dump'] if trip['dump'] is not None else '',
+            'distance_km': round(trip['distance_km'], 2),
+        })
+
+    stops_path = write_table(pd.concat(stop_frames, ignore_index=True).sort_values(['vehicle', 'trip', 'stop_seq']),
+                             'trip_stops')
+    df_trips = pd.DataFrame(summary).sort_values(['vehicle', 'trip'])
+    trips_path = write_table(df_trips, 'trip_summary')
+
+    print(f"\n🚛 Capacitated plan: {len(df_trips)} trips on {fleet.n_vehicles} vehicle(s) "
+          f"({fleet.capacity_kg:.0f} kg each)")
+    per_vehicle = df_trips.groupby('vehicle').agg(trips=('trip', 'count'), km=('distance_km', 'sum'))
+    for vehicle, row in per_vehicle.iterrows():
+        print(f"   Vehicle {vehicle}: {int(row['trips'])} trips | {row['km']:.2f} km")
+    print(f"📁 Saved trip plan to {stops_path} and {trips_path}")
 
 
 if __name__ == "__main__":
-    optimize_routes()
+    parser = argparse.ArgumentParser(description="Optimize collection routes for every cluster.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="process-pool size for routing clusters in parallel (0 = all cores)")
+    parser.add_argument("--time-limit", type=float, default=LOCAL_SEARCH_TIME_LIMIT,
+                        help="seconds of local search per cluster")
+    parser.add_argument("--max-iterations", type=int, default=None,
+                        help="cap on improving moves per cluster")
+    parser.add_argument("--no-improve", action="store_true",
+                        help="report construction tours without local search")
+    parser.add_argument("--vehicles", type=int, default=None,
+                        help="enable capacitated routing with this many trucks")
+    parser.add_argument("--capacity", type=float, default=Fleet.capacity_kg,
+                        help="truck capacity in kg (capacitated mode)")
+    parser.add_argument("--depot", type=float, nargs=2, metavar=("LAT", "LON"), default=None,
+                        help="depot every route starts and ends at (capacitated default: city centre)")
+    parser.add_argument("--dump", type=float, nargs=2, metavar=("LAT", "LON"), action="append", default=[],
+                        help="dump site / transfer station; repeat for several")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="recompute every cluster instead of reusing data/cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="location of the route/matrix cache")
+    parser.add_argument("--distance", choices=["ellipsoidal", "haversine", "road"], default=DISTANCE_METHOD,
+                        help="leg distances: geodesic, or shortest paths on a local OSM extract")
+    parser.add_argument("--road-graph", default=None, help=f"OSM XML extract for --distance road "
+                                                            f"(default: {ROAD_GRAPH_PATH})")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="average truck speed in km/h; times every route (windows come from the bins)")
+    parser.add_argument("--no-maps", action="store_true", help="skip the per-cluster route maps (headless runs)")
+    parser.add_argument("--render-workers", type=int, default=RENDER_WORKERS,
+                        help="processes drawing route maps (0 = all cores)")
+    args = parser.parse_args()
+    fleet = None
+    if args.vehicles:
+        depot = args.depot or (Fleet.depot_lat, Fleet.depot_lon)
+        fleet = Fleet(n_vehicles=args.vehicles, capacity_kg=args.capacity,
+                      depot_lat=depot[0], depot_lon=depot[1], dump_sites=[tuple(d) for d in args.dump])
+    optimize_routes(improve=not args.no_improve, time_limit=args.time_limit,
+                    max_iterations=args.max_iterations, workers=args.workers, fleet=fleet,
+                    depot=args.depot, dump_sites=[tuple(d) for d in args.dump],
+                    use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                    render=not args.no_maps, render_workers=args.render_workers,
+                    speed=SpeedModel(speed_kmh=args.speed) if args.speed else None,
+                    distance_method=args.distance, road_graph=args.road_graph)
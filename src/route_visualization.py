@@ -1,8 +1,12 @@
 import pandas as pd
 import plotly.graph_objects as go
+from storage import read_table
 
-def visualize_route_efficiency():
-    df = pd.read_csv("data/route_summary.csv")
+def visualize_route_efficiency(df=None, show=True):
+    """Bar/line charts of the route summary (df or the stored route_summary table); returns the figures."""
+    if df is None:
+        df = read_table("route_summary")
+    df = df.copy()
 
     # Create a simple efficiency metric
     df["efficiency_score"] = (df["distance_km"] / df["fuel_liters"]).round(2)
@@ -31,7 +35,8 @@ def visualize_route_efficiency():
         template="plotly_white"
     )
 
-    fig.show()
+    if show:
+        fig.show()
 
     # ---- CO₂ emissions ----
     fig2 = go.Figure()
@@ -45,7 +50,8 @@ def visualize_route_efficiency():
         yaxis_title="CO₂ (kg)",
         template="plotly_white"
     )
-    fig2.show()
+    if show:
+        fig2.show()
 
     # ---- Efficiency metric ----
     fig3 = go.Figure()
@@ -61,7 +67,9 @@ def visualize_route_efficiency():
         yaxis_title="Efficiency Score",
         template="plotly_white"
     )
-    fig3.show()
+    if show:
+        fig3.show()
+    return fig, fig2, fig3
 
 if __name__ == "__main__":
     visualize_route_efficiency()
@@ -0,0 +1,237 @@
+# src/routing.py
+import numpy as np
+from sklearn.neighbors import BallTree
+from distance_matrix import EARTH_RADIUS_KM, pair_distances
+from instrumentation import timer
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+INITIAL_K = 8                # neighbours fetched per query before expanding
+GREEDY_CANDIDATES = 10       # kNN candidate edges per point for greedy-edge
+HILBERT_ORDER = 16           # grid resolution 2^order per axis
+# Matrix distances are never shorter than this fraction of the great-circle
+# distance (holds for WGS-84 geodesics, float32 rounding and road networks).
+SPHERE_LOWER_RATIO = 0.99
+
+
+# --------------------------
+# SPATIAL INDEX WITH VISITED MASK
+# --------------------------
+class _UnvisitedIndex:
+    """
+    BallTree (haversine) over the points that are still unvisited.
+    The tree is rebuilt from the survivors once half of its points have been
+    visited, so each query stays O(log n) amortized.
+    """
+
+    def __init__(self, lat, lon, active=None):
+        self.X = np.radians(np.column_stack([lat, lon]))
+        self.visited = np.zeros(len(self.X), dtype=bool)
+        if active is not None:
+            self.visited[:] = True
+            self.visited[active] = False
+        self._rebuild()
+
+    def _rebuild(self):
+        self.ids = np.flatnonzero(~self.visited)
+        self.stale = 0
+        self.tree = BallTree(self.X[self.ids], metric='haversine') if len(self.ids) else None
+
+    def visit(self, i):
+        self.visited[i] = True
+        self.stale += 1
+        if self.stale * 2 > len(self.ids):
+            self._rebuild()
+
+    def nearest(self, i, dist=None, method="haversine"):
+        """Nearest unvisited point to i, ties broken by lowest index. None if all visited."""
+        size = len(self.ids)
+        if size == 0:
+            return None
+        k = min(INITIAL_K, size)
+        while True:
+            sph, pos = self.tree.query(self.X[i:i + 1], k=k)
+            sph, cand = sph[0] * EARTH_RADIUS_KM, self.ids[pos[0]]
+            keep = ~self.visited[cand]
+            if keep.any():
+                cand = cand[keep]
+                if dist is not None:
+                    d = dist[i, cand]
+                else:
+                    d = pair_distances(np.degrees(self.X[i, 0]), np.degrees(self.X[i, 1]),
+                                       np.degrees(self.X[cand, 0]), np.degrees(self.X[cand, 1]),
+                                       method=method)
+                best = np.lexsort((cand, d))[0]
+                # Anything outside the k-ball is at least this far away
+                if k == size or d[best] < sph[-1] * SPHERE_LOWER_RATIO:
+                    return int(cand[best])
+            if k == size:
+                return None
+            k = min(k * 2, size)
+
+
+# --------------------------
+# CONSTRUCTION HEURISTICS
+# --------------------------
+def nearest_neighbor_tour(lat, lon, start=0, dist=None, method="haversine"):
+    """
+    Nearest-neighbor tour (open permutation starting at `start`).
+    Uses dist[i, j] when a matrix is given, otherwise computes candidate
+    distances on the fly, so no n x n matrix is required.
+    """
+    n = len(lat)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    index = _UnvisitedIndex(lat, lon)
+    tour = np.empty(n, dtype=np.int64)
+    tour[0] = start
+    index.visit(start)
+    for step in range(1, n):
+        tour[step] = index.nearest(tour[step - 1], dist=dist, method=method)
+        index.visit(tour[step])
+    return tour
+
+
+def greedy_edge_tour(lat, lon, start=0, dist=None, method="haversine"):
+    """
+    Greedy-edge tour: add the shortest kNN candidate edges that keep every
+    degree <= 2 without closing a cycle, then chain the fragments nearest-first.
+    """
+    n = len(lat)
+    if n <= 2:
+        return _rotate(np.arange(n, dtype=np.int64), start)
+
+    X = np.radians(np.column_stack([lat, lon]))
+    k = min(GREEDY_CANDIDATES + 1, n)
+    _, nbrs = BallTree(X, metric='haversine').query(X, k=k)
+    a = np.repeat(np.arange(n), k - 1)
+    b = nbrs[:, 1:].ravel()
+    a, b = np.minimum(a, b), np.maximum(a, b)
+    edges = np.unique(np.column_stack([a, b]), axis=0)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    i, j = edges[:, 0], edges[:, 1]
+    if dist is not None:
+        w = dist[i, j]
+    else:
+        w = pair_distances(lat[i], lon[i], lat[j], lon[j], method=method)
+    order = np.lexsort((j, i, w))
+
+    adj = np.full((n, 2), -1, dtype=np.int64)
+    degree = np.zeros(n, dtype=np.int64)
+    parent = np.arange(n)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for e in order:
+        u, v = i[e], j[e]
+        if degree[u] >= 2 or degree[v] >= 2:
+            continue
+        ru, rv = find(u), find(v)
+        if ru == rv:
+            continue
+        parent[ru] = rv
+        adj[u, degree[u]] = v
+        adj[v, degree[v]] = u
+        degree[u] += 1
+        degree[v] += 1
+
+    # ---- Chain path fragments (isolated points are fragments of length 1) ----
+    endpoints = np.flatnonzero(degree < 2)
+    other_end = {}
+    for e in endpoints:
+        if e in other_end:
+            continue
+        prev, cur = -1, e
+        while True:
+            nxt = adj[cur, 0] if adj[cur, 0] != prev else adj[cur, 1]
+            if nxt == -1:
+                break
+            prev, cur = cur, nxt
+        other_end[e], other_end[cur] = cur, e
+
+    index = _UnvisitedIndex(lat, lon, active=endpoints)
+    tour = np.empty(n, dtype=np.int64)
+    pos = 0
+    head = endpoints[0]
+    while head is not None:
+        tail = other_end[head]
+        index.visit(head)
+        if tail != head:
+            index.visit(tail)
+        prev, cur = -1, head
+        while True:
+            tour[pos] = cur
+            pos += 1
+            if cur == tail:
+                break
+            nxt = adj[cur, 0] if adj[cur, 0] != prev else adj[cur, 1]
+            prev, cur = cur, nxt
+        head = index.nearest(tail, dist=dist, method=method)
+
+    return _rotate(tour, start)
+
+
+def _hilbert_index(x, y, order):
+    """Vectorized position of integer grid cells along a Hilbert curve."""
+    side = 1 << order
+    x, y = x.astype(np.int64).copy(), y.astype(np.int64).copy()
+    d = np.zeros(len(x), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        flip = ~ry & rx
+        x[flip] = side - 1 - x[flip]
+        y[flip] = side - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap].copy()
+        s >>= 1
+    return d
+
+
+def hilbert_tour(lat, lon, start=0, dist=None, method="haversine"):
+    """Space-filling-curve tour: visit points in Hilbert-curve order (O(n log n))."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = len(lat)
+    if n <= 2:
+        return _rotate(np.arange(n, dtype=np.int64), start)
+
+    # Equirectangular projection so both axes share one scale
+    x = (lon - lon.min()) * np.cos(np.radians(lat.mean()))
+    y = lat - lat.min()
+    span = max(x.max(), y.max()) or 1.0
+    cells = (1 << HILBERT_ORDER) - 1
+    h = _hilbert_index(np.round(x / span * cells), np.round(y / span * cells), HILBERT_ORDER)
+    return _rotate(np.lexsort((np.arange(n), h)), start)
+
+
+def _rotate(tour, start):
+    tour = np.asarray(tour, dtype=np.int64)
+    if len(tour) == 0:
+        return tour
+    return np.roll(tour, -int(np.flatnonzero(tour == start)[0]))
+
+
+CONSTRUCTORS = {
+    "nearest_neighbor": nearest_neighbor_tour,
+    "greedy_edge": greedy_edge_tour,
+    "hilbert": hilbert_tour,
+}
+
+
+def construct_tour(lat, lon, method="nearest_neighbor", start=0, dist=None, distance_method="haversine"):
+    """Build an initial tour (open permutation beginning at `start`) with the chosen heuristic."""
+    if method not in CONSTRUCTORS:
+        raise ValueError(f"Unknown construction method '{method}'. Use one of {sorted(CONSTRUCTORS)}.")
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    with timer("routing.construct_tour", method=method, stops=len(lat)):
+        return CONSTRUCTORS[method](lat, lon, start=start, dist=dist, method=distance_method)
@@ -0,0 +1,447 @@
+# src/routing_service.py
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import time
+import traceback
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from route_cache import CACHE_DIR
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_URL = os.environ.get("ROUTING_SERVICE_URL", f"http://{SERVICE_HOST}:{SERVICE_PORT}")
+JOBS_DIR = "data/jobs"          # one working directory per job: input, data/, outputs/, log and result
+SERVICE_WORKERS = 2             # jobs solved at once (one process each)
+MAX_UPLOAD_BYTES = 256 * 1024 ** 2
+EVENT_POLL_S = 0.5              # how often the progress stream checks a running job
+UPLOAD_FORMATS = {'text/csv': 'csv', 'application/vnd.apache.parquet': 'parquet', 'application/x-parquet': 'parquet'}
+# Job options (query parameters of POST /jobs) and their defaults
+JOB_OPTIONS = {
+    'recluster': False,         # re-cluster even when the points carry a cluster column
+    'report': True,             # Excel + PDF report
+    'maps': False,              # matplotlib cluster / route maps
+    'time_limit': None,         # seconds of local search per cluster
+    'distance_method': None,    # ellipsoidal | haversine | road
+    'road_graph': None,         # OSM extract for distance_method=road
+}
+_OPTION_TYPES = {'recluster': bool, 'report': bool, 'maps': bool, 'time_limit': float,
+                 'distance_method': str, 'road_graph': str}
+_STATUS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def parse_options(query):
+    """Job options from a query dict ({name: [value]}); unknown names raise ValueError."""
+    options = dict(JOB_OPTIONS)
+    for name, values in query.items():
+        if name not in JOB_OPTIONS:
+            raise ValueError(f"unknown option '{name}' (expected one of {sorted(JOB_OPTIONS)})")
+        value, kind = values[-1], _OPTION_TYPES[name]
+        if kind is bool:
+            options[name] = value.lower() in ("1", "true", "yes", "on")
+        else:
+            options[name] = kind(value) if value != "" else None
+    if options['distance_method'] not in (None, "ellipsoidal", "haversine", "road"):
+        raise ValueError(f"unknown distance_method '{options['distance_method']}'")
+    if options['road_graph']:
+        options['road_graph'] = os.path.abspath(options['road_graph'])    # jobs run in their own directory
+    return options
+
+
+def job_id(data, options):
+    """Content address of a submission: identical points and options map to the same job."""
+    h = hashlib.sha256(data)
+    h.update(json.dumps(options, sort_keys=True).encode())
+    return h.hexdigest()[:20]
+
+
+# --------------------------
+# JOB EXECUTION (pool worker)
+# --------------------------
+def run_job(job_dir, input_name, options, cache_dir):
+    """
+    Cluster and route one upload inside job_dir: tables, maps and reports land in its own
+    data/ and outputs/, the route cache is shared. Stage progress is appended to
+    progress.jsonl and stdout to log.txt; result.json is written last.
+    """
+    from pipeline import build_pipeline
+
+    if options.get('distance_method') == "road" and not options.get('road_graph'):
+        from road_network import ROAD_GRAPH_PATH
+        # The default extract is relative to the service's directory, not the job's
+        options = {**options, 'road_graph': os.path.abspath(ROAD_GRAPH_PATH)}
+    previous = os.getcwd()
+    os.chdir(job_dir)
+    try:
+        os.makedirs("data", exist_ok=True)
+        os.makedirs("outputs", exist_ok=True)
+        with open("log.txt", "a", buffering=1) as log, open("progress.jsonl", "a", buffering=1) as progress, \
+                contextlib.redirect_stdout(log):
+
+            def on_stage(timing, done, total):
+                progress.write(json.dumps({**timing, 'done': done, 'total': total, 'time': time.time()}) + "\n")
+
+            routing = {'workers': 1, 'cache_dir': cache_dir}
+            for name in ('time_limit', 'distance_method', 'road_graph'):
+                if options.get(name) is not None:
+                    routing[name] = options[name]
+            pipe = build_pipeline(points_path=input_name, keep_clusters=not options['recluster'], export_csv=True,
+                                  maps=options['maps'], charts=False, report=options['report'], **routing)
+            results = pipe.run(on_stage=on_stage)
+
+        summary = results['routes']
+        files = sorted(os.path.relpath(os.path.join(root, name)).replace(os.sep, "/")
+                       for folder in ("data", "outputs") for root, dirs, names in os.walk(folder)
+                       if "cache" not in root.split(os.sep) for name in names)
+        result = {
+            'clusters': int(results['clusters']['cluster'].nunique()),
+            'points': int(len(results['clusters'])),
+            'total_distance_km': round(float(summary['distance_km'].sum()), 3),
+            'summary': json.loads(summary.to_json(orient="records")),
+            'stages': pipe.timings,
+            'files': files,
+        }
+        with open("result.json.tmp", "w") as fh:
+            json.dump(result, fh, indent=1)
+        os.replace("result.json.tmp", "result.json")
+        return result
+    finally:
+        os.chdir(previous)
+
+
+# --------------------------
+# SERVICE
+# --------------------------
+@dataclass
+class Job:
+    id: str
+    input_name: str
+    options: dict
+    status: str = "queued"      # queued | running | done | failed
+    submitted: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    error: str = None
+
+
+class RoutingService:
+    """
+    Job queue in front of a process pool. Each submission is content-addressed, so
+    re-posting the same points and options returns the existing job (and finished jobs
+    found under jobs_dir at start-up are served from disk) instead of solving again.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, workers=SERVICE_WORKERS, cache_dir=CACHE_DIR):
+        self.jobs_dir = os.path.abspath(jobs_dir)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.workers = workers
+        self.jobs = {}
+        self.queue = None
+        self.pool = None
+        self._restore()
+
+    def job_dir(self, jid):
+        return os.path.join(self.jobs_dir, jid)
+
+    def _restore(self):
+        if not os.path.isdir(self.jobs_dir):
+            return
+        for jid in sorted(os.listdir(self.jobs_dir)):
+            meta = os.path.join(self.job_dir(jid), "job.json")
+            if not os.path.exists(os.path.join(self.job_dir(jid), "result.json")) or not os.path.exists(meta):
+                continue
+            with open(meta) as fh:
+                job = Job(**json.load(fh))
+            job.status = "done"
+            self.jobs[jid] = job
+        if self.jobs:
+            print(f"♻️ {len(self.jobs)} finished jobs available from {self.jobs_dir}")
+
+    def _save_meta(self, job):
+        with open(os.path.join(self.job_dir(job.id), "job.json"), "w") as fh:
+            json.dump(asdict(job), fh)
+
+    # ---- Jobs ----
+    async def submit(self, data, fmt, options):
+        """(job, deduplicated): queue the upload unless an identical job is queued, running or done."""
+        jid = job_id(data, options)
+        job = self.jobs.get(jid)
+        if job is not None and job.status != "failed":
+            return job, True
+        job = Job(jid, f"input.{fmt}", options)
+        # Registered before the first await so an identical upload arriving meanwhile is deduplicated
+        self.jobs[jid] = job
+        folder = self.job_dir(jid)
+
+        def write():
+            os.makedirs(folder, exist_ok=True)
+            for name in ("progress.jsonl", "log.txt", "result.json"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(folder, name))
+            with open(os.path.join(folder, job.input_name), "wb") as fh:
+                fh.write(data)
+            self._save_meta(job)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, write)
+        except OSError as exc:
+            job.status, job.error = "failed", f"{type(exc).__name__}: {exc}"
+            raise
+        await self.queue.put(job)
+        return job, False
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            job.status, job.started = "running", time.time()
+            print(f"🚚 Job {job.id} started")
+            try:
+                await loop.run_in_executor(self.pool, run_job, self.job_dir(job.id), job.input_name,
+                                           job.options, self.cache_dir)
+                job.status = "done"
+            except Exception as exc:
+                job.status, job.error = "failed", f"{type(exc).__name__}: {exc}"
+                with open(os.path.join(self.job_dir(job.id), "log.txt"), "a") as fh:
+                    fh.write(traceback.format_exc())
+            job.finished = time.time()
+            self._save_meta(job)
+            print(f"{'✅' if job.status == 'done' else '❌'} Job {job.id} {job.status} "
+                  f"in {job.finished - job.started:.1f} s" + (f": {job.error}" if job.error else ""))
+            self.queue.task_done()
+
+    def describe(self, job):
+        """Status dict of a job with its latest stage progress."""
+        info = asdict(job)
+        info['position'] = ([j.id for j in self.jobs.values() if j.status == "queued"].index(job.id) + 1
+                            if job.status == "queued" else None)
+        events = self._events(job.id, 0)[0]
+        info['progress'] = events[-1]['done'] / events[-1]['total'] if events else (1.0 if job.status == "done" else 0.0)
+        info['stage'] = events[-1]['stage'] if events else None
+        return info
+
+    def _events(self, jid, offset):
+        """Progress events appended since byte offset, and the new offset."""
+        path = os.path.join(self.job_dir(jid), "progress.jsonl")
+        if not os.path.exists(path):
+            return [], offset
+        with open(path) as fh:
+            fh.seek(offset)
+            lines = fh.readlines()
+        complete = [line for line in lines if line.endswith("\n")]
+        return [json.loads(line) for line in complete], offset + sum(len(line.encode()) for line in complete)
+
+    # ---- HTTP ----
+    async def handle(self, reader, writer):
+        try:
+            request = await _read_request(reader)
+            if request is None:
+                return
+            method, path, query, headers, body = request
+            await self.route(writer, method, path, query, headers, body)
+        except _HTTPError as exc:
+            await _respond(writer, exc.status, {'error': exc.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as exc:
+            await _respond(writer, 500, {'error': f"{type(exc).__name__}: {exc}"})
+        finally:
+            with contextlib.suppress(ConnectionError):
+                writer.close()
+                await writer.wait_closed()
+
+    async def route(self, writer, method, path, query, headers, body):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["health"]:
+            return await _respond(writer, 200, {'status': "ok", 'jobs': len(self.jobs),
+                                                'queued': self.queue.qsize(), 'workers': self.workers})
+        if parts == ["jobs"] and method == "GET":
+            return await _respond(writer, 200, [self.describe(j) for j in self.jobs.values()])
+        if parts == ["jobs"] and method == "POST":
+            fmt = UPLOAD_FORMATS.get(headers.get('content-type', 'text/csv').split(";")[0].strip())
+            if fmt is None:
+                raise _HTTPError(400, f"unsupported content type (send one of {sorted(UPLOAD_FORMATS)})")
+            if not body:
+                raise _HTTPError(400, "empty upload")
+            try:
+                options = parse_options(query)
+            except ValueError as exc:
+                raise _HTTPError(400, str(exc))
+            job, deduplicated = await self.submit(body, fmt, options)
+            return await _respond(writer, 200 if deduplicated else 202,
+                                  {**self.describe(job), 'deduplicated': deduplicated})
+        if len(parts) < 2 or parts[0] != "jobs" or method != "GET":
+            raise _HTTPError(404 if method == "GET" else 405, f"no route for {method} {path}")
+        job = self.jobs.get(parts[1])
+        if job is None:
+            raise _HTTPError(404, f"unknown job '{parts[1]}'")
+        folder = self.job_dir(job.id)
+        if len(parts) == 2:
+            return await _respond(writer, 200, self.describe(job))
+        if parts[2] == "result":
+            if job.status != "done":
+                raise _HTTPError(409, f"job is {job.status}")
+            with open(os.path.join(folder, "result.json"), "rb") as fh:
+                return await _respond(writer, 200, fh.read(), "application/json")
+        if parts[2] == "log":
+            log = os.path.join(folder, "log.txt")
+            data = _read_bytes(log) if os.path.exists(log) else b""
+            return await _respond(writer, 200, data, "text/plain; charset=utf-8")
+        if parts[2] == "events":
+            return await self._stream(writer, job)
+        if parts[2] == "files" and len(parts) > 3:
+            name = "/".join(parts[3:])
+            full = os.path.realpath(os.path.join(folder, name))
+            if not full.startswith(os.path.realpath(folder) + os.sep) or not os.path.isfile(full):
+                raise _HTTPError(404, f"no file '{name}'")
+            data = await asyncio.get_running_loop().run_in_executor(None, _read_bytes, full)
+            return await _respond(writer, 200, data, "application/octet-stream")
+        raise _HTTPError(404, f"no route for {method} {path}")
+
+    async def _stream(self, writer, job):
+        """Server-sent events: one 'stage' event per finished stage, then a final 'status' event."""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        offset = 0
+        while True:
+            finished = job.status in ("done", "failed")
+            events, offset = self._events(job.id, offset)
+            for event in events:
+                writer.write(f"event: stage\ndata: {json.dumps(event)}\n\n".encode())
+            if finished:
+                writer.write(f"event: status\ndata: {json.dumps(self.describe(job))}\n\n".encode())
+                await writer.drain()
+                return
+            await writer.drain()
+            await asyncio.sleep(EVENT_POLL_S)
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        self.queue = asyncio.Queue()
+        with ProcessPoolExecutor(max_workers=self.workers) as self.pool:
+            consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f"🛰️ Routing service on http://{host}:{port} ({self.workers} workers, jobs in {self.jobs_dir})")
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                for task in consumers:
+                    task.cancel()
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status, self.message = status, message
+
+
+def _read_bytes(path):
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+async def _read_request(reader):
+    """(method, path, query, headers, body) of one HTTP/1.1 request, or None on an empty connection."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise _HTTPError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_UPLOAD_BYTES:
+        raise _HTTPError(413, f"upload larger than {MAX_UPLOAD_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    url = urllib.parse.urlsplit(target)
+    return method.upper(), urllib.parse.unquote(url.path), urllib.parse.parse_qs(url.query, keep_blank_values=True), \
+        headers, body
+
+
+async def _respond(writer, status, payload, content_type="application/json"):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload, default=str).encode()
+    writer.write(f"HTTP/1.1 {status} {_STATUS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+
+
+# --------------------------
+# CLIENT HELPERS
+# --------------------------
+def _call(path, url=SERVICE_URL, data=None, content_type=None, timeout=30):
+    request = urllib.request.Request(url.rstrip("/") + path, data=data,
+                                     headers={'Content-Type': content_type} if content_type else {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+    except urllib.error.HTTPError as exc:
+        detail = exc.read().decode(errors="replace")
+        with contextlib.suppress(ValueError):
+            detail = json.loads(detail).get('error', detail)
+        raise RuntimeError(f"❌ Routing service: {exc.code} {detail}") from None
+
+
+def submit_job(data, options=None, url=SERVICE_URL, content_type="text/csv"):
+    """Submit CSV (or Parquet) bytes; returns the job status dict (deduplicated=True for a repeat)."""
+    query = urllib.parse.urlencode({k: v for k, v in (options or {}).items() if v is not None})
+    return json.loads(_call(f"/jobs?{query}", url, data, content_type))
+
+
+def job_status(jid, url=SERVICE_URL):
+    return json.loads(_call(f"/jobs/{jid}", url))
+
+
+def job_result(jid, url=SERVICE_URL):
+    return json.loads(_call(f"/jobs/{jid}/result", url))
+
+
+def job_log(jid, url=SERVICE_URL):
+    return _call(f"/jobs/{jid}/log", url).decode(errors="replace")
+
+
+def fetch_file(jid, name, url=SERVICE_URL):
+    """Bytes of one of a job's files (e.g. 'outputs/final_report.pdf')."""
+    return _call(f"/jobs/{jid}/files/{name}", url, timeout=120)
+
+
+def wait_for_job(jid, url=SERVICE_URL, poll_s=1.0, timeout=None):
+    """Poll until the job is done or failed; returns its final status dict."""
+    started = time.time()
+    while True:
+        status = job_status(jid, url)
+        if status['status'] in ("done", "failed"):
+            return status
+        if timeout is not None and time.time() - started > timeout:
+            raise TimeoutError(f"Job {jid} still {status['status']} after {timeout} s")
+        time.sleep(poll_s)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local routing service: queue point sets, cluster and route "
+                                                 "them in worker processes, poll for results.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="jobs solved at once")
+    parser.add_argument("--jobs-dir", default=JOBS_DIR, help="per-job working directories")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="route/matrix cache shared by all jobs")
+    args = parser.parse_args()
+    service = RoutingService(args.jobs_dir, args.workers, args.cache_dir)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(service.serve(args.host, args.port))
@@ -0,0 +1,230 @@
+# src/scenarios.py
+import argparse
+import contextlib
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from cvrp import Fleet
+from instrumentation import collect, merge, reset as reset_metrics, timer
+from route_optimization import CO2_PER_KM, FUEL_COST_PER_LITER, VEHICLE_MILEAGE, CostModel, route_costs
+from storage import read_table
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+SCENARIO_TABLE_PATH = "outputs/scenario_comparison.csv"
+SCENARIO_CHART_PATH = "outputs/scenario_comparison.html"
+SCENARIO_WORKERS = 1            # clusterings routed in parallel (<= 0 = every core)
+CLUSTER_METHODS = ('auto', 'kmeans', 'geo', 'balanced', 'dbscan')
+# Every scenario is the baseline with some of these overridden. What a parameter affects decides
+# what is recomputed: cost parameters only re-price routed km; fleet size re-routes one clustering;
+# cluster_method / n_clusters re-cluster (and re-route).
+BASELINE = {
+    'mileage_kmpl': VEHICLE_MILEAGE,
+    'fuel_cost_per_liter': FUEL_COST_PER_LITER,
+    'co2_per_km': CO2_PER_KM,
+    'cluster_method': 'auto',   # auto = the pipeline's KMeans -> geography-only -> DBSCAN fallback
+    'n_clusters': None,         # None = chosen by the method (silhouette sweep / capacity / density)
+    'n_vehicles': 0,            # 0 = one loop per cluster; >0 = capacitated trips on that many trucks
+}
+COST_PARAMS = ('mileage_kmpl', 'fuel_cost_per_liter', 'co2_per_km')
+
+
+def scenario_grid(**axes):
+    """
+    Every combination of the given parameter values, e.g.
+    scenario_grid(fuel_cost_per_liter=[90, 100], n_vehicles=[2, 3]); unnamed parameters keep BASELINE.
+    Each scenario is named after the parameters that vary across the grid.
+    """
+    unknown = set(axes) - set(BASELINE)
+    if unknown:
+        raise ValueError(f"❌ Unknown scenario parameters {sorted(unknown)} (expected {sorted(BASELINE)}).")
+    names = list(axes)
+    varying = [name for name in names if len(axes[name]) > 1]
+    scenarios = []
+    for values in itertools.product(*(axes[name] for name in names)):
+        scenario = {**BASELINE, **dict(zip(names, values))}
+        if scenario['cluster_method'] not in CLUSTER_METHODS:
+            raise ValueError(f"❌ Unknown cluster_method '{scenario['cluster_method']}' (expected {CLUSTER_METHODS}).")
+        scenario['scenario'] = " | ".join(f"{name}={scenario[name]}" for name in varying) or "baseline"
+        scenarios.append(scenario)
+    return scenarios
+
+
+def _clustering_key(scenario):
+    """(method, k); k is dropped for methods that choose their own number of clusters."""
+    method = scenario['cluster_method']
+    return method, None if method in ('auto', 'dbscan') else scenario['n_clusters']
+
+
+# --------------------------
+# WORKERS
+# --------------------------
+def cluster_with(points, method, n_clusters=None):
+    """Cluster points with one of CLUSTER_METHODS (nothing is saved or plotted)."""
+    from clustering import balanced_clustering, cluster_points, dbscan_clustering
+    from pipeline import cluster_stage
+
+    if method == 'auto':
+        return cluster_stage(points)[0]
+    if method in ('kmeans', 'geo'):
+        return cluster_points(n_clusters=n_clusters, use_waste=method == 'kmeans', df=points, save=False,
+                              plot=False)[0]
+    if method == 'balanced':
+        return balanced_clustering(n_clusters=n_clusters, df=points, save=False)[0]
+    return dbscan_clustering(df=points, save=False)[0]
+
+
+def _run_clustering(points, key, vehicle_counts, routing, fleet_options):
+    """
+    Pool task: one clustering and its routing for every fleet size, stdout silenced.
+    Fleet sizes run in sequence so the later ones reuse the per-cluster trips cached by the first.
+    Returns (key, {n_vehicles: (summary, seconds, error)}, cluster seconds, worker metrics);
+    a scenario that cannot be planned (e.g. k too small for the capacity) gets its error instead of a summary.
+    """
+    from route_optimization import optimize_routes
+
+    reset_metrics()     # forked workers start with a copy of the parent's metrics
+    routed = {}
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        started = time.perf_counter()
+        try:
+            with timer("scenario.cluster", method=key[0]):
+                clustered = cluster_with(points, *key)
+        except (ValueError, RuntimeError) as exc:
+            return key, {n: (None, 0.0, str(exc)) for n in vehicle_counts}, time.perf_counter() - started, collect()
+        cluster_seconds = time.perf_counter() - started
+        for n_vehicles in vehicle_counts:
+            fleet = Fleet(n_vehicles=n_vehicles, **fleet_options) if n_vehicles else None
+            started = time.perf_counter()
+            try:
+                with timer("scenario.route", vehicles=n_vehicles):
+                    summary = optimize_routes(df=clustered, fleet=fleet, save=False, render=False, workers=1,
+                                              **routing)
+                routed[n_vehicles] = (summary, time.perf_counter() - started, None)
+            except (ValueError, RuntimeError) as exc:
+                routed[n_vehicles] = (None, time.perf_counter() - started, str(exc))
+    return key, routed, cluster_seconds, collect()
+
+
+# --------------------------
+# SWEEP
+# --------------------------
+def run_scenarios(scenarios, points=None, workers=SCENARIO_WORKERS, routing=None, fleet_options=None, save=True,
+                  show=False):
+    """
+    Evaluate scenarios (see scenario_grid) on one point set (default: the simulated_points table).
+    Each distinct clustering is computed once and routed once per fleet size, in a process pool
+    when workers > 1, all sharing the route / matrix cache; cost parameters are applied afterwards
+    to the routed km. routing is passed to optimize_routes and fleet_options to cvrp.Fleet.
+    Returns the comparison table (one row per scenario, cheapest first); save writes it and a chart.
+    """
+    points = read_table("simulated_points") if points is None else points
+    routing = dict(routing or {})
+    fleet_options = dict(fleet_options or {})
+    plan = {}
+    for scenario in scenarios:
+        plan.setdefault(_clustering_key(scenario), set()).add(int(scenario['n_vehicles']))
+    n_routings = sum(len(v) for v in plan.values())
+    print(f"🧪 {len(scenarios)} scenarios → {len(plan)} clusterings, {n_routings} routings on {len(points)} points")
+
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(plan)) or 1
+    tasks = [(points, key, sorted(counts), routing, fleet_options) for key, counts in plan.items()]
+    results = {}
+    with timer("scenario.sweep", scenarios=len(scenarios), workers=workers):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                outputs = list(pool.map(_run_clustering, *zip(*tasks)))
+        else:
+            outputs = [_run_clustering(*task) for task in tasks]
+    for key, routed, cluster_seconds, metrics in outputs:
+        merge(metrics)
+        results[key] = routed
+        print(f"   {key[0]:<9} k={key[1] or 'auto':<5} clustered in {cluster_seconds:.2f} s, "
+              + ", ".join(f"{n or 'loops'}: " + (f"{seconds:.2f} s" if error is None else "failed")
+                          for n, (_, seconds, error) in routed.items()))
+
+    total_waste_t = float(points['waste_kg'].sum()) / 1000 if 'waste_kg' in points.columns else float("nan")
+    rows = []
+    for scenario in scenarios:
+        summary, seconds, error = results[_clustering_key(scenario)][int(scenario['n_vehicles'])]
+        if error is not None:
+            print(f"⚠️ {scenario['scenario']}: {error}")
+            rows.append({**{k: v for k, v in scenario.items() if k != 'scenario'}, 'scenario': scenario['scenario'],
+                         'error': error})
+            continue
+        km = float(summary['distance_km'].sum())
+        fuel, cost, co2 = route_costs(km, CostModel(**{p: scenario[p] for p in COST_PARAMS}))
+        rows.append({
+            **{k: v for k, v in scenario.items() if k != 'scenario'},
+            'scenario': scenario['scenario'],
+            'clusters': len(summary),
+            'trips': int(summary['trips'].sum()) if 'trips' in summary.columns else len(summary),
+            'distance_km': round(km, 2),
+            'fuel_liters': round(fuel, 2),
+            'cost_rs': round(cost, 0),
+            'co2_kg': round(co2, 1),
+            'cost_per_tonne_rs': round(cost / total_waste_t, 1) if total_waste_t else float("nan"),
+            'route_seconds': round(seconds, 2),
+        })
+    table = pd.DataFrame(rows).sort_values(['cost_rs', 'distance_km']).reset_index(drop=True)
+    table.insert(0, 'scenario', table.pop('scenario'))
+    if 'error' in table.columns:
+        table = table.astype({'clusters': 'Int64', 'trips': 'Int64'})
+
+    print("\n📊 Scenario comparison (cheapest first)")
+    print(table[['scenario', 'clusters', 'trips', 'distance_km', 'cost_rs', 'co2_kg']].to_string(index=False))
+    if save:
+        os.makedirs(os.path.dirname(SCENARIO_TABLE_PATH), exist_ok=True)
+        table.to_csv(SCENARIO_TABLE_PATH, index=False)
+        plot_scenarios(table, show=show).write_html(SCENARIO_CHART_PATH)
+        print(f"📁 Saved scenario comparison to {SCENARIO_TABLE_PATH} and {SCENARIO_CHART_PATH}")
+    return table
+
+
+def plot_scenarios(table, show=False):
+    """Grouped bars of cost, distance and CO₂ per scenario."""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for column, name, color in (("cost_rs", "Cost (₹)", "green"), ("distance_km", "Distance (km)", "royalblue"),
+                                ("co2_kg", "CO₂ (kg)", "red")):
+        fig.add_trace(go.Bar(x=table["scenario"], y=table[column], name=name, marker_color=color))
+    fig.update_layout(
+        title="🧪 Scenario Comparison",
+        xaxis_title="Scenario",
+        yaxis_title="Value",
+        barmode="group",
+        template="plotly_white"
+    )
+    if show:
+        fig.show()
+    return fig
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare fleet, clustering and cost scenarios on one point set.")
+    parser.add_argument("--points", help="bins to plan for (default: the simulated_points table)")
+    parser.add_argument("--mileage", type=float, nargs="+", default=[VEHICLE_MILEAGE], help="truck km per litre")
+    parser.add_argument("--fuel-cost", type=float, nargs="+", default=[FUEL_COST_PER_LITER], help="₹ per litre")
+    parser.add_argument("--co2", type=float, nargs="+", default=[CO2_PER_KM], help="kg CO₂ per km")
+    parser.add_argument("--method", nargs="+", choices=CLUSTER_METHODS, default=['auto'], help="clustering method")
+    parser.add_argument("--clusters", type=int, nargs="+", default=[0],
+                        help="number of clusters (0 = chosen by the method)")
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[0],
+                        help="fleet sizes for capacitated routing (0 = one loop per cluster)")
+    parser.add_argument("--capacity", type=float, default=Fleet.capacity_kg, help="truck capacity in kg")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds of local search per cluster")
+    parser.add_argument("--workers", type=int, default=SCENARIO_WORKERS, help="clusterings routed in parallel")
+    parser.add_argument("--show", action="store_true", help="open the comparison chart")
+    args = parser.parse_args()
+    grid = scenario_grid(mileage_kmpl=args.mileage, fuel_cost_per_liter=args.fuel_cost, co2_per_km=args.co2,
+                         cluster_method=args.method, n_clusters=[k or None for k in args.clusters],
+                         n_vehicles=args.vehicles)
+    routing = {'time_limit': args.time_limit} if args.time_limit is not None else {}
+    run_scenarios(grid, points=read_table(args.points) if args.points else None, workers=args.workers,
+                  routing=routing, fleet_options={'capacity_kg': args.capacity}, show=args.show)
@@ -0,0 +1,204 @@
+# src/storage.py
+import argparse
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:         # pragma: no cover - CSV-only install
+    pa = None
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+DATA_DIR = "data"
+STORAGE_FORMAT = "parquet" if pa is not None else "csv"     # parquet | feather | csv
+EXPORT_CSV = False              # also write a .csv copy of every table (for spreadsheets / the dashboard upload)
+SCHEMA = {
+    'id': np.int32,
+    'latitude': np.float64,
+    'longitude': np.float64,
+    'waste_kg': np.float32,
+    'cluster': np.int32,        # hierarchical runs give ~1 label per 150 bins
+    'tw_start': np.float32,     # optional service window, minutes since midnight (NaN = any time)
+    'tw_end': np.float32,
+    'service_min': np.float32,  # optional minutes spent at the bin
+}
+EXTENSIONS = {'parquet': '.parquet', 'feather': '.feather', 'csv': '.csv'}
+
+
+def _fits(values, dtype):
+    """True if a column converts to dtype without failing or wrapping (integers must be whole and in range)."""
+    if not pd.api.types.is_numeric_dtype(values):
+        return False        # e.g. string sensor ids stay as they are
+    if not np.issubdtype(dtype, np.integer) or np.can_cast(values.dtype, dtype):
+        return True
+    arr = values.to_numpy()
+    if not len(arr):
+        return True
+    if np.issubdtype(arr.dtype, np.floating) and not np.all(np.isfinite(arr) & (arr == np.round(arr))):
+        return False
+    info = np.iinfo(dtype)
+    return bool(info.min <= arr.min() and arr.max() <= info.max)
+
+
+def apply_schema(df):
+    """
+    Cast the known columns to their storage dtypes (other columns are left alone).
+    A column whose values do not fit its SCHEMA dtype (non-numeric, fractional or out of
+    range for an integer type) keeps its own dtype rather than being cast lossily.
+    """
+    casts = {c: t for c, t in SCHEMA.items() if c in df.columns and df[c].dtype != t and _fits(df[c], t)}
+    return df.astype(casts) if casts else df
+
+
+def csv_dtypes(columns=None):
+    """read_csv dtypes for the known float columns; integer columns are checked by apply_schema instead."""
+    return {c: t for c, t in SCHEMA.items() if np.issubdtype(t, np.floating) and (columns is None or c in columns)}
+
+
+def table_path(name, fmt=None, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f"{name}{EXTENSIONS[fmt or STORAGE_FORMAT]}")
+
+
+def _locate(name, data_dir):
+    """(path, format) of a table: an explicit file path, else data_dir/name as a dataset, parquet, feather or csv."""
+    if os.path.isfile(name):
+        ext = os.path.splitext(name)[1].lower()
+        fmt = next((f for f, e in EXTENSIONS.items() if e == ext), None)
+        if fmt is None:
+            raise ValueError(f"❌ Unsupported table format: {name}")
+        return name, fmt
+    base = os.path.join(data_dir, name)
+    if os.path.isdir(base):
+        return base, 'dataset'
+    for fmt in ('parquet', 'feather', 'csv'):
+        path = base + EXTENSIONS[fmt]
+        if os.path.exists(path):
+            return path, fmt
+    raise FileNotFoundError(f"❌ No table '{name}' in {data_dir}/ (looked for a dataset, .parquet, .feather, .csv).")
+
+
+def table_exists(name, data_dir=DATA_DIR):
+    try:
+        _locate(name, data_dir)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def read_table(name, columns=None, clusters=None, memory_map=True, data_dir=DATA_DIR):
+    """
+    Load a table by name (data/<name>.parquet|.feather|.csv, or a cluster-partitioned
+    data/<name>/ dataset) or by file path. columns projects, clusters keeps only those
+    cluster labels (pushed down to the file for Parquet), memory_map maps Arrow
+    files instead of reading them. Known columns come back with SCHEMA dtypes.
+    """
+    path, fmt = _locate(name, data_dir)
+    wanted = None if columns is None else list(columns)
+    # Filtering needs the cluster column even when it is not projected
+    read_cols = wanted if wanted is None or clusters is None or 'cluster' in wanted else wanted + ['cluster']
+    filters = None if clusters is None else [('cluster', 'in', [int(c) for c in np.atleast_1d(clusters)])]
+
+    if fmt == 'dataset':
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        expr = None if clusters is None else ds.field('cluster').isin(filters[0][2])
+        df = dataset.to_table(columns=read_cols, filter=expr).to_pandas()
+    elif fmt == 'parquet':
+        df = pq.read_table(path, columns=read_cols, filters=filters, memory_map=memory_map).to_pandas()
+    elif fmt == 'feather':
+        df = feather.read_table(path, columns=read_cols, memory_map=memory_map).to_pandas()
+    else:
+        df = pd.read_csv(path, usecols=read_cols, dtype=csv_dtypes(read_cols))
+
+    if clusters is not None and fmt in ('feather', 'csv'):
+        df = df[df['cluster'].isin(filters[0][2])].reset_index(drop=True)
+    if wanted is not None:
+        df = df[wanted]
+    return apply_schema(df)
+
+
+def write_table(df, name, fmt=None, partition_by=None, export_csv=EXPORT_CSV, data_dir=DATA_DIR):
+    """
+    Store df under data_dir in fmt (default STORAGE_FORMAT) with SCHEMA dtypes.
+    partition_by='cluster' writes a hive-partitioned Parquet dataset data/<name>/cluster=<k>/
+    so a stage can read one cluster only. export_csv also writes data/<name>.csv.
+    Other columnar copies of the table are removed. Returns the path written.
+    """
+    fmt = fmt or STORAGE_FORMAT
+    os.makedirs(data_dir, exist_ok=True)
+    df = apply_schema(df)
+    base = os.path.join(data_dir, name)
+    # Drop other columnar copies so readers never pick up a stale one (CSV exports are left in place)
+    for f, ext in EXTENSIONS.items():
+        if f != 'csv' and (f != fmt or partition_by) and os.path.exists(base + ext):
+            os.remove(base + ext)
+    if os.path.isdir(base):
+        shutil.rmtree(base)
+
+    if partition_by:
+        if pa is None:
+            raise ImportError("❌ Partitioned tables need pyarrow (pip install pyarrow).")
+        pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=False), base, partition_cols=[partition_by])
+        path = base
+    else:
+        path = base + EXTENSIONS[fmt]
+        if fmt == 'parquet':
+            df.to_parquet(path, index=False)
+        elif fmt == 'feather':
+            df.reset_index(drop=True).to_feather(path)
+        else:
+            df.to_csv(path, index=False)
+    if export_csv and fmt != 'csv':
+        df.to_csv(base + '.csv', index=False)
+    return path
+
+
+def replace_clusters(rows, name, clusters, data_dir=DATA_DIR):
+    """
+    Replace every row of the given cluster labels in table name with rows (which hold
+    only those clusters). A cluster-partitioned dataset rewrites just those partitions;
+    a single-file table is read, patched and written back in its own format.
+    Returns the path written.
+    """
+    clusters = {int(c) for c in np.atleast_1d(list(clusters))}
+    path, fmt = _locate(name, data_dir)
+    if fmt != 'dataset':
+        rest = read_table(path)
+        rest = rest[~rest['cluster'].isin(clusters)]
+        return write_table(pd.concat([rest, rows], ignore_index=True), name, fmt=fmt, data_dir=data_dir)
+    for c in clusters:
+        part = os.path.join(path, f"cluster={c}")
+        if os.path.isdir(part):
+            shutil.rmtree(part)
+    if len(rows):
+        pq.write_to_dataset(pa.Table.from_pandas(apply_schema(rows), preserve_index=False), path,
+                            partition_cols=['cluster'])
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert tables between CSV (import/export) and Parquet/Feather.")
+    parser.add_argument("action", choices=["import", "export"],
+                        help="import: CSV -> columnar table; export: table -> CSV")
+    parser.add_argument("source", help="CSV file (import) or table name / path (export)")
+    parser.add_argument("--name", help="table name to import into (default: the CSV's base name)")
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default=STORAGE_FORMAT)
+    parser.add_argument("--partition-by", default=None, help="e.g. cluster, for per-cluster reads")
+    parser.add_argument("--output", help="CSV path for export (default: data/<name>.csv)")
+    args = parser.parse_args()
+    if args.action == "import":
+        name = args.name or os.path.splitext(os.path.basename(args.source))[0]
+        df = read_table(args.source)
+        path = write_table(df, name, fmt=args.format, partition_by=args.partition_by, export_csv=False)
+        print(f"📦 Imported {len(df)} rows from {args.source} into {path}")
+    else:
+        df = read_table(args.source)
+        output = args.output or table_path(os.path.splitext(os.path.basename(args.source))[0], 'csv')
+        df.to_csv(output, index=False)
+        print(f"📤 Exported {len(df)} rows to {output}")
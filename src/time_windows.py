@@ -0,0 +1,449 @@
+# src/time_windows.py
+import time
+from dataclasses import dataclass
+import numpy as np
+from instrumentation import count, record_span
+from local_search import EPS, MAX_SEGMENT, TIME_LIMIT, neighbour_lists
+
+# --------------------------
+# CONFIGURATION CONSTANTS
+# --------------------------
+# Times are minutes since midnight; a bin without a window can be served any time in the shift
+WINDOW_COLUMNS = ['tw_start', 'tw_end', 'service_min']
+SHIFT_START_MIN = 5 * 60        # trucks leave at 05:00 ...
+SHIFT_END_MIN = 14 * 60         # ... and must be back by 14:00
+SERVICE_MIN = 2.0               # minutes per bin when service_min is missing
+DUMP_SERVICE_MIN = 15.0         # minutes to unload at a dump site
+AVERAGE_SPEED_KMH = 25.0        # urban collection speed
+ROAD_CIRCUITY = 1.3             # road km per straight-line km
+LATE_PENALTY_KM = 10.0          # route km one minute of lateness is worth during local search
+MAX_REPAIR_SPAN = 30            # stops a move may rearrange while the route is still late
+
+
+@dataclass(frozen=True)
+class SpeedModel:
+    """Travel time from matrix distances: straight-line km x circuity at an average speed."""
+    speed_kmh: float = AVERAGE_SPEED_KMH
+    circuity: float = ROAD_CIRCUITY
+
+    def travel_minutes(self, dist_km):
+        return np.asarray(dist_km, dtype=np.float64) * (self.circuity / self.speed_kmh * 60.0)
+
+
+def has_windows(df):
+    """True when df carries any time-window or service-time data."""
+    return any(c in df.columns and df[c].notna().any() for c in WINDOW_COLUMNS)
+
+
+def window_arrays(df):
+    """(tw_start, tw_end, service_min) float64 arrays; missing columns come back as NaN."""
+    n = len(df)
+    return tuple(df[c].to_numpy(dtype=np.float64) if c in df.columns else np.full(n, np.nan)
+                 for c in WINDOW_COLUMNS)
+
+
+def node_windows(windows, n, n_nodes, has_depot=False, shift=(SHIFT_START_MIN, SHIFT_END_MIN)):
+    """
+    Earliest / latest service start and service minutes for every matrix node:
+    bins from `windows` (NaN = open within the shift / SERVICE_MIN), then the
+    depot (shift window, no service) and dump sites (shift window, DUMP_SERVICE_MIN).
+    """
+    e = np.full(n_nodes, float(shift[0]))
+    l = np.full(n_nodes, float(shift[1]))
+    s = np.zeros(n_nodes)
+    if windows is not None:
+        tw_start, tw_end, service = (np.asarray(w, dtype=np.float64) for w in windows)
+        e[:n] = np.where(np.isnan(tw_start), shift[0], tw_start)
+        l[:n] = np.where(np.isnan(tw_end), shift[1], tw_end)
+        s[:n] = np.where(np.isnan(service), SERVICE_MIN, service)
+    else:
+        s[:n] = SERVICE_MIN
+    s[n + has_depot:] = DUMP_SERVICE_MIN
+    return e, l, s
+
+
+def binding(e, l, shift=(SHIFT_START_MIN, SHIFT_END_MIN)):
+    """Whether any window is narrower than the shift (otherwise plain routing is already feasible)."""
+    return bool((e > shift[0]).any() or (l < shift[1]).any())
+
+
+def format_clock(minutes):
+    minutes = int(round(minutes))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+# --------------------------
+# SEQUENCE SUMMARIES
+# --------------------------
+# A stop sequence is summarised as (duration, time warp, earliest start, latest start):
+# duration includes travel, service and waiting; time warp is the total lateness the
+# sequence forces; any start in [earliest, latest] achieves both. Two summaries combine
+# in O(1), so forward (prefix) and backward (suffix) arrays give the cost of a changed
+# route from the few nodes between them (Vidal et al., 2013).
+def _concat(a, b, travel):
+    d1, tw1, e1, l1 = a
+    d2, tw2, e2, l2 = b
+    delta = d1 - tw1 + travel
+    wait = max(e2 - delta - l1, 0.0)
+    warp = max(e1 + delta - l2, 0.0)
+    return (d1 + d2 + travel + wait, tw1 + tw2 + warp, max(e2 - delta, e1) - wait, min(l2 - delta, l1) + warp)
+
+
+class _TimedRoute:
+    """
+    Linear route r = [start, ..., start] with forward / backward summaries.
+    Only stops whose window is narrower than the shift get a summary of their own:
+    a run of open stops between them is summarised in O(1) from cumulative service
+    and travel minutes, and summaries are cached at the binding positions only.
+    Moves keep the route length, so replacing positions lo..hi leaves the cached
+    prefixes before lo and suffixes after hi intact; the rest are rebuilt lazily,
+    only as far as the next query needs them. Travel times are assumed symmetric,
+    as in the 2-opt distance deltas.
+    """
+
+    def __init__(self, route, T, e, l, s, shift):
+        self.T, self.e, self.l, self.s = T, e, l, s
+        self.shift = (float(shift[0]), float(shift[1]))
+        self.open = (e <= shift[0]) & (l >= shift[1])
+        r = self.r = np.asarray(route, dtype=np.int64).copy()
+        k = len(r)
+        self.rl = r.tolist()
+        self.pos = np.empty(int(r.max()) + 1, dtype=np.int64)
+        self.pos[r[:-1]] = np.arange(k - 1)
+        # Per position: service, travel to the next stop and whether the stop is open;
+        # the last position is the return to base (no service, shift window)
+        self.svc = np.append(s[r[:-1]], 0.0).astype(np.float64)
+        self.trv = np.append(T[r[:-1], r[1:]], 0.0).astype(np.float64)
+        self.openp = np.append(self.open[r[:-1]], True)
+        self._sums()
+        self.bind = np.flatnonzero(~self.openp)
+        m = len(self.bind)
+        self.fwd, self.bwd = [None] * m, [None] * m
+        self.fwd_ok, self.bwd_ok = 0, m         # fwd[:fwd_ok] and bwd[bwd_ok:] are current
+        self.warp = self.suffix(0)[1]
+
+    def _sums(self):
+        self.cs = np.concatenate([[0.0], np.cumsum(self.svc)])
+        self.ct = np.concatenate([[0.0], np.cumsum(self.trv)])
+
+    def node(self, v):
+        return (float(self.s[v]), 0.0, float(self.e[v]), float(self.l[v]))
+
+    def _run(self, x, y):
+        """Summary of the open stops at positions x..y, visited in that order (x > y = reversed)."""
+        cs, ct = self.cs, self.ct
+        if x <= y:
+            inner = cs[y] - cs[x] + ct[y] - ct[x]
+        else:
+            inner = cs[x + 1] - cs[y + 1] + ct[x] - ct[y]
+        inner = float(inner)            # first service start -> last service start
+        start, end = self.shift
+        return (inner + float(self.svc[y]), max(start + inner - end, 0.0), start, max(end - inner, start))
+
+    def _walk(self, acc, prev, a, b, budget=np.inf):
+        """
+        Extend summary acc (ending at node prev; None = empty) by positions a..b
+        visited in that order. Returns (summary, last node), or (None, None) once
+        the time warp exceeds budget.
+        """
+        step = 1 if a <= b else -1
+        bind = self.bind
+        inside = bind[np.searchsorted(bind, min(a, b)):np.searchsorted(bind, max(a, b), side='right')].tolist()
+        if step < 0:
+            inside.reverse()
+        T, rl, cur = self.T, self.rl, a
+        for q in inside + [None]:
+            stop = b if q is None else q - step
+            parts = [(self._run(cur, stop), cur, stop)] if (stop - cur) * step >= 0 else []
+            if q is not None:
+                parts.append((self.node(rl[q]), q, q))
+            for summary, first, last in parts:
+                acc = summary if acc is None else _concat(acc, summary, float(T[prev, rl[first]]))
+                prev = rl[last]
+                if acc[1] > budget:
+                    return None, None
+            if q is None:
+                break
+            cur = q + step
+        return acc, prev
+
+    def prefix(self, p):
+        """Summary of r[0..p]."""
+        bind, fwd, rl = self.bind, self.fwd, self.rl
+        j = int(np.searchsorted(bind, p, side='right')) - 1
+        if j < 0:
+            return self._run(0, p)
+        for i in range(self.fwd_ok, j + 1):
+            if i == 0:
+                fwd[0] = self._walk(None, None, 0, int(bind[0]))[0]
+            else:
+                fwd[i] = self._walk(fwd[i - 1], rl[bind[i - 1]], int(bind[i - 1]) + 1, int(bind[i]))[0]
+        self.fwd_ok = max(self.fwd_ok, j + 1)
+        q = int(bind[j])
+        return fwd[j] if q == p else self._walk(fwd[j], rl[q], q + 1, p)[0]
+
+    def suffix(self, p):
+        """Summary of r[p..] including the return to base."""
+        bind, bwd, rl = self.bind, self.bwd, self.rl
+        k, m = len(rl), len(bind)
+        j = int(np.searchsorted(bind, p))
+        if j == m:
+            return self._run(p, k - 1)
+        for i in range(self.bwd_ok - 1, j - 1, -1):
+            q = int(bind[i])
+            if i == m - 1:
+                bwd[i] = self._walk(None, None, q, k - 1)[0]
+            else:
+                nxt = int(bind[i + 1])
+                head, last = self._walk(None, None, q, nxt - 1)
+                bwd[i] = _concat(head, bwd[i + 1], float(self.T[last, rl[nxt]]))
+        self.bwd_ok = min(self.bwd_ok, j)
+        q = int(bind[j])
+        if q == p:
+            return bwd[j]
+        return _concat(self._run(p, q - 1), bwd[j], float(self.trv[q - 1]))
+
+    def nodes(self, pieces):
+        """Stops of the position pieces [(a, b), ...] (a > b = reversed) in visiting order."""
+        r = self.r
+        return np.concatenate([r[a:b + 1] if a <= b else r[b:a + 1][::-1] for a, b in pieces])
+
+    def replace(self, lo, hi, pieces, warp):
+        """Set r[lo..hi] := the stops of pieces (same length), whose route time warp is `warp`."""
+        mid = self.nodes(pieces)
+        r = self.r
+        r[lo:hi + 1] = mid
+        self.rl[lo:hi + 1] = mid.tolist()
+        self.pos[mid] = np.arange(lo, hi + 1)
+        self.svc[lo:hi + 1] = self.s[mid]
+        self.trv[lo - 1:hi + 1] = self.T[r[lo - 1:hi + 1], r[lo:hi + 2]]
+        self.openp[lo:hi + 1] = self.open[mid]
+        self._sums()
+        # The span holds the same stops, so binding positions outside it keep their index
+        self.fwd_ok = min(self.fwd_ok, int(np.searchsorted(self.bind, lo)))
+        self.bwd_ok = max(self.bwd_ok, int(np.searchsorted(self.bind, hi, side='right')))
+        self.bind = np.flatnonzero(~self.openp)
+        self.warp = warp
+
+    def warp_with(self, lo, hi, pieces, budget):
+        """
+        Time warp of the route with positions lo..hi replaced by the position pieces,
+        or None as soon as it provably exceeds budget (time warp only accumulates).
+        """
+        tail = self.suffix(hi + 1)
+        acc, prev = self.prefix(lo - 1), self.rl[lo - 1]
+        for a, b in pieces:
+            acc, prev = self._walk(acc, prev, a, b, budget - tail[1])
+            if acc is None:
+                return None
+        warp = _concat(acc, tail, float(self.T[prev, self.rl[hi + 1]]))[1]
+        return None if warp > budget else warp
+
+
+# --------------------------
+# CONSTRUCTION & LOCAL SEARCH
+# --------------------------
+def time_oriented_tour(T, e, l, s, start, nodes, weights=(0.4, 0.4, 0.2)):
+    """
+    Time-oriented nearest neighbour (Solomon, 1987): from the current stop go to the
+    reachable stop minimising travel, time until its service can start and urgency
+    (how close arrival is to its window closing). Once no stop can be reached in
+    time the rest of the tour is plain nearest neighbour.
+    Returns an open tour starting at `start`.
+    """
+    w_travel, w_wait, w_urgency = weights
+    remaining = np.asarray([v for v in nodes if v != start], dtype=np.int64)
+    tour = [int(start)]
+    cur, now = int(start), float(e[start]) + float(s[start])
+    while len(remaining):
+        travel = T[cur, remaining]
+        arrival = now + travel
+        begin = np.maximum(arrival, e[remaining])
+        feasible = arrival <= l[remaining]
+        if feasible.any():
+            score = w_travel * travel + w_wait * (begin - now) + w_urgency * (l[remaining] - arrival)
+            k = int(np.argmin(np.where(feasible, score, np.inf)))
+        else:
+            k = int(np.argmin(travel))      # already late everywhere: plain nearest neighbour
+        cur = int(remaining[k])
+        now = float(begin[k]) + float(s[cur])
+        tour.append(cur)
+        remaining = np.delete(remaining, k)
+    return np.asarray(tour, dtype=np.int64)
+
+
+def improve_timed_tour(tour, dist, T, e, l, s, shift=(SHIFT_START_MIN, SHIFT_END_MIN), neighbours=None,
+                       or3opt=False, late_penalty=LATE_PENALTY_KM, time_limit=TIME_LIMIT, max_iterations=None):
+    """
+    2-opt + Or-opt for an open tour (closed back to tour[0]) with time windows.
+    A move is kept when km + late_penalty x lateness minutes drops. Distance deltas
+    are O(1); the timing check only walks the windowed stops between the forward and
+    backward summaries (open stretches are summarised in O(1)) and stops as soon as the
+    move cannot pay off, so on a feasible route candidates are pruned by distance
+    exactly as in local_search.improve_tour.
+    While the route is late, moves are limited to MAX_REPAIR_SPAN stops.
+    Returns (tour, stats) like improve_tour, plus 'late_min'.
+    """
+    route = _TimedRoute(np.append(tour, tour[:1]), T, e, l, s, shift)
+    n = len(tour)
+
+    def length():
+        r = route.r
+        return float(dist[r[:-1], r[1:]].astype(np.float64).sum())
+
+    initial = length()
+    stats = {'initial_km': initial, 'final_km': initial, 'improvement_pct': 0.0,
+             'moves_2opt': 0, 'moves_oropt': 0, 'elapsed_s': 0.0, 'late_min': route.warp}
+    began = time.perf_counter()
+    if n >= 4:
+        if neighbours is None:
+            neighbours = neighbour_lists(dist)
+        nbrs = neighbours.tolist()
+
+        def d(a, b):
+            return float(dist[a, b])
+
+        def accept(lo, hi, pieces, delta_km):
+            """Apply r[lo..hi] := the position pieces [(a, b), ...] if km + penalty x lateness drops."""
+            budget = route.warp + (-delta_km - EPS) / late_penalty
+            if budget < 0 or (route.warp > EPS and hi - lo >= MAX_REPAIR_SPAN):
+                return False
+            warp = route.warp_with(lo, hi, pieces, budget)
+            if warp is None or delta_km + late_penalty * (warp - route.warp) >= -EPS:
+                return False
+            route.replace(lo, hi, pieces, warp)
+            return True
+
+        def try_2opt(a):
+            r, pos, k = route.r, route.pos, len(route.r) - 1
+            pa = int(pos[a])
+            prune = route.warp <= EPS
+            worst = max(d(a, int(r[pa + 1])), d(a, int(r[pa - 1])) if pa > 0 else 0.0)
+            for c in nbrs[a]:
+                if prune and d(a, c) >= worst:
+                    break
+                pc = int(pos[c])
+                lo_node, hi_node = (a, c) if pa < pc else (c, a)
+                pl, ph = min(pa, pc), max(pa, pc)
+                # Reverse r[pl+1..ph] (new edges (lo, hi) and (r[pl+1], r[ph+1])) or r[pl..ph-1]
+                for i, j in ((pl + 1, ph), (pl, ph - 1)):
+                    if i < 1 or j > k - 1 or j - i < 1:
+                        continue
+                    delta = (d(int(r[i - 1]), int(r[j])) + d(int(r[i]), int(r[j + 1]))
+                             - d(int(r[i - 1]), int(r[i])) - d(int(r[j]), int(r[j + 1])))
+                    if prune and delta >= -EPS:
+                        continue
+                    if accept(i, j, [(j, i)], delta):
+                        return {lo_node, hi_node, int(r[i]), int(r[j])}
+            return None
+
+        def try_or_opt(a):
+            r, pos, k = route.r, route.pos, len(route.r) - 1
+            i = int(pos[a])
+            if i < 1:
+                return None
+            prune = route.warp <= EPS
+            for seg_len in range(1, MAX_SEGMENT + 1):
+                if i + seg_len > k or seg_len + 2 >= n:
+                    break
+                seg = r[i:i + seg_len].tolist()
+                p, q = int(r[i - 1]), int(r[i + seg_len])
+                removal_gain = d(p, seg[0]) + d(seg[-1], q) - d(p, q)
+                if prune and removal_gain <= EPS:
+                    continue
+                for end in dict.fromkeys((seg[0], seg[-1])):
+                    for c in nbrs[end]:
+                        if prune and d(c, end) >= removal_gain:
+                            break
+                        if c in seg:
+                            continue
+                        pc = int(pos[c])
+                        # Insert after position `after`, with `end` next to c
+                        for after in (pc, pc - 1):
+                            if after < 0 or after >= k or i - 1 <= after <= i + seg_len - 1:
+                                continue
+                            forward = after == pc
+                            reverse = (end == seg[0]) != forward and seg_len > 1
+                            if reverse and not or3opt:
+                                continue
+                            moved = seg[::-1] if reverse else seg
+                            piece = (i + seg_len - 1, i) if reverse else (i, i + seg_len - 1)
+                            left, right = int(r[after]), int(r[after + 1])
+                            delta = d(left, moved[0]) + d(moved[-1], right) - d(left, right) - removal_gain
+                            if prune and delta >= -EPS:
+                                continue
+                            if after < i:
+                                lo, hi, pieces = after + 1, i + seg_len - 1, [piece, (after + 1, i - 1)]
+                            else:
+                                lo, hi, pieces = i, after, [(i + seg_len, after), piece]
+                            if accept(lo, hi, pieces, delta):
+                                return {p, q, left, right, *seg}
+            return None
+
+        queue = list(dict.fromkeys(int(v) for v in route.r[:-1]))
+        active = set(queue)
+        head = 0
+        while head < len(queue):
+            if max_iterations is not None and stats['moves_2opt'] + stats['moves_oropt'] >= max_iterations:
+                break
+            if time_limit is not None and time.perf_counter() - began > time_limit:
+                break
+            a = queue[head]
+            head += 1
+            active.discard(a)
+            touched = try_2opt(a)
+            if touched is not None:
+                stats['moves_2opt'] += 1
+            else:
+                touched = try_or_opt(a)
+                if touched is None:
+                    continue
+                stats['moves_oropt'] += 1
+            for v in touched | {a}:
+                if v not in active:
+                    active.add(v)
+                    queue.append(v)
+
+    final = length()
+    stats.update(final_km=final, late_min=route.suffix(0)[1], elapsed_s=time.perf_counter() - began,
+                 improvement_pct=(initial - final) / initial * 100 if initial > 0 else 0.0)
+    count("tour.moves_2opt", stats['moves_2opt'])
+    count("tour.moves_oropt", stats['moves_oropt'])
+    record_span("time_windows.improve_timed_tour", began, time.perf_counter(), {'stops': n})
+    return route.r[:-1].copy(), stats
+
+
+# --------------------------
+# SCHEDULE
+# --------------------------
+def schedule(order, T, e, l, s, shift=(SHIFT_START_MIN, SHIFT_END_MIN)):
+    """
+    Clock times along a closed order (last entry = return to base). The truck leaves
+    as late as possible without adding waiting or lateness; it waits when early and
+    is late (serves on arrival) when a window has closed.
+    Returns a dict of per-stop arrays (arrival, start, departure, wait, late) plus totals.
+    """
+    order = [int(v) for v in order]
+    summary = (float(s[order[0]]), 0.0, float(e[order[0]]), float(l[order[0]]))
+    for prev, v in zip(order, order[1:-1]):
+        summary = _concat(summary, (float(s[v]), 0.0, float(e[v]), float(l[v])), float(T[prev, v]))
+    depart_at = min(max(summary[2], float(e[order[0]])), float(l[order[0]]))
+
+    k = len(order)
+    arrival, begin, leave = np.empty(k), np.empty(k), np.empty(k)
+    arrival[0] = begin[0] = depart_at
+    leave[0] = depart_at + float(s[order[0]])
+    for p in range(1, k):
+        arrival[p] = leave[p - 1] + float(T[order[p - 1], order[p]])
+        last = p == k - 1
+        begin[p] = arrival[p] if last else max(arrival[p], float(e[order[p]]))
+        leave[p] = begin[p] + (0.0 if last else float(s[order[p]]))
+    windows_end = l[order].astype(np.float64)
+    windows_end[-1] = shift[1]
+    late = np.maximum(begin - windows_end, 0.0)
+    return {
+        'arrival_min': arrival, 'start_min': begin, 'departure_min': leave,
+        'wait_min': begin - arrival, 'late_min': late,
+        'late_stops': int((late[1:] > EPS).sum()), 'total_late_min': float(late.sum()),
+        'total_wait_min': float((begin - arrival).sum()), 'duration_min': float(arrival[-1] - arrival[0]),
+    }
@@ -0,0 +1,35 @@
+# tests/conftest.py
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The project's modules live flat in src/ and import each other by name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+DEPOT = (30.35, 78.05)
+DUMP_SITES = [(30.32, 78.02)]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory: every module reads and writes data/ and outputs/ relative to it."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "outputs").mkdir()
+    return tmp_path
+
+
+def make_points(n=240, seed=0, windows=False):
+    """n bins in a 0.1° square, split into three vertical strips as clusters 0..2."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'id': np.arange(n), 'latitude': 30.3 + rng.random(n) * 0.1,
+                       'longitude': 78.0 + rng.random(n) * 0.1, 'waste_kg': rng.random(n) * 50})
+    df['cluster'] = np.digitize(df['longitude'], [78.033, 78.066])
+    if windows:
+        every = np.arange(n) % 10 == 0
+        df['tw_start'] = np.where(every, 420.0, np.nan)
+        df['tw_end'] = np.where(every, 600.0, np.nan)
+        df['service_min'] = np.nan
+    return df
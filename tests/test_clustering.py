@@ -0,0 +1,54 @@
+# tests/test_clustering.py
+import os
+import joblib
+from conftest import make_points
+from clustering import MODEL_PATH, balanced_clustering, cluster_points, dbscan_clustering
+from pipeline import build_pipeline
+
+
+def _snapshot(folder="data"):
+    """{path: (size, mtime)} of every file under folder."""
+    return {os.path.join(root, f): (os.stat(os.path.join(root, f)).st_size,
+                                    os.stat(os.path.join(root, f)).st_mtime_ns)
+            for root, _, files in os.walk(folder) for f in files}
+
+
+def test_save_false_leaves_data_untouched(workdir):
+    points = make_points().drop(columns='cluster')
+    joblib.dump({'marker': True}, MODEL_PATH)
+    before = _snapshot()
+    cluster_points(n_clusters=3, df=points, save=False, plot=False)
+    cluster_points(k_min=2, k_max=4, df=points, save=False, plot=False)
+    balanced_clustering(df=points, save=False)
+    dbscan_clustering(df=points, save=False)
+    assert _snapshot() == before
+    assert joblib.load(MODEL_PATH) == {'marker': True}
+
+
+def test_save_true_keeps_model_in_step_with_labels(workdir):
+    points = make_points().drop(columns='cluster')
+    clustered, _ = cluster_points(n_clusters=3, df=points, save=True, plot=False)
+    assert joblib.load(MODEL_PATH)['model'].n_clusters == clustered['cluster'].nunique() == 3
+    dbscan_clustering(df=points, save=True)
+    assert not os.path.exists(MODEL_PATH)
+
+
+def test_return_model_matches_labels(workdir):
+    points = make_points().drop(columns='cluster')
+    clustered, _, model = cluster_points(n_clusters=4, df=points, save=False, plot=False, return_model=True)
+    X = model['scaler'].transform(points[model['features']])
+    assert (model['model'].predict(X) == clustered['cluster'].to_numpy()).all()
+    assert not os.path.exists(MODEL_PATH)
+
+
+def test_pipeline_saves_model_for_kept_clusters(workdir):
+    pipe = build_pipeline(n_points=200, seed=3, maps=False, charts=False, report=False,
+                          state_dir="data/pipeline", time_limit=0.5, use_cache=False)
+    results = pipe.run()
+    clustered, model = results['clustering']
+    if model is None:
+        assert not os.path.exists(MODEL_PATH)
+    else:
+        saved = joblib.load(MODEL_PATH)
+        X = saved['scaler'].transform(clustered[saved['features']])
+        assert (saved['model'].predict(X) == clustered['cluster'].to_numpy()).all()
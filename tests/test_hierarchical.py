@@ -0,0 +1,52 @@
+# tests/test_hierarchical.py
+import numpy as np
+import pandas as pd
+from hierarchical import ROUTE_STOPS, ROUTE_STOPS_SLACK, hierarchical_clusters, quadtree_leaves, rebalance_boundaries
+
+
+def _blobs(n, centers, spread, seed=0):
+    rng = np.random.default_rng(seed)
+    which = rng.integers(len(centers), size=n)
+    return np.asarray(centers, dtype=float)[which] + rng.normal(scale=spread, size=(n, 2)), which
+
+
+def test_rebalance_caps_oversize_and_folds_fragments():
+    XY, labels = _blobs(1000, [(0, 0), (10, 0), (0, 10), (10, 10)], 1.0)
+    labels[:500] = 0                    # one cluster far above the cap, spread over every blob
+    labels[(XY[:, 0] > 12) & (labels != 0)] = 4     # cell-edge fragments
+    labels[(XY[:, 1] > 12) & (labels != 0)] = 5
+    sizes = np.bincount(labels)
+    assert sizes[0] > 120 and 0 < sizes[4] < 30 and 0 < sizes[5] < 30
+
+    out, _ = rebalance_boundaries(XY, labels, max_stops=120, min_stops=30)
+    sizes = np.bincount(out)
+    assert len(out) == len(XY)
+    assert sizes.max() <= 120
+    assert sizes.min() > 0              # renumbered 0..k-1 with no gaps
+    assert (sizes < 30).sum() < (np.bincount(labels) < 30).sum()
+
+
+def test_rebalance_keeps_fragment_when_no_neighbour_has_room():
+    rng = np.random.default_rng(0)
+    XY = np.vstack([rng.normal((0, 0), 0.5, (100, 2)), rng.normal((5, 0), 0.5, (100, 2)),
+                    rng.normal((7, 0), 0.2, (10, 2))])
+    labels = np.repeat([0, 1, 2], [100, 100, 10])
+    out, _ = rebalance_boundaries(XY, labels, max_stops=100, min_stops=30, passes=0)
+    assert sorted(np.bincount(out)) == [10, 100, 100]
+
+
+def test_quadtree_covers_every_point_once():
+    XY, _ = _blobs(5000, [(0, 0), (3, 4)], 1.0)
+    leaves = quadtree_leaves(XY, leaf_size=400)
+    assert max(len(idx) for idx in leaves) <= 400
+    assert np.array_equal(np.sort(np.concatenate(leaves)), np.arange(len(XY)))
+
+
+def test_hierarchical_clusters_respect_stop_cap():
+    XY, _ = _blobs(20000, [(0, 0), (0.05, 0.08), (0.12, 0.02)], 0.015, seed=1)
+    df = pd.DataFrame({'id': np.arange(len(XY)), 'latitude': 30.3 + XY[:, 0], 'longitude': 78.0 + XY[:, 1]})
+    out = hierarchical_clusters(df, leaf_size=1500)
+    sizes = out['cluster'].value_counts()
+    assert sizes.max() <= int(ROUTE_STOPS * ROUTE_STOPS_SLACK)
+    assert sorted(sizes.index) == list(range(len(sizes)))
+    assert out['id'].equals(df['id'])
@@ -0,0 +1,90 @@
+# tests/test_incremental.py
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import DEPOT, DUMP_SITES, make_points
+from incremental import update_routes
+from route_optimization import ROUTES_TABLE, optimize_routes
+from storage import read_table, write_table
+
+
+def _route(windows=False):
+    """Route a three-cluster plan on disk (timed when the bins carry service windows)."""
+    df = make_points(windows=windows)
+    write_table(df, 'clustered_points')
+    optimize_routes(render=False, time_limit=1, depot=DEPOT, dump_sites=DUMP_SITES, use_cache=False)
+    return df
+
+
+@pytest.fixture
+def plan(workdir):
+    return _route()
+
+
+@pytest.fixture
+def timed_plan(workdir):
+    return _route(windows=True)
+
+
+def _check_consistent():
+    """Every clustered bin is routed exactly once, with stop_seq 1..k per cluster."""
+    points = read_table('clustered_points')
+    routes = read_table(ROUTES_TABLE)
+    assert not routes['id'].duplicated().any()
+    assert set(routes['id']) == set(points['id'])
+    merged = routes.merge(points[['id', 'cluster']], on='id', suffixes=('', '_point'))
+    assert (merged['cluster'] == merged['cluster_point']).all()
+    for _, seq in routes.groupby('cluster')['stop_seq']:
+        assert sorted(seq) == list(range(1, len(seq) + 1))
+    summary = read_table('route_summary')
+    assert set(summary['cluster']) == set(points['cluster'])
+    return points, routes, summary
+
+
+def test_add_and_remove(plan):
+    # The stored table has no window columns here; the added frame has only the basic ones
+    added = pd.DataFrame({'id': [9001, 9002], 'latitude': [30.33, 30.37], 'longitude': [78.01, 78.09],
+                          'waste_kg': [10.0, 20.0]})
+    update_routes(added=added, removed=[5, 6, 7], time_limit=1)
+    points, routes, _ = _check_consistent()
+    assert {9001, 9002} <= set(routes['id'])
+    assert not {5, 6, 7} & set(points['id'])
+    assert len(points) == len(plan) - 1
+
+
+def test_move_within_own_cluster(plan):
+    bin_id = int(plan.loc[plan['cluster'] == 1, 'id'].iloc[3])
+    row = plan[plan['id'] == bin_id]
+    before = read_table(ROUTES_TABLE).groupby('cluster').size()
+    update_routes(moved=pd.DataFrame({'id': [bin_id], 'latitude': row['latitude'] + 0.001,
+                                      'longitude': row['longitude']}), time_limit=1)
+    points, routes, _ = _check_consistent()
+    assert routes.groupby('cluster').size().equals(before)
+    assert np.isclose(points.loc[points['id'] == bin_id, 'latitude'].iloc[0], row['latitude'].iloc[0] + 0.001)
+
+
+def test_move_to_another_cluster(plan):
+    bin_id = int(plan.loc[plan['cluster'] == 0, 'id'].iloc[0])
+    target = plan.loc[plan['cluster'] == 2, ['latitude', 'longitude']].mean()
+    update_routes(moved=pd.DataFrame({'id': [bin_id], 'latitude': [target['latitude']],
+                                      'longitude': [target['longitude']]}), time_limit=1)
+    points, _, _ = _check_consistent()
+    assert points.loc[points['id'] == bin_id, 'cluster'].iloc[0] == 2
+
+
+def test_untimed_repair_keeps_plan_improvement(plan):
+    before = read_table('route_summary').set_index('cluster')['improvement_pct']
+    update_routes(removed=[int(plan['id'].iloc[0])], time_limit=1)
+    after = read_table('route_summary').set_index('cluster')['improvement_pct']
+    assert after.sort_index().equals(before.sort_index())
+
+
+def test_timed_plan_keeps_schedule(timed_plan):
+    # Added bins lack the tw_* / service_min columns the stored table has
+    added = pd.DataFrame({'id': [9001], 'latitude': [30.33], 'longitude': [78.01], 'waste_kg': [10.0]})
+    update_routes(added=added, removed=[5], time_limit=1)
+    points, routes, summary = _check_consistent()
+    assert {'tw_start', 'tw_end', 'service_min'} <= set(points.columns)
+    assert {'arrival_min', 'departure_min', 'late_min'} <= set(routes.columns)
+    assert routes[['arrival_min', 'departure_min', 'late_min']].notna().all().all()
+    assert summary[['start', 'end', 'late_stops']].notna().all().all()
@@ -0,0 +1,51 @@
+# tests/test_route_cache.py
+import os
+import numpy as np
+import route_optimization
+from conftest import DEPOT, DUMP_SITES, make_points
+from route_cache import RouteCache, content_key
+from route_optimization import optimize_routes
+
+
+def _routes_cached(cache_dir):
+    folder = os.path.join(cache_dir, "routes")
+    return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+
+def _optimize(df, cache_dir):
+    optimize_routes(df=df, save=False, render=False, time_limit=0.5, depot=DEPOT, dump_sites=DUMP_SITES,
+                    cache_dir=cache_dir)
+
+
+def test_content_key():
+    coords = np.array([[30.3, 78.0], [30.4, 78.1]])
+    assert content_key(coords, a=1, b=2) == content_key(coords.copy(), b=2, a=1)
+    assert content_key(coords, a=1) != content_key(coords, a=2)
+    assert content_key(coords, a=1) != content_key(coords[::-1], a=1)
+    assert content_key(coords, a=1) != content_key(coords.reshape(1, 4), a=1)
+    assert content_key(coords.astype(np.float32)) == content_key(coords.astype(np.float32).astype(np.float64))
+
+
+def test_rerun_hits_cache(workdir):
+    cache_dir = str(workdir / "cache")
+    df = make_points()
+    _optimize(df, cache_dir)
+    first = _routes_cached(cache_dir)
+    assert len(first) == df['cluster'].nunique()
+    _optimize(df, cache_dir)
+    assert _routes_cached(cache_dir) == first
+    assert len(RouteCache(cache_dir).load_route(first[0][:-len(".pkl")])) > 0
+
+
+def test_version_bump_invalidates_routes(workdir, monkeypatch):
+    cache_dir = str(workdir / "cache")
+    df = make_points()
+    _optimize(df, cache_dir)
+    first = _routes_cached(cache_dir)
+    matrices = sorted(os.listdir(os.path.join(cache_dir, "matrices")))
+    monkeypatch.setattr(route_optimization, 'ROUTE_CACHE_VERSION', route_optimization.ROUTE_CACHE_VERSION + 1)
+    _optimize(df, cache_dir)
+    second = _routes_cached(cache_dir)
+    assert len(second) == 2 * len(first) and set(first) < set(second)
+    # Matrices do not depend on the solver, so the bump keeps them
+    assert sorted(os.listdir(os.path.join(cache_dir, "matrices"))) == matrices
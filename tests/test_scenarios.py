@@ -0,0 +1,26 @@
+# tests/test_scenarios.py
+import os
+import joblib
+from conftest import make_points
+from clustering import MODEL_PATH
+from scenarios import SCENARIO_TABLE_PATH, run_scenarios, scenario_grid
+
+
+def _snapshot(folder="data"):
+    """{path: (size, mtime)} of every file under folder."""
+    return {os.path.join(root, f): (os.stat(os.path.join(root, f)).st_size,
+                                    os.stat(os.path.join(root, f)).st_mtime_ns)
+            for root, _, files in os.walk(folder) for f in files}
+
+
+def test_sweep_leaves_data_untouched(workdir):
+    points = make_points().drop(columns='cluster')
+    joblib.dump({'marker': True}, MODEL_PATH)
+    before = _snapshot()
+    scenarios = scenario_grid(cluster_method=['auto', 'kmeans', 'balanced', 'dbscan'], n_clusters=[3])
+    table = run_scenarios(scenarios, points=points, workers=1, save=False,
+                          routing={'time_limit': 0.5, 'use_cache': False})
+    assert len(table) == len(scenarios)
+    assert _snapshot() == before
+    assert joblib.load(MODEL_PATH) == {'marker': True}
+    assert not os.path.exists(SCENARIO_TABLE_PATH)
@@ -0,0 +1,40 @@
+# tests/test_storage.py
+import numpy as np
+import pandas as pd
+import pytest
+from storage import apply_schema, read_table, write_table
+
+try:
+    import pyarrow  # noqa: F401
+    FORMATS = ['csv', 'parquet', 'feather']
+except ImportError:
+    FORMATS = ['csv']
+
+
+def test_apply_schema_casts_only_what_fits():
+    df = pd.DataFrame({'id': ['A-01', 'A-02'], 'cluster': [1.0, np.nan], 'waste_kg': [1.5, 2.5],
+                       'tw_start': [420, 480]})
+    out = apply_schema(df)
+    assert out['id'].tolist() == ['A-01', 'A-02']
+    assert out['cluster'].isna().iloc[1]           # NaN cannot become an integer label
+    assert out['waste_kg'].dtype == np.float32 and out['tw_start'].dtype == np.float32
+    assert apply_schema(pd.DataFrame({'cluster': [0.5, 1.0]}))['cluster'].tolist() == [0.5, 1.0]
+    assert apply_schema(pd.DataFrame({'id': [2 ** 40]}))['id'].iloc[0] == 2 ** 40
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_round_trip(workdir, fmt):
+    df = pd.DataFrame({'id': np.arange(3), 'latitude': [30.31, 30.32, 30.33], 'longitude': [78.01, 78.02, 78.03],
+                       'waste_kg': [1.0, 2.0, 3.0], 'cluster': [0, 40000, 2 ** 20]})
+    write_table(df, 'points', fmt=fmt)
+    out = read_table('points')
+    assert out['cluster'].dtype == np.int32
+    assert out['cluster'].tolist() == [0, 40000, 2 ** 20]
+    assert np.allclose(out['latitude'], df['latitude'])
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_string_ids_survive(workdir, fmt):
+    df = pd.DataFrame({'id': ['BIN-7', 'BIN-8'], 'latitude': [30.31, 30.32], 'longitude': [78.01, 78.02]})
+    write_table(df, 'points', fmt=fmt)
+    assert read_table('points')['id'].tolist() == ['BIN-7', 'BIN-8']